@@ -0,0 +1,201 @@
+# game/achievements.py - Achievement rules compiled from Achievement.conditions
+
+import logging
+import operator
+import threading
+
+from django.core.cache import cache
+
+from .models import Achievement, UserAchievement, UserStats
+
+logger = logging.getLogger(__name__)
+
+RULES_VERSION_KEY = 'achievements:rules-version'
+
+# Facts read from the submitted GameSession
+SESSION_FACTS = (
+    'score', 'final_level', 'lines_cleared', 'pieces_placed', 'tetrises_cleared',
+    't_spins', 'max_combo', 'duration_seconds',
+)
+
+# Stats facts and how each accumulates over a player's sessions (None counts
+# games), so bulk backfills can replay history without UserStats snapshots
+CUMULATIVE_FACTS = {
+    'total_games': None,
+    'total_score': 'score',
+    'total_lines_cleared': 'lines_cleared',
+}
+STATS_FACTS = tuple(CUMULATIVE_FACTS)
+
+# Condition key used in Achievement.conditions -> (fact, comparison against the value)
+CONDITIONS = {
+    'score': ('score', operator.ge),
+    'level': ('final_level', operator.ge),
+    'lines_in_game': ('lines_cleared', operator.ge),
+    'pieces_in_game': ('pieces_placed', operator.ge),
+    'tetris_cleared': ('tetrises_cleared', operator.ge),
+    't_spins': ('t_spins', operator.ge),
+    'max_combo': ('max_combo', operator.ge),
+    'duration_under': ('duration_seconds', operator.lt),
+    'duration_over': ('duration_seconds', operator.gt),
+    'games_played': ('total_games', operator.ge),
+    'total_games': ('total_games', operator.ge),
+    'total_score': ('total_score', operator.ge),
+    'total_lines': ('total_lines_cleared', operator.ge),
+}
+
+
+class Rule:
+    """One achievement's conditions compiled into (fact, comparison, value) checks"""
+    __slots__ = ('achievement_id', 'checks')
+
+    def __init__(self, achievement_id, checks):
+        self.achievement_id = achievement_id
+        self.checks = checks
+
+    def matches(self, facts):
+        for fact, compare, value in self.checks:
+            actual = facts.get(fact)
+            if actual is None or not compare(actual, value):
+                return False
+        return True
+
+
+def compile_rule(achievement_id, conditions):
+    """Compile a conditions dict, or return None if it can never be evaluated"""
+    if not isinstance(conditions, dict) or not conditions:
+        logger.warning('Achievement %s has no conditions', achievement_id)
+        return None
+
+    checks = []
+    for key, value in conditions.items():
+        if key not in CONDITIONS or not isinstance(value, (int, float)):
+            logger.warning('Achievement %s has unsupported condition %r=%r', achievement_id, key, value)
+            return None
+        fact, compare = CONDITIONS[key]
+        checks.append((fact, compare, value))
+    return Rule(achievement_id, tuple(checks))
+
+
+class RuleSet:
+    """All achievement rules, recompiled only when the rules version changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules = None
+        self._version = None
+
+    def rules(self):
+        version = cache.get(RULES_VERSION_KEY, 0)
+        if self._rules is None or version != self._version:
+            with self._lock:
+                if self._rules is None or version != self._version:
+                    self._rules = self._compile()
+                    self._version = version
+        return self._rules
+
+    @staticmethod
+    def _compile():
+        rules = []
+        for achievement_id, conditions in Achievement.objects.order_by('id').values_list('id', 'conditions'):
+            rule = compile_rule(achievement_id, conditions)
+            if rule is not None:
+                rules.append(rule)
+        return rules
+
+
+rule_set = RuleSet()
+
+
+def invalidate_rules():
+    """Force every process sharing the cache to recompile achievement rules"""
+    try:
+        cache.incr(RULES_VERSION_KEY)
+    except ValueError:
+        cache.set(RULES_VERSION_KEY, 1, timeout=None)
+
+
+def session_facts(session, user_stats):
+    facts = {name: getattr(session, name) for name in SESSION_FACTS}
+    if user_stats is not None:
+        for name in STATS_FACTS:
+            facts[name] = getattr(user_stats, name)
+    return facts
+
+
+def evaluate_session(session, user_stats=None):
+    """Award every achievement the session newly satisfies
+
+    Uses a constant number of queries however many achievements exist: the
+    stats row (unless passed in), the already-earned ids and one bulk insert.
+    """
+    rules = rule_set.rules()
+    if not rules:
+        return []
+
+    if user_stats is None:
+        user_stats = UserStats.objects.filter(user_id=session.user_id).first()
+    earned = set(
+        UserAchievement.objects.filter(user_id=session.user_id).values_list('achievement_id', flat=True)
+    )
+
+    facts = session_facts(session, user_stats)
+    new_achievements = [
+        UserAchievement(
+            user_id=session.user_id,
+            achievement_id=rule.achievement_id,
+            game_session=session,
+            score_when_earned=session.score,
+        )
+        for rule in rules
+        if rule.achievement_id not in earned and rule.matches(facts)
+    ]
+    if new_achievements:
+        UserAchievement.objects.bulk_create(new_achievements, ignore_conflicts=True)
+    return new_achievements
+
+
+def evaluate_sessions(sessions, user_stats=None):
+    """Award achievements for several new sessions by one player, in play order
+
+    Same query count as evaluate_session. Running stats facts are rebuilt
+    from the final totals by subtracting the batch's own contributions, so
+    each award is credited to the game that actually earned it.
+    """
+    rules = rule_set.rules()
+    if not rules or not sessions:
+        return []
+
+    user_id = sessions[0].user_id
+    if user_stats is None:
+        user_stats = UserStats.objects.filter(user_id=user_id).first()
+    earned = set(
+        UserAchievement.objects.filter(user_id=user_id).values_list('achievement_id', flat=True)
+    )
+
+    running = None
+    if user_stats is not None:
+        running = {}
+        for fact, source in CUMULATIVE_FACTS.items():
+            added = len(sessions) if source is None else sum(getattr(s, source) for s in sessions)
+            running[fact] = getattr(user_stats, fact) - added
+
+    new_achievements = []
+    for session in sessions:
+        facts = session_facts(session, None)
+        if running is not None:
+            for fact, source in CUMULATIVE_FACTS.items():
+                running[fact] += 1 if source is None else getattr(session, source)
+            facts.update(running)
+        for rule in rules:
+            if rule.achievement_id not in earned and rule.matches(facts):
+                earned.add(rule.achievement_id)
+                new_achievements.append(UserAchievement(
+                    user_id=user_id,
+                    achievement_id=rule.achievement_id,
+                    game_session=session,
+                    score_when_earned=session.score,
+                ))
+    if new_achievements:
+        UserAchievement.objects.bulk_create(new_achievements, ignore_conflicts=True)
+    return new_achievements
@@ -2,7 +2,7 @@
 
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import GameSession, Score, Achievement, UserAchievement, UserStats
+from .models import GameSession, Score, Achievement, UserAchievement, UserStats, PlayerBest, GameReplay, VersusMatch, DailyUserStats
 
 @admin.register(GameSession)
 class GameSessionAdmin(admin.ModelAdmin):
@@ -88,6 +88,32 @@ class UserAchievementAdmin(admin.ModelAdmin):
         )
     achievement_rarity.short_description = 'Rarity'
 
+@admin.register(GameReplay)
+class GameReplayAdmin(admin.ModelAdmin):
+    list_display = ['session', 'seed', 'event_count', 'frame_count', 'created_at']
+    raw_id_fields = ['session']
+    exclude = ['data']
+
+@admin.register(VersusMatch)
+class VersusMatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'session_one', 'session_two', 'winner', 'ticks', 'created_at']
+    raw_id_fields = ['session_one', 'session_two', 'winner']
+    ordering = ['-created_at']
+
+@admin.register(DailyUserStats)
+class DailyUserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'day', 'games', 'total_score', 'max_score', 'playtime_seconds']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
+    ordering = ['-day']
+
+@admin.register(PlayerBest)
+class PlayerBestAdmin(admin.ModelAdmin):
+    list_display = ['user', 'score', 'session', 'achieved_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['user', 'session']
+    ordering = ['-score', 'achieved_at']
+
 @admin.register(UserStats)
 class UserStatsAdmin(admin.ModelAdmin):
     list_display = [
@@ -138,7 +164,6 @@ class UserStatsAdmin(admin.ModelAdmin):
     actions = ['refresh_stats']
     
     def refresh_stats(self, request, queryset):
-        for user_stats in queryset:
-            user_stats.update_stats()
-        self.message_user(request, f"Refreshed stats for {queryset.count()} users.")
+        refreshed = UserStats.rebuild_for_users(queryset.values_list('user_id', flat=True))
+        self.message_user(request, f"Refreshed stats for {refreshed} users.")
     refresh_stats.short_description = "Refresh selected user statistics"
\ No newline at end of file
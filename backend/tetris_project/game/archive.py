@@ -0,0 +1,716 @@
+# game/archive.py - Cold storage for old game sessions in monthly columnar files
+
+"""Archived game sessions, one directory of column files per month
+
+archive_sessions moves old sessions (with their replays) out of GameSession
+into ARCHIVE_DIR/sessions-YYYY-MM/:
+
+    meta.json                       row count, id range, choice codes; written last
+    <column>.npy                    one fixed-width column, memory-mapped on read
+    <blob>.offsets.npy, <blob>.npy  variable-length values: int64 offsets into
+                                    one uint8 array (game_data is zlib-compressed
+                                    JSON, empty for {})
+
+Rows are sorted by (user_id, created_at, id), so a player's games are one
+contiguous range found by binary search. Times are int64 microseconds since
+the epoch (UTC) with NULL_TIME for NULL, duration_seconds uses -1 for NULL,
+and end_reason / verification_status are stored as indexes into the codes
+listed in meta.json.
+
+Readers memory-map the files, so only the pages a query touches are read,
+and reopen a month when its meta.json changes. A month is rewritten as a
+whole: to a temporary directory that then replaces the old one. Every
+read-modify-write of a month holds ARCHIVE_DIR/.lock (SessionArchive.locked),
+so archive_sessions and request-time restores never overwrite each other.
+
+Games leave the archive when one becomes a player's best again (restore,
+as PlayerBest needs a real row) and after their player is deleted
+(purge_deleted_players, run by purge_archive and archive_sessions; until
+then rebuilds skip them). While archive_sessions runs, a game can be both
+archived and still in the table; readers merging the two drop duplicate ids.
+"""
+
+import heapq
+import json
+import os
+import shutil
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.files import locks
+from django.db import transaction
+
+from .models import GameReplay, GameSession, User
+
+FORMAT_VERSION = 1
+PREFIX = 'sessions-'
+META_NAME = 'meta.json'
+LOCK_NAME = '.lock'
+NULL_TIME = np.iinfo(np.int64).min
+DAY_US = 86400 * 1000000
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+EPOCH_DAY = date(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+FIXED_COLUMNS = {
+    'id': '<i8',
+    'user_id': '<i8',
+    'score': '<i4',
+    'final_level': '<i2',
+    'lines_cleared': '<i4',
+    'pieces_placed': '<i4',
+    'tetrises_cleared': '<i4',
+    't_spins': '<i4',
+    'max_combo': '<i4',
+    'duration_seconds': '<i4',
+    'end_reason': 'u1',
+    'verification_status': 'u1',
+    'started_at': '<i8',
+    'ended_at': '<i8',
+    'created_at': '<i8',
+    'updated_at': '<i8',
+    'replay_seed': '<i8',
+    'replay_event_count': '<i4',
+    'replay_frame_count': '<i4',
+    'replay_created_at': '<i8',
+}
+BLOB_COLUMNS = ('game_data', 'verification_note', 'replay_data')
+
+# GameSession fields read for archiving, in FIXED_COLUMNS / BLOB_COLUMNS terms
+SESSION_FIELDS = (
+    'id', 'user_id', 'score', 'final_level', 'lines_cleared', 'pieces_placed',
+    'tetrises_cleared', 't_spins', 'max_combo', 'duration_seconds', 'end_reason',
+    'verification_status', 'started_at', 'ended_at', 'created_at', 'updated_at',
+    'game_data', 'verification_note',
+)
+REPLAY_FIELDS = ('replay__seed', 'replay__event_count', 'replay__frame_count', 'replay__created_at', 'replay__data')
+
+END_REASONS = [code for code, _ in GameSession.GAME_END_REASONS]
+STATUSES = [code for code, _ in GameSession.VERIFICATION_STATUSES]
+
+
+def to_micros(moment):
+    return NULL_TIME if moment is None else (moment - EPOCH) // MICROSECOND
+
+
+def from_micros(value):
+    return None if value == NULL_TIME else EPOCH + timedelta(microseconds=int(value))
+
+
+def month_of(moment):
+    return f'{moment.year:04d}-{moment.month:02d}'
+
+
+def encode_game_data(game_data):
+    if not game_data:
+        return b''
+    return zlib.compress(json.dumps(game_data, separators=(',', ':')).encode())
+
+
+def decode_game_data(data):
+    return json.loads(zlib.decompress(data)) if data else {}
+
+
+def _load(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Empty arrays cannot be memory-mapped
+        return np.load(path)
+
+
+class Partition:
+    """One archived month, memory-mapped"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_NAME)) as fh:
+            self.meta = json.load(fh)
+        self.rows = self.meta['rows']
+        self.columns = {name: _load(os.path.join(path, f'{name}.npy')) for name in FIXED_COLUMNS}
+        self.blobs = {
+            name: (_load(os.path.join(path, f'{name}.offsets.npy')), _load(os.path.join(path, f'{name}.npy')))
+            for name in BLOB_COLUMNS
+        }
+        self.by_id = _load(os.path.join(path, 'by_id.npy'))
+        self.end_reasons = self.meta['end_reasons']
+        self.statuses = self.meta['statuses']
+
+    def blob(self, name, row):
+        offsets, data = self.blobs[name]
+        return bytes(data[offsets[row]:offsets[row + 1]])
+
+    def user_range(self, user_id):
+        users = self.columns['user_id']
+        return int(np.searchsorted(users, user_id, 'left')), int(np.searchsorted(users, user_id, 'right'))
+
+    def user_rows(self, user_ids=None, low=None, high=None):
+        """Row indexes for the given players, or for player ids in [low, high]"""
+        users = self.columns['user_id']
+        if user_ids is not None:
+            ids = np.unique(np.asarray(list(user_ids), dtype=np.int64))
+            if not len(ids):
+                return np.zeros(0, dtype=np.int64)
+            start = np.searchsorted(users, ids[0], 'left')
+            stop = np.searchsorted(users, ids[-1], 'right')
+            return start + np.flatnonzero(np.isin(users[start:stop], ids))
+        start = np.searchsorted(users, low, 'left')
+        stop = np.searchsorted(users, high, 'right')
+        return np.arange(start, stop)
+
+    def find(self, session_id):
+        if not self.meta['min_id'] <= session_id <= self.meta['max_id']:
+            return None
+        ids = self.columns['id']
+        position = int(np.searchsorted(ids, session_id, sorter=self.by_id))
+        if position < self.rows and ids[self.by_id[position]] == session_id:
+            return int(self.by_id[position])
+        return None
+
+    def session(self, row, user=None):
+        """An unsaved GameSession for one archived row"""
+        c = self.columns
+        duration = int(c['duration_seconds'][row])
+        session = GameSession(
+            id=int(c['id'][row]),
+            user_id=int(c['user_id'][row]),
+            score=int(c['score'][row]),
+            final_level=int(c['final_level'][row]),
+            lines_cleared=int(c['lines_cleared'][row]),
+            pieces_placed=int(c['pieces_placed'][row]),
+            tetrises_cleared=int(c['tetrises_cleared'][row]),
+            t_spins=int(c['t_spins'][row]),
+            max_combo=int(c['max_combo'][row]),
+            duration_seconds=None if duration < 0 else duration,
+            end_reason=self.end_reasons[c['end_reason'][row]],
+            verification_status=self.statuses[c['verification_status'][row]],
+            verification_note=self.blob('verification_note', row).decode(),
+            game_data=decode_game_data(self.blob('game_data', row)),
+            started_at=from_micros(c['started_at'][row]),
+            ended_at=from_micros(c['ended_at'][row]),
+            created_at=from_micros(c['created_at'][row]),
+            updated_at=from_micros(c['updated_at'][row]),
+        )
+        if user is not None:
+            session.user = user
+        return session
+
+    def values(self, field, low, high):
+        """Python values of one field for rows [low, high), as GameSession would hold them"""
+        if field in BLOB_COLUMNS:
+            values = [self.blob(field, row) for row in range(low, high)]
+            if field == 'game_data':
+                return [decode_game_data(value) for value in values]
+            if field == 'verification_note':
+                return [value.decode() for value in values]
+            return values
+        values = self.columns[field][low:high].tolist()
+        if field.endswith('_at'):
+            return [from_micros(value) for value in values]
+        if field == 'duration_seconds':
+            return [None if value < 0 else value for value in values]
+        if field == 'end_reason':
+            return [self.end_reasons[value] for value in values]
+        if field == 'verification_status':
+            return [self.statuses[value] for value in values]
+        return values
+
+    def ranked_codes(self):
+        """Status codes of GameSession.RANKED_STATUSES in this partition (older ones may lack some)"""
+        return [self.statuses.index(status) for status in GameSession.RANKED_STATUSES if status in self.statuses]
+
+    def replay(self, row):
+        """An unsaved GameReplay for one archived row, or None if the game had none"""
+        c = self.columns
+        if c['replay_created_at'][row] == NULL_TIME:
+            return None
+        return GameReplay(
+            session_id=int(c['id'][row]),
+            seed=int(c['replay_seed'][row]),
+            event_count=int(c['replay_event_count'][row]),
+            frame_count=int(c['replay_frame_count'][row]),
+            created_at=from_micros(c['replay_created_at'][row]),
+            data=self.blob('replay_data', row),
+        )
+
+    def to_columns(self):
+        """Every row as in-memory columns, the form write_partition takes"""
+        columns = {name: np.array(values) for name, values in self.columns.items()}
+        for name in BLOB_COLUMNS:
+            offsets, data = self.blobs[name]
+            data = bytes(data)
+            columns[name] = [data[offsets[i]:offsets[i + 1]] for i in range(self.rows)]
+        columns['end_reason'] = _recode(columns['end_reason'], self.end_reasons, END_REASONS)
+        columns['verification_status'] = _recode(columns['verification_status'], self.statuses, STATUSES)
+        return columns
+
+
+def _recode(codes, old, new):
+    mapping = np.array([new.index(code) for code in old], dtype=np.uint8)
+    return mapping[codes] if len(codes) else codes
+
+
+def rows_to_columns(rows):
+    """Columns from values_list rows of SESSION_FIELDS + REPLAY_FIELDS"""
+    count = len(rows)
+    columns = {name: np.zeros(count, dtype=dtype) for name, dtype in FIXED_COLUMNS.items()}
+    blobs = {name: [] for name in BLOB_COLUMNS}
+    end_reasons = {code: index for index, code in enumerate(END_REASONS)}
+    statuses = {code: index for index, code in enumerate(STATUSES)}
+    for index, row in enumerate(rows):
+        (session_id, user_id, score, final_level, lines, pieces, tetrises, t_spins, max_combo,
+         duration, end_reason, status, started_at, ended_at, created_at, updated_at,
+         game_data, note, replay_seed, replay_events, replay_frames, replay_created_at, replay_data) = row
+        columns['id'][index] = session_id
+        columns['user_id'][index] = user_id
+        columns['score'][index] = score
+        columns['final_level'][index] = final_level
+        columns['lines_cleared'][index] = lines
+        columns['pieces_placed'][index] = pieces
+        columns['tetrises_cleared'][index] = tetrises
+        columns['t_spins'][index] = t_spins
+        columns['max_combo'][index] = max_combo
+        columns['duration_seconds'][index] = -1 if duration is None else duration
+        columns['end_reason'][index] = end_reasons[end_reason]
+        columns['verification_status'][index] = statuses[status]
+        columns['started_at'][index] = to_micros(started_at)
+        columns['ended_at'][index] = to_micros(ended_at)
+        columns['created_at'][index] = to_micros(created_at)
+        columns['updated_at'][index] = to_micros(updated_at)
+        columns['replay_seed'][index] = replay_seed or 0
+        columns['replay_event_count'][index] = replay_events or 0
+        columns['replay_frame_count'][index] = replay_frames or 0
+        columns['replay_created_at'][index] = to_micros(replay_created_at)
+        blobs['game_data'].append(encode_game_data(game_data))
+        blobs['verification_note'].append(note.encode())
+        blobs['replay_data'].append(b'' if replay_data is None else bytes(replay_data))
+    columns.update(blobs)
+    return columns
+
+
+def concat_columns(first, second):
+    columns = {}
+    for name in FIXED_COLUMNS:
+        columns[name] = np.concatenate([first[name], second[name]])
+    for name in BLOB_COLUMNS:
+        columns[name] = list(first[name]) + list(second[name])
+    return columns
+
+
+def take_rows(columns, rows):
+    taken = {name: columns[name][rows] for name in FIXED_COLUMNS}
+    for name in BLOB_COLUMNS:
+        values = columns[name]
+        taken[name] = [values[i] for i in rows]
+    return taken
+
+
+def write_partition(path, columns):
+    """Write sorted columns to path, replacing any partition already there"""
+    order = np.lexsort((columns['id'], columns['created_at'], columns['user_id']))
+    columns = take_rows(columns, order)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, dtype in FIXED_COLUMNS.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), np.ascontiguousarray(columns[name], dtype=dtype))
+    for name in BLOB_COLUMNS:
+        values = columns[name]
+        offsets = np.zeros(len(values) + 1, dtype='<i8')
+        np.cumsum([len(value) for value in values], out=offsets[1:])
+        np.save(os.path.join(tmp_path, f'{name}.offsets.npy'), offsets)
+        np.save(os.path.join(tmp_path, f'{name}.npy'), np.frombuffer(b''.join(values), dtype=np.uint8))
+    np.save(os.path.join(tmp_path, 'by_id.npy'), np.argsort(columns['id'], kind='stable').astype('<i8'))
+    rows = len(columns['id'])
+    with open(os.path.join(tmp_path, META_NAME), 'w') as fh:
+        json.dump({
+            'version': FORMAT_VERSION,
+            'rows': rows,
+            'min_id': int(columns['id'].min()) if rows else 0,
+            'max_id': int(columns['id'].max()) if rows else 0,
+            'end_reasons': END_REASONS,
+            'statuses': STATUSES,
+        }, fh)
+
+    old_path = f'{path}.old-{os.getpid()}'
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return rows
+
+
+def group_starts(keys):
+    """Start index of each run of equal values in sorted keys"""
+    if not len(keys):
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+
+
+def unique_ids(rows):
+    """Rows merged from the table and the archive, without the archived copy of a game still in the table
+
+    Rows start with the id and equal ids are adjacent (merged on a key
+    ending in it), the table's row first; that one is kept.
+    """
+    last_id = None
+    for row in rows:
+        if row[0] != last_id:
+            yield row
+        last_id = row[0]
+
+
+def add_totals(totals, extra, maxima=(), minima=()):
+    """Combine two aggregate rows: fields in maxima / minima keep the larger / smaller value, others add"""
+    for field, value in extra.items():
+        current = totals.get(field)
+        if current is None:
+            totals[field] = value
+        elif value is None:
+            continue
+        elif field in maxima:
+            totals[field] = max(current, value)
+        elif field in minima:
+            totals[field] = min(current, value)
+        else:
+            totals[field] = current + value
+    return totals
+
+
+class SessionArchive:
+    """All archived months under ARCHIVE_DIR, reopened as archive_sessions rewrites them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._partitions = {}
+
+    @property
+    def directory(self):
+        return getattr(settings, 'ARCHIVE_DIR', None)
+
+    def month_path(self, month):
+        return os.path.join(self.directory, f'{PREFIX}{month}')
+
+    def partitions(self):
+        """Open partitions, oldest month first"""
+        directory = self.directory
+        if not directory or not os.path.isdir(directory):
+            return []
+        current = {}
+        for entry in os.scandir(directory):
+            name = entry.name
+            if not name.startswith(PREFIX) or '.' in name:
+                continue
+            try:
+                stamp = os.stat(os.path.join(entry.path, META_NAME)).st_mtime_ns
+            except OSError:
+                continue
+            current[name] = (entry.path, stamp)
+
+        with self._lock:
+            for name, (path, stamp) in current.items():
+                cached = self._partitions.get(name)
+                if cached is None or cached[0] != stamp:
+                    self._partitions[name] = (stamp, Partition(path))
+            for name in set(self._partitions) - set(current):
+                del self._partitions[name]
+            return [self._partitions[name][1] for name in sorted(self._partitions)]
+
+    @contextmanager
+    def locked(self):
+        """Hold the archive-wide lock file, across processes, e.g. around rewriting a month"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_NAME), 'ab') as fh:
+            locks.lock(fh, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(fh)
+
+    def partition(self, month):
+        for partition in self.partitions():
+            if partition.path == self.month_path(month):
+                return partition
+        return None
+
+    # Reads for history pages
+
+    def user_sessions(self, user, field, position, limit):
+        """A player's archived games ordered by (field, id) descending, after a keyset position"""
+        if field not in ('created_at', 'score'):
+            raise ValueError(f'Cannot page archived sessions by {field}')
+        candidates = []
+        for partition in self.partitions():
+            start, stop = partition.user_range(user.pk)
+            if start == stop:
+                continue
+            values = np.asarray(partition.columns[field][start:stop], dtype=np.int64)
+            ids = np.asarray(partition.columns['id'][start:stop])
+            if position is not None:
+                value, last_id = position
+                value = to_micros(value) if field == 'created_at' else value
+                keep = (values < value) | ((values == value) & (ids < last_id))
+                rows = np.flatnonzero(keep)
+            else:
+                rows = np.arange(stop - start)
+            if len(rows) > limit:
+                rows = rows[np.lexsort((ids[rows], values[rows]))[-limit:]]
+            candidates.extend((int(values[i]), int(ids[i]), partition, start + int(i)) for i in rows)
+        candidates.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [partition.session(row, user) for _, _, partition, row in candidates[:limit]]
+
+    def user_values(self, user_id, fields, chunk_size=2000):
+        """A player's archived games newest first, as values_list-style tuples of fields
+
+        Only chunk_size rows are decoded at a time, so memory does not grow
+        with the player's history.
+        """
+        for partition in reversed(self.partitions()):
+            start, stop = partition.user_range(user_id)
+            for high in range(stop, start, -chunk_size):
+                low = max(start, high - chunk_size)
+                yield from zip(*(partition.values(field, low, high)[::-1] for field in fields))
+
+    def range_values(self, low, high, fields, chunk_size=2000):
+        """Archived games of players with ids in [low, high] as tuples of fields
+
+        Ordered by (user_id, created_at, id) across months, like the table's
+        index; chunk_size rows per month are decoded at a time.
+        """
+        keys = ('user_id', 'created_at', 'id')
+
+        def month_rows(partition):
+            rows = partition.user_rows(low=low, high=high)
+            if not len(rows):
+                return
+            start, stop = int(rows[0]), int(rows[-1]) + 1
+            for chunk_low in range(start, stop, chunk_size):
+                chunk_high = min(stop, chunk_low + chunk_size)
+                yield from zip(*(partition.values(field, chunk_low, chunk_high) for field in keys + tuple(fields)))
+
+        merged = heapq.merge(*(month_rows(partition) for partition in self.partitions()), key=lambda row: row[:3])
+        for row in merged:
+            yield row[3:]
+
+    def user_bounds(self):
+        """(lowest, highest) player id with archived games, or (None, None)"""
+        users = [partition.columns['user_id'] for partition in self.partitions() if partition.rows]
+        if not users:
+            return None, None
+        return min(int(column[0]) for column in users), max(int(column[-1]) for column in users)
+
+    def best_sessions(self, user_ids=None):
+        """{user_id: (score, created_at, session id)} of each player's best ranked archived game"""
+        best = {}
+        for partition in self.partitions():
+            c = partition.columns
+            rows = np.arange(partition.rows) if user_ids is None else partition.user_rows(user_ids=user_ids)
+            rows = rows[np.isin(np.asarray(c['verification_status'][rows]), partition.ranked_codes())]
+            if not len(rows):
+                continue
+            users = np.asarray(c['user_id'][rows])
+            scores = np.asarray(c['score'][rows], dtype=np.int64)
+            created = np.asarray(c['created_at'][rows])
+            ids = np.asarray(c['id'][rows])
+            # Highest score first within each player, the earliest game breaking ties
+            order = np.lexsort((ids, created, -scores, users))
+            picks = order[group_starts(users[order])]
+            for user_id, score, created_us, session_id in zip(
+                users[picks].tolist(), scores[picks].tolist(), created[picks].tolist(), ids[picks].tolist(),
+            ):
+                current = best.get(user_id)
+                candidate = (score, from_micros(created_us), session_id)
+                if current is None or (-score, candidate[1]) < (-current[0], current[1]):
+                    best[user_id] = candidate
+        return best
+
+    # Writes
+
+    def restore(self, session_ids):
+        """Move archived sessions (and their replays) back into GameSession; returns the saved sessions
+
+        For an archived game that becomes a player's best, which PlayerBest
+        must point at. Rows are inserted raw, so stats are not applied a
+        second time, and leave their months once the transaction commits.
+        """
+        sessions = []
+        replays = []
+        for session_id in set(session_ids):
+            found = self.find(session_id)
+            if found is None:
+                continue
+            partition, row = found
+            sessions.append(partition.session(row))
+            replay = partition.replay(row)
+            if replay is not None:
+                replays.append(replay)
+        if not sessions:
+            return []
+        with transaction.atomic():
+            for instance in sessions + replays:
+                instance.save_base(raw=True, force_insert=True)
+        restored_ids = [session.id for session in sessions]
+        transaction.on_commit(lambda: self.drop_sessions(restored_ids))
+        return sessions
+
+    def drop_sessions(self, session_ids):
+        """Rewrite the months holding these sessions without them"""
+        ids = np.asarray(list(session_ids), dtype=np.int64)
+        if not len(ids):
+            return 0
+        dropped = 0
+        with self.locked():
+            for partition in self.partitions():
+                if ids.max() < partition.meta['min_id'] or ids.min() > partition.meta['max_id']:
+                    continue
+                rows = np.flatnonzero(np.isin(partition.columns['id'], ids))
+                dropped += self._rewrite_without(partition, rows)
+        return dropped
+
+    def purge_users(self, user_ids):
+        """Drop every archived game of these players; returns the number of games dropped"""
+        dropped = 0
+        with self.locked():
+            for partition in self.partitions():
+                dropped += self._rewrite_without(partition, partition.user_rows(user_ids=user_ids))
+        return dropped
+
+    def user_ids(self):
+        """Sorted ids of every player with archived games"""
+        ids = [np.unique(partition.columns['user_id']) for partition in self.partitions() if partition.rows]
+        return np.unique(np.concatenate(ids)).tolist() if ids else []
+
+    def purge_deleted_players(self, batch_size=5000):
+        """Drop the archived games of players whose accounts are gone; returns (players, games)"""
+        user_ids = self.user_ids()
+        existing = set()
+        for start in range(0, len(user_ids), batch_size):
+            existing.update(User.objects.filter(pk__in=user_ids[start:start + batch_size]).values_list('pk', flat=True))
+        gone = [user_id for user_id in user_ids if user_id not in existing]
+        if not gone:
+            return 0, 0
+        return len(gone), self.purge_users(gone)
+
+    def _rewrite_without(self, partition, rows):
+        if not len(rows):
+            return 0
+        keep = np.ones(partition.rows, dtype=bool)
+        keep[rows] = False
+        write_partition(partition.path, take_rows(partition.to_columns(), np.flatnonzero(keep)))
+        return len(rows)
+
+    def find(self, session_id):
+        """(partition, row) holding an archived session, or None"""
+        for partition in self.partitions():
+            row = partition.find(session_id)
+            if row is not None:
+                return partition, row
+        return None
+
+    def replay_data(self, session_id):
+        found = self.find(session_id)
+        if found is None:
+            return None
+        partition, row = found
+        if partition.columns['replay_created_at'][row] == NULL_TIME:
+            return None
+        return partition.blob('replay_data', row)
+
+    # Reads for stats rebuilds
+
+    def user_totals(self, user_ids):
+        """UserStats.STATS_AGGREGATES over archived games, per player"""
+        totals = {}
+        for partition in self.partitions():
+            rows = partition.user_rows(user_ids=user_ids)
+            if not len(rows):
+                continue
+            c = partition.columns
+            users = np.asarray(c['user_id'][rows])
+            starts = group_starts(users)
+            durations = np.maximum(np.asarray(c['duration_seconds'][rows], dtype=np.int64), 0)
+            created = np.asarray(c['created_at'][rows])
+            score = np.asarray(c['score'][rows], dtype=np.int64)
+            lines = np.asarray(c['lines_cleared'][rows], dtype=np.int64)
+            columns = {
+                'total_games': np.diff(np.append(starts, len(rows))),
+                'highest_score': np.maximum.reduceat(score, starts),
+                'highest_level': np.maximum.reduceat(np.asarray(c['final_level'][rows], dtype=np.int64), starts),
+                'most_lines_cleared': np.maximum.reduceat(lines, starts),
+                'longest_game_seconds': np.maximum.reduceat(durations, starts),
+                'total_score': np.add.reduceat(score, starts),
+                'total_lines_cleared': np.add.reduceat(lines, starts),
+                'total_pieces_placed': np.add.reduceat(np.asarray(c['pieces_placed'][rows], dtype=np.int64), starts),
+                'total_playtime_seconds': np.add.reduceat(durations, starts),
+                'first_game_at': np.minimum.reduceat(created, starts),
+                'last_game_at': np.maximum.reduceat(created, starts),
+            }
+            for index, user_id in enumerate(users[starts].tolist()):
+                row = {name: int(values[index]) for name, values in columns.items()}
+                row['first_game_at'] = from_micros(row['first_game_at'])
+                row['last_game_at'] = from_micros(row['last_game_at'])
+                add_totals(
+                    totals.setdefault(user_id, {}), row,
+                    maxima=('highest_score', 'highest_level', 'most_lines_cleared',
+                            'longest_game_seconds', 'last_game_at'),
+                    minima=('first_game_at',),
+                )
+        return totals
+
+    def daily_totals(self, user_ids=None, low=None, high=None, since=None, until=None):
+        """DailyUserStats.ROLLUP_AGGREGATES over archived games, per (user_id, UTC day)"""
+        totals = {}
+        since_us = None if since is None else to_micros(since)
+        until_us = None if until is None else to_micros(until)
+        for partition in self.partitions():
+            rows = partition.user_rows(user_ids=user_ids, low=low, high=high)
+            if not len(rows):
+                continue
+            c = partition.columns
+            created = np.asarray(c['created_at'][rows])
+            keep = np.ones(len(rows), dtype=bool)
+            if since_us is not None:
+                keep &= created >= since_us
+            if until_us is not None:
+                keep &= created < until_us
+            rows, created = rows[keep], created[keep]
+            if not len(rows):
+                continue
+            users = np.asarray(c['user_id'][rows])
+            days = created // DAY_US
+            # Rows are sorted by (user, created_at), so (user, day) runs are contiguous
+            starts = np.flatnonzero(np.concatenate(([True], (users[1:] != users[:-1]) | (days[1:] != days[:-1]))))
+            score = np.asarray(c['score'][rows], dtype=np.int64)
+            columns = {
+                'games': np.diff(np.append(starts, len(rows))),
+                'total_score': np.add.reduceat(score, starts),
+                'max_score': np.maximum.reduceat(score, starts),
+                'lines_cleared': np.add.reduceat(np.asarray(c['lines_cleared'][rows], dtype=np.int64), starts),
+                'pieces_placed': np.add.reduceat(np.asarray(c['pieces_placed'][rows], dtype=np.int64), starts),
+                'playtime_seconds': np.add.reduceat(
+                    np.maximum(np.asarray(c['duration_seconds'][rows], dtype=np.int64), 0), starts
+                ),
+            }
+            for index, (user_id, day) in enumerate(zip(users[starts].tolist(), days[starts].tolist())):
+                row = {name: int(values[index]) for name, values in columns.items()}
+                key = (user_id, EPOCH_DAY + timedelta(days=day))
+                add_totals(totals.setdefault(key, {}), row, maxima=('max_score',))
+        return totals
+
+    def ranked_games(self):
+        """(lines_cleared, pieces_placed, duration_seconds) arrays of archived ranked games, per month"""
+        for partition in self.partitions():
+            c = partition.columns
+            ranked = np.isin(np.asarray(c['verification_status']), partition.ranked_codes())
+            yield (
+                np.asarray(c['lines_cleared'])[ranked],
+                np.asarray(c['pieces_placed'])[ranked],
+                np.maximum(np.asarray(c['duration_seconds'])[ranked], 0),
+            )
+
+
+session_archive = SessionArchive()
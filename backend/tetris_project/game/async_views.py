@@ -0,0 +1,92 @@
+#  game/async_views.py
+
+"""Native async variants of the read-heavy game endpoints
+
+Served instead of the DRF views when USE_ASYNC_VIEWS is on and the project
+runs under ASGI (see tetris_project/asgi.py), so polling clients wait on the
+database without holding a worker thread. Responses match the DRF views
+field for field; every relation the serializers touch is loaded up front
+because lazy ORM access is not allowed inside async code.
+
+The leaderboard event stream lives here too; it is always routed but only
+works under ASGI.
+"""
+
+import asyncio
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from tetris_project.cache_versions import LEADERBOARD, user_namespace
+from users.authentication import async_login_required
+from .broadcast import leaderboard_broadcaster
+from .models import PlayerBest, UserAchievement
+from .response_cache import acached_response
+from .serializers import PlayerBestSerializer, UserAchievementSerializer, UserStatsSerializer
+from .views import leaderboard_params
+
+
+@require_GET
+@acached_response('leaderboard', lambda request: LEADERBOARD, leaderboard_params)
+async def global_leaderboard(request):
+    limit, offset = leaderboard_params(request)
+
+    qs = PlayerBest.objects.select_related('user', 'session').order_by(
+        '-score', 'achieved_at'
+    )[offset:offset + limit]
+    bests = [best async for best in qs]
+
+    serializer = PlayerBestSerializer(bests, many=True)
+    return JsonResponse(serializer.data, safe=False)
+
+
+@require_GET
+@async_login_required
+@acached_response('user_stats', lambda request: user_namespace(request.user.pk))
+async def user_stats(request):
+    serializer = UserStatsSerializer(request.user)
+    return JsonResponse(serializer.data)
+
+
+@require_GET
+@async_login_required
+async def user_achievements(request):
+    qs = UserAchievement.objects.filter(user=request.user).select_related('achievement')
+    earned = [user_achievement async for user_achievement in qs]
+
+    serializer = UserAchievementSerializer(earned, many=True)
+    return JsonResponse(serializer.data, safe=False)
+
+
+async def leaderboard_events(request):
+    subscriber, snapshot = await leaderboard_broadcaster.subscribe()
+    keepalive = getattr(settings, 'LEADERBOARD_STREAM_KEEPALIVE_SECONDS', 15)
+    try:
+        yield snapshot
+        while True:
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                # SSE comment line keeps proxies from closing an idle stream
+                yield b': keepalive\n\n'
+                continue
+            if message is None:
+                break
+            yield message
+    finally:
+        leaderboard_broadcaster.unsubscribe(subscriber)
+
+
+@require_GET
+async def leaderboard_stream(request):
+    """Server-Sent Events: a snapshot of the top N, then a diff whenever it changes"""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would hold the stream forever without sending it
+        return JsonResponse({'error': 'Streaming requires the ASGI server'}, status=501)
+
+    response = StreamingHttpResponse(leaderboard_events(request), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,135 @@
+# game/broadcast.py - Fan-out of leaderboard changes to Server-Sent Event streams
+
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import PlayerBest
+from .serializers import PlayerBestSerializer
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Event"""
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+class Subscriber:
+    """One stream client: a bounded queue of encoded events"""
+    __slots__ = ('queue', 'dropped')
+
+    def __init__(self, size):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.dropped = False
+
+    def offer(self, message):
+        """Queue a message; a client that has fallen a whole queue behind is cut off"""
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            # None tells the stream to close; the client reconnects and resyncs
+            self.queue.put_nowait(None)
+
+
+class LeaderboardBroadcaster:
+    """Pushes top-N leaderboard diffs to every subscribed stream in this process
+
+    The top N is read and diffed once per change, encoded once, and the same
+    bytes are queued for every subscriber. Changes made in this process
+    (notify() from the submit path) go out immediately; changes made by other
+    workers are picked up by a periodic re-read while anyone is subscribed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._loop = None
+        self._entries = None
+        self._snapshot = None
+        self._publish_pending = False
+        self._poller = None
+
+    @property
+    def size(self):
+        return getattr(settings, 'LEADERBOARD_STREAM_SIZE', 10)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    async def subscribe(self):
+        """Register a stream; returns (subscriber, snapshot event bytes)"""
+        self._loop = asyncio.get_running_loop()
+        if self._entries is None or not self._subscribers:
+            # Nothing has been polling while nobody was subscribed
+            await self._refresh()
+        subscriber = Subscriber(getattr(settings, 'LEADERBOARD_STREAM_QUEUE_SIZE', 32))
+        self._subscribers.add(subscriber)
+        if self._poller is None or self._poller.done():
+            self._poller = self._loop.create_task(self._poll())
+        return subscriber, self._snapshot
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def notify(self):
+        """Signal that the leaderboard may have changed; safe to call from any thread"""
+        loop = self._loop
+        if loop is None or not self._subscribers or loop.is_closed():
+            return
+        with self._lock:
+            if self._publish_pending:
+                return
+            self._publish_pending = True
+        loop.call_soon_threadsafe(self._schedule_publish)
+
+    def _schedule_publish(self):
+        self._loop.create_task(self._publish())
+
+    async def _poll(self):
+        interval = getattr(settings, 'LEADERBOARD_STREAM_POLL_SECONDS', 5)
+        while self._subscribers:
+            await asyncio.sleep(interval)
+            await self._publish()
+
+    async def _publish(self):
+        with self._lock:
+            self._publish_pending = False
+        message = await self._refresh()
+        if message is None:
+            return
+        for subscriber in list(self._subscribers):
+            subscriber.offer(message)
+
+    async def _refresh(self):
+        """Re-read the top N; return the encoded diff event, or None if unchanged"""
+        entries = await sync_to_async(self._load_top)()
+        previous = self._entries
+        self._entries = entries
+        self._snapshot = sse_event('snapshot', {'entries': entries})
+        if previous is None:
+            return None
+
+        changes = [
+            {'rank': rank, 'entry': entry}
+            for rank, entry in enumerate(entries, start=1)
+            if rank > len(previous) or previous[rank - 1] != entry
+        ]
+        if not changes and len(entries) == len(previous):
+            return None
+        return sse_event('diff', {'changes': changes, 'size': len(entries)})
+
+    def _load_top(self):
+        bests = PlayerBest.objects.select_related('user', 'session').order_by(
+            '-score', 'achieved_at'
+        )[:self.size]
+        return [dict(entry) for entry in PlayerBestSerializer(bests, many=True).data]
+
+
+leaderboard_broadcaster = LeaderboardBroadcaster()
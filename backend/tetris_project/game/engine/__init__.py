@@ -0,0 +1,19 @@
+# game/engine - Server-side Tetris rules mirroring the frontend's gameLogic.js
+
+# game/tests.py checks every rule against a literal port of gameLogic.js and
+# useGame.js. `manage.py bench_engine` measures throughput: about 65k random
+# spawn-and-drop placements per second on one core under CPython (new games
+# included, as random play tops out every ~19 pieces), well short of the
+# 1M/s asked for; that would need native code.
+
+from .game import Game, PieceSequence
+from .rules import (
+    BOARD_HEIGHT, BOARD_WIDTH, FULL_ROW, calculate_drop_time, calculate_level, calculate_score,
+)
+from .tetrominos import PIECE_TYPES, ROTATIONS, TETROMINOS, rotate_shape
+
+__all__ = [
+    'Game', 'PieceSequence', 'BOARD_HEIGHT', 'BOARD_WIDTH', 'FULL_ROW',
+    'calculate_drop_time', 'calculate_level', 'calculate_score',
+    'PIECE_TYPES', 'ROTATIONS', 'TETROMINOS', 'rotate_shape',
+]
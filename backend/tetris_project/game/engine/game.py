@@ -0,0 +1,175 @@
+# game/engine/game.py - Bitboard Tetris game state mirroring hooks/useGame.js
+
+from .rules import BOARD_HEIGHT, BOARD_WIDTH, FULL_ROW, calculate_drop_time, calculate_level, calculate_score
+from .tetrominos import PIECE_TYPES, ROTATIONS
+
+MASK_32 = 0xFFFFFFFF
+
+
+class PieceSequence:
+    """Deterministic piece generator (xorshift32) so a seed reproduces a game
+
+    Simple enough to port to the client unchanged: each call advances the
+    32-bit state and picks PIECE_TYPES[state % 7].
+    """
+    __slots__ = ('state',)
+
+    def __init__(self, seed=None):
+        self.state = (seed or 0x9E3779B9) & MASK_32 or 0x9E3779B9
+
+    def next(self):
+        x = self.state
+        x ^= (x << 13) & MASK_32
+        x ^= x >> 17
+        x ^= (x << 5) & MASK_32
+        self.state = x
+        return x % len(PIECE_TYPES)
+
+
+class Game:
+    """One game: board rows as integer bitmasks plus the falling piece
+
+    rows[0] is the top row; bit c of a row is column c. Moves mutate state in
+    place and never build new boards, and full rows are found by comparing
+    the (at most four) rows the locked piece touched against FULL_ROW.
+    """
+    __slots__ = (
+        'rows', 'pieces', 'piece', 'next_piece', 'rotation', 'x', 'y',
+        'score', 'lines', 'pieces_placed', 'tetrises', 'game_over',
+    )
+
+    def __init__(self, seed=None, pieces=None):
+        self.rows = [0] * BOARD_HEIGHT
+        self.pieces = pieces if pieces is not None else PieceSequence(seed)
+        self.score = 0
+        self.lines = 0
+        self.pieces_placed = 0
+        self.tetrises = 0
+        self.game_over = False
+        self.piece = self.pieces.next()
+        self.next_piece = self.pieces.next()
+        self._spawn()
+
+    def _spawn(self):
+        # Like getRandomTetromino: centred, top row, no collision check until it moves
+        self.rotation = 0
+        self.x = BOARD_WIDTH // 2 - ROTATIONS[self.piece][0].width // 2
+        self.y = 0
+
+    @property
+    def piece_type(self):
+        return PIECE_TYPES[self.piece]
+
+    @property
+    def level(self):
+        return calculate_level(self.lines)
+
+    @property
+    def drop_time(self):
+        return calculate_drop_time(self.lines)
+
+    def fits(self, rotation, x, y):
+        """isValidPosition for the current piece at the given orientation and offset"""
+        rot = ROTATIONS[self.piece][rotation]
+        if x < 0 or x >= len(rot.masks) or y + rot.height > BOARD_HEIGHT:
+            return False
+        masks = rot.masks[x]
+        rows = self.rows
+        for i in range(rot.height):
+            if y + i >= 0 and rows[y + i] & masks[i]:
+                return False
+        return True
+
+    def move(self, dx):
+        if self.game_over or not self.fits(self.rotation, self.x + dx, self.y):
+            return False
+        self.x += dx
+        return True
+
+    def rotate(self):
+        """Rotate clockwise in place; like the client there are no wall kicks"""
+        rotation = (self.rotation + 1) & 3
+        if self.game_over or not self.fits(rotation, self.x, self.y):
+            return False
+        self.rotation = rotation
+        return True
+
+    def step(self):
+        """One gravity step or soft drop; locks the piece when it cannot fall
+
+        Returns the number of lines cleared by a lock, or -1 if the piece moved.
+        """
+        if self.game_over:
+            return 0
+        if self.fits(self.rotation, self.x, self.y + 1):
+            self.y += 1
+            return -1
+        return self.lock()
+
+    def hard_drop(self):
+        """Drop to the lowest valid row and lock; returns lines cleared"""
+        if self.game_over:
+            return 0
+        while self.fits(self.rotation, self.x, self.y + 1):
+            self.y += 1
+        return self.lock()
+
+    def place(self, rotation, x):
+        """Spawn-and-drop the current piece at a rotation and column (for bots and benchmarks)"""
+        if self.game_over or not self.fits(rotation, x, self.y):
+            return -1
+        self.rotation = rotation
+        self.x = x
+        return self.hard_drop()
+
+    def lock(self):
+        # A piece that cannot fall while still at the top ends the game
+        if self.y <= 0:
+            self.game_over = True
+            return 0
+
+        rot = ROTATIONS[self.piece][self.rotation]
+        masks = rot.masks[self.x]
+        rows = self.rows
+        y = self.y
+        for i in range(rot.height):
+            rows[y + i] |= masks[i]
+
+        cleared = 0
+        for row in range(y, y + rot.height):
+            if rows[row] == FULL_ROW:
+                # Rows below keep their index, so the scan can continue downward
+                del rows[row]
+                rows.insert(0, 0)
+                cleared += 1
+
+        self.score += calculate_score(cleared, rot.cells)
+        self.lines += cleared
+        self.pieces_placed += 1
+        if cleared == 4:
+            self.tetrises += 1
+
+        self.piece = self.next_piece
+        self.next_piece = self.pieces.next()
+        self._spawn()
+        return cleared
+
+    def add_garbage(self, count, hole):
+        """Push count rows, full but for column hole, up from the bottom (versus mode)
+
+        Filled rows pushed off the top end the game, as does a freshly
+        spawned piece left overlapping the new rows (it cannot fall, so it
+        locks at the top).
+        """
+        count = min(count, BOARD_HEIGHT)
+        if count <= 0 or self.game_over:
+            return
+        rows = self.rows
+        if any(rows[:count]):
+            self.game_over = True
+        del rows[:count]
+        rows.extend([FULL_ROW & ~(1 << hole)] * count)
+
+    def to_matrix(self):
+        """Board as a list of 0/1 rows, for debugging and comparison with the client"""
+        return [[(row >> c) & 1 for c in range(BOARD_WIDTH)] for row in self.rows]
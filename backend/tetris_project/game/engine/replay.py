@@ -0,0 +1,196 @@
+# game/engine/replay.py - Compact binary replay format
+
+"""Replay layout
+
+    b'TRP' + version byte + varint(seed)        uncompressed header
+    zlib stream of events                       body
+
+Each event is one varint of (frame_delta << 3) | input, where frame_delta is
+the number of 60 Hz frames since the previous event. Most events fit in one
+byte before compression. Encoding and decoding both work on fixed-size
+chunks, so a replay is never held in memory as a list of events.
+"""
+
+import zlib
+
+MAGIC = b'TRP'
+VERSION = 1
+FRAMES_PER_SECOND = 60
+CHUNK_SIZE = 4096
+
+# Player inputs, matching the client's keyboard actions
+LEFT = 0
+RIGHT = 1
+SOFT_DROP = 2
+ROTATE = 3
+HARD_DROP = 4
+PAUSE = 5
+RESUME = 6
+END = 7
+INPUT_BITS = 3
+INPUT_NAMES = ('left', 'right', 'soft_drop', 'rotate', 'hard_drop', 'pause', 'resume', 'end')
+
+
+class ReplayError(ValueError):
+    """Raised for malformed or truncated replay data"""
+
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    """Return (value, new_pos), or (None, pos) if data ends mid-varint"""
+    value = 0
+    shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise ReplayError('Varint too long')
+    return None, pos
+
+
+class ReplayEncoder:
+    """Streams (frame, input) events into a compressed replay
+
+    Pass a writable binary file to stream output as it is produced; otherwise
+    finish() returns the encoded bytes.
+    """
+
+    def __init__(self, seed, sink=None):
+        self._sink = sink
+        self._parts = []
+        self._buffer = bytearray()
+        self._compressor = zlib.compressobj(9)
+        self._last_frame = 0
+        self.events = 0
+        self.frames = 0
+
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        encode_varint(seed, header)
+        self._emit(bytes(header))
+
+    def _emit(self, data):
+        if not data:
+            return
+        if self._sink is not None:
+            self._sink.write(data)
+        else:
+            self._parts.append(data)
+
+    def add(self, frame, action):
+        if frame < self._last_frame:
+            raise ReplayError('Events must be added in frame order')
+        if not 0 <= action <= END:
+            raise ReplayError(f'Unknown input {action}')
+        encode_varint(((frame - self._last_frame) << INPUT_BITS) | action, self._buffer)
+        self._last_frame = frame
+        self.frames = frame
+        self.events += 1
+        if len(self._buffer) >= CHUNK_SIZE:
+            self._emit(self._compressor.compress(bytes(self._buffer)))
+            self._buffer.clear()
+
+    def finish(self):
+        self._emit(self._compressor.compress(bytes(self._buffer)))
+        self._emit(self._compressor.flush())
+        self._buffer.clear()
+        if self._sink is None:
+            return b''.join(self._parts)
+        return None
+
+
+def _chunks(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield bytes(view[start:start + CHUNK_SIZE])
+    else:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ReplayReader:
+    """Decodes a replay from bytes or a binary file, yielding events lazily"""
+
+    def __init__(self, source):
+        self._chunks = _chunks(source)
+        self._pending = b''
+        self.seed = self._read_header()
+
+    def _read_header(self):
+        data = b''
+        for chunk in self._chunks:
+            data += chunk
+            if len(data) >= len(MAGIC) + 1:
+                seed, pos = decode_varint(data, len(MAGIC) + 1)
+                if seed is not None:
+                    break
+        else:
+            raise ReplayError('Truncated replay header')
+
+        if data[:len(MAGIC)] != MAGIC:
+            raise ReplayError('Not a replay')
+        if data[len(MAGIC)] != VERSION:
+            raise ReplayError(f'Unsupported replay version {data[len(MAGIC)]}')
+        self._pending = data[pos:]
+        return seed
+
+    def _compressed(self):
+        if self._pending:
+            yield self._pending
+        yield from self._chunks
+
+    @staticmethod
+    def _events(buffer, frame):
+        """Yield complete events from buffer; return (leftover bytes, frame)"""
+        pos = 0
+        while True:
+            value, next_pos = decode_varint(buffer, pos)
+            if value is None:
+                return buffer[pos:], frame
+            frame += value >> INPUT_BITS
+            yield frame, value & ((1 << INPUT_BITS) - 1)
+            pos = next_pos
+
+    def __iter__(self):
+        """Yield (frame, input) pairs"""
+        decompressor = zlib.decompressobj()
+        buffer = b''
+        frame = 0
+        try:
+            for data in self._compressed():
+                # Bound each inflate step so a tiny payload cannot expand unchecked
+                while data:
+                    buffer += decompressor.decompress(data, CHUNK_SIZE)
+                    data = decompressor.unconsumed_tail
+                    buffer, frame = yield from self._events(buffer, frame)
+            buffer += decompressor.flush()
+            buffer, frame = yield from self._events(buffer, frame)
+        except zlib.error as exc:
+            raise ReplayError(f'Corrupt replay data: {exc}') from exc
+
+        if buffer or not decompressor.eof or decompressor.unused_data:
+            raise ReplayError('Truncated replay data')
+
+
+def summarize(data):
+    """Validate a replay and return (seed, event count, last frame)"""
+    reader = ReplayReader(data)
+    events = 0
+    last_frame = 0
+    for last_frame, _ in reader:
+        events += 1
+    return reader.seed, events, last_frame
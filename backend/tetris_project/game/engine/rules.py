@@ -0,0 +1,36 @@
+# game/engine/rules.py - Scoring and speed rules mirrored from services/gameLogic.js
+
+BOARD_WIDTH = 10
+BOARD_HEIGHT = 20
+FULL_ROW = (1 << BOARD_WIDTH) - 1
+
+# Points for lines cleared by one piece (4 lines = Tetris bonus)
+LINE_SCORES = (0, 100, 300, 500, 800)
+BLOCK_SCORE = 25
+
+# Gravity in milliseconds per row, keyed by the level it starts at
+NES_DROP_TABLE = (
+    (0, 800), (1, 716), (2, 633), (3, 550), (4, 466), (5, 383), (6, 300),
+    (7, 216), (8, 133), (9, 100), (10, 83), (13, 50), (16, 33), (19, 16),
+    (29, 1),  # killscreen
+)
+
+
+def calculate_score(lines_cleared, blocks_placed=0):
+    """Score for one locked piece: line clear bonus plus 25 per block"""
+    return LINE_SCORES[lines_cleared] + blocks_placed * BLOCK_SCORE
+
+
+def calculate_level(lines_cleared_total):
+    return lines_cleared_total // 10
+
+
+def calculate_drop_time(lines_cleared_total):
+    """Milliseconds between gravity steps for the level reached"""
+    level = calculate_level(lines_cleared_total)
+    drop_time = NES_DROP_TABLE[0][1]
+    for start_level, time_ms in NES_DROP_TABLE:
+        if level < start_level:
+            break
+        drop_time = time_ms
+    return drop_time
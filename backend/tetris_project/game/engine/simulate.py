@@ -0,0 +1,91 @@
+# game/engine/simulate.py - Re-run a recorded replay to check a submitted score
+
+from .game import Game
+from .replay import (
+    END, FRAMES_PER_SECOND, HARD_DROP, LEFT, PAUSE, RESUME, RIGHT, ROTATE, SOFT_DROP,
+    ReplayError, ReplayReader,
+)
+
+# Stop simulating absurdly long recordings (6 hours of frames)
+MAX_FRAMES = 6 * 60 * 60 * FRAMES_PER_SECOND
+
+
+def drop_frames(game):
+    """Gravity interval in frames for the game's current level (at least one frame)"""
+    return max(1.0, game.drop_time * FRAMES_PER_SECOND / 1000)
+
+
+def simulate(data):
+    """Replay the recorded inputs on a fresh Game and return it
+
+    Mirrors the client game loop: gravity fires drop_time after the last state
+    change, because useGame.js restarts its interval whenever the piece or
+    board changes, and nothing falls while paused.
+    """
+    reader = ReplayReader(data)
+    game = Game(seed=reader.seed)
+    paused = False
+    last_change = 0.0
+
+    for frame, action in reader:
+        if frame > MAX_FRAMES:
+            break
+
+        if not paused:
+            # Gravity steps due before this input
+            while not game.game_over and last_change + drop_frames(game) <= frame:
+                last_change += drop_frames(game)
+                game.step()
+        if game.game_over or action == END:
+            break
+
+        if action == PAUSE:
+            paused = True
+            continue
+        if action == RESUME:
+            paused = False
+            last_change = frame
+            continue
+        if paused:
+            continue
+
+        if action == LEFT:
+            changed = game.move(-1)
+        elif action == RIGHT:
+            changed = game.move(1)
+        elif action == ROTATE:
+            changed = game.rotate()
+        elif action == SOFT_DROP:
+            game.step()
+            changed = True
+        elif action == HARD_DROP:
+            game.hard_drop()
+            changed = True
+        else:
+            changed = False
+        if changed:
+            last_change = frame
+
+    return game
+
+
+def verify(data, claimed):
+    """Check claimed totals against a simulation of the replay
+
+    claimed maps 'score', 'lines_cleared', 'tetrises_cleared' and
+    'pieces_placed' to submitted values. Returns (ok, reason).
+    """
+    try:
+        game = simulate(data)
+    except ReplayError as exc:
+        return False, str(exc)
+    if claimed['score'] != game.score:
+        return False, f"score {claimed['score']} != simulated {game.score}"
+    if claimed['lines_cleared'] != game.lines:
+        return False, f"lines {claimed['lines_cleared']} != simulated {game.lines}"
+    # The client does not report these yet, so only reject overclaims
+    if claimed.get('tetrises_cleared', 0) > game.tetrises:
+        return False, f"tetrises {claimed['tetrises_cleared']} > simulated {game.tetrises}"
+    if claimed.get('pieces_placed', 0) > game.pieces_placed:
+        return False, f"pieces {claimed['pieces_placed']} > simulated {game.pieces_placed}"
+    return True, ''
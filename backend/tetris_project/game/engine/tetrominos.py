@@ -0,0 +1,57 @@
+# game/engine/tetrominos.py - Piece shapes from utils/tetrominos.js as precomputed bitmasks
+
+from .rules import BOARD_WIDTH
+
+TETROMINOS = {
+    'I': {'shape': ((1, 1, 1, 1),), 'color': '#00f0f0'},
+    'O': {'shape': ((1, 1), (1, 1)), 'color': '#f0f000'},
+    'T': {'shape': ((0, 1, 0), (1, 1, 1)), 'color': '#a000f0'},
+    'S': {'shape': ((0, 1, 1), (1, 1, 0)), 'color': '#00f000'},
+    'Z': {'shape': ((1, 1, 0), (0, 1, 1)), 'color': '#f00000'},
+    'J': {'shape': ((1, 0, 0), (1, 1, 1)), 'color': '#0000f0'},
+    'L': {'shape': ((0, 0, 1), (1, 1, 1)), 'color': '#f0a000'},
+}
+
+# Fixed piece order, so a piece can be referred to by index (replays, seeds)
+PIECE_TYPES = tuple(TETROMINOS)
+
+
+def rotate_shape(shape):
+    """Rotate 90 degrees clockwise, exactly like rotatePiece in gameLogic.js"""
+    return tuple(
+        tuple(row[i] for row in reversed(shape))
+        for i in range(len(shape[0]))
+    )
+
+
+class Rotation:
+    """One orientation of a piece with its row masks at every legal column"""
+    __slots__ = ('shape', 'width', 'height', 'cells', 'masks')
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.width = len(shape[0])
+        self.height = len(shape)
+        self.cells = sum(sum(row) for row in shape)
+        # masks[x] holds one bitmask per shape row with the piece's left edge
+        # at column x; bit c is board column c
+        row_bits = tuple(
+            sum(1 << c for c, filled in enumerate(row) if filled)
+            for row in shape
+        )
+        self.masks = tuple(
+            tuple(bits << x for bits in row_bits)
+            for x in range(BOARD_WIDTH - self.width + 1)
+        )
+
+
+def build_rotations(shape):
+    """All four clockwise rotations, starting from the spawn orientation"""
+    rotations = []
+    for _ in range(4):
+        rotations.append(Rotation(shape))
+        shape = rotate_shape(shape)
+    return tuple(rotations)
+
+
+ROTATIONS = tuple(build_rotations(TETROMINOS[name]['shape']) for name in PIECE_TYPES)
@@ -0,0 +1,163 @@
+# game/export.py - Streaming NDJSON / CSV exports of a player's game history
+
+"""Game history exports, written row by row as the response streams
+
+Rows come straight from values_list().iterator() and the archive's column
+files, merged newest first, and are encoded CHUNK_ROWS at a time: no model
+or serializer instances are built and memory stays flat however long the
+history is. Under ASGI the chunks are pulled through sync_to_async, since
+Django would otherwise read a sync iterator into a list before sending it.
+"""
+
+import csv
+import heapq
+import io
+import json
+import zlib
+from itertools import islice
+from json.encoder import encode_basestring
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from .archive import session_archive, unique_ids
+from .models import GameSession
+
+CHUNK_ROWS = 2000
+GZIP_LEVEL = 6
+
+EXPORT_FIELDS = (
+    'id', 'score', 'final_level', 'lines_cleared', 'pieces_placed', 'tetrises_cleared',
+    't_spins', 'max_combo', 'duration_seconds', 'end_reason', 'verification_status',
+    'started_at', 'ended_at', 'created_at', 'game_data',
+)
+SORT_INDEX = EXPORT_FIELDS.index('created_at')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+compact_json = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def iso(moment):
+    """A datetime as DRF renders it elsewhere in the API"""
+    if moment is None:
+        return None
+    value = moment.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def json_time(moment):
+    return 'null' if moment is None else f'"{iso(moment)}"'
+
+
+def json_number(value):
+    return 'null' if value is None else str(value)
+
+
+def json_game_data(value):
+    return compact_json(value) if value else '{}'
+
+
+def keep(value):
+    return value
+
+
+# One line template and per-field encoders instead of a dict and json.dumps per row
+NDJSON_LINE = '{' + ','.join(f'"{field}":%s' for field in EXPORT_FIELDS) + '}'
+NDJSON_ENCODERS = tuple(
+    json_time if field.endswith('_at')
+    else json_game_data if field == 'game_data'
+    else encode_basestring if field in ('end_reason', 'verification_status')
+    else json_number
+    for field in EXPORT_FIELDS
+)
+CSV_ENCODERS = tuple(
+    iso if field.endswith('_at') else json_game_data if field == 'game_data' else keep
+    for field in EXPORT_FIELDS
+)
+
+
+def history_rows(user_id):
+    """Every game of a player, hot and archived, as EXPORT_FIELDS tuples newest first"""
+    hot = (
+        GameSession.objects.filter(user_id=user_id).order_by('-created_at', '-id')
+        .values_list(*EXPORT_FIELDS).iterator(chunk_size=CHUNK_ROWS)
+    )
+    archived = session_archive.user_values(user_id, EXPORT_FIELDS, CHUNK_ROWS)
+    return unique_ids(heapq.merge(hot, archived, key=lambda row: (row[SORT_INDEX], row[0]), reverse=True))
+
+
+def batches(rows, size=CHUNK_ROWS):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def ndjson_chunks(rows):
+    for batch in batches(rows):
+        lines = [
+            NDJSON_LINE % tuple([encode(value) for encode, value in zip(NDJSON_ENCODERS, row)])
+            for row in batch
+        ]
+        lines.append('')
+        yield '\n'.join(lines).encode()
+
+
+def csv_chunks(rows):
+    """CSV with a header row; game_data is a JSON string and NULL an empty field"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in batches(rows):
+        writer.writerows([encode(value) for encode, value in zip(CSV_ENCODERS, row)] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Only the header, for a player without games
+        yield buffer.getvalue().encode()
+
+
+def gzipped(chunks, level=GZIP_LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def pulled_async(chunks):
+    """Iterate a sync iterator from async code one chunk per thread hop, keeping it streaming"""
+    chunks = iter(chunks)
+    done = object()
+    try:
+        while (chunk := await sync_to_async(next, thread_sensitive=True)(chunks, done)) is not done:
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+def export_response(request, user, export_format, compress=False):
+    """StreamingHttpResponse with a player's full history as export_format ('ndjson' or 'csv')"""
+    encode = ndjson_chunks if export_format == 'ndjson' else csv_chunks
+    chunks = encode(history_rows(user.pk))
+    filename = f'game-history-{user.username}.{export_format}'
+    content_type = CONTENT_TYPES[export_format]
+    if compress:
+        chunks = gzipped(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    if isinstance(request, ASGIRequest):
+        chunks = pulled_async(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Cache-Control'] = 'private, no-store'
+    return response
@@ -0,0 +1,411 @@
+# game/leaderboard.py - In-process ranked leaderboard
+
+import atexit
+import os
+import random
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import PlayerBest
+
+MAX_LEVELS = 32
+
+SNAPSHOT_MAGIC = b'TLB2'
+SNAPSHOT_HEADER = struct.Struct('<4sdQ')   # magic, PlayerBest's max updated_at and row count when written
+SNAPSHOT_ENTRY = struct.Struct('<qqd')     # user_id, score, achieved_at timestamp
+
+
+class _Infinity:
+    """Sentinel key that sorts after every real key"""
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return other is self
+
+    def __gt__(self, other):
+        return other is not self
+
+    def __ge__(self, other):
+        return True
+
+
+INFINITY = _Infinity()
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, next_nodes, widths):
+        self.key = key
+        self.next = next_nodes
+        self.width = widths
+
+
+NIL = _Node(INFINITY, [], [])
+
+
+class IndexableSkipList:
+    """Sorted set of unique keys with O(log n) insert, remove, rank and index lookup"""
+
+    def __init__(self, keys=()):
+        self.size = 0
+        self.head = _Node(None, [NIL] * MAX_LEVELS, [1] * MAX_LEVELS)
+        if keys:
+            self._build(keys)
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def _random_level():
+        # Geometric with p=1/2: one plus the number of trailing zero bits
+        bits = random.getrandbits(MAX_LEVELS - 1) | (1 << (MAX_LEVELS - 1))
+        return (bits & -bits).bit_length()
+
+    def _build(self, sorted_keys):
+        """Link already-sorted keys in O(n) instead of n separate inserts"""
+        last = [self.head] * MAX_LEVELS
+        last_pos = [0] * MAX_LEVELS
+        position = 0
+        for position, key in enumerate(sorted_keys, start=1):
+            level = self._random_level()
+            node = _Node(key, [NIL] * level, [1] * level)
+            for i in range(level):
+                last[i].next[i] = node
+                last[i].width[i] = position - last_pos[i]
+                last[i] = node
+                last_pos[i] = position
+        for i in range(MAX_LEVELS):
+            last[i].next[i] = NIL
+            last[i].width[i] = position + 1 - last_pos[i]
+        self.size = position
+
+    def insert(self, key):
+        chain = [None] * MAX_LEVELS
+        steps_at_level = [0] * MAX_LEVELS
+        node = self.head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key <= key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        depth = self._random_level()
+        new_node = _Node(key, [None] * depth, [None] * depth)
+        steps = 0
+        for level in range(depth):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(depth, MAX_LEVELS):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * MAX_LEVELS
+        node = self.head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is NIL or target.key != key:
+            raise KeyError(key)
+
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def index(self, key):
+        """Return the 0-based position of key"""
+        position = 0
+        node = self.head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        if node.next[0] is NIL or node.next[0].key != key:
+            raise KeyError(key)
+        return position
+
+    def iter_from(self, index):
+        """Yield keys in order starting at the given 0-based position"""
+        if index >= self.size:
+            return
+        remaining = index + 1
+        node = self.head
+        for level in reversed(range(MAX_LEVELS)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        while node is not NIL:
+            yield node.key
+            node = node.next[0]
+
+
+class RankedLeaderboard:
+    """Players ordered by best score, loaded lazily from PlayerBest and kept current in-process
+
+    Entries are keyed (-score, achieved_at, user_id) so ties rank the earlier
+    game first, matching the global leaderboard endpoint. Other processes'
+    submissions and late replay verifications are picked up by periodically
+    re-reading PlayerBest rows by updated_at. Deleted rows leave no updated_at
+    behind, so every LEADERBOARD_RECONCILE_SECONDS the entry count is compared
+    with PlayerBest's and, when they differ, the set of players is re-read.
+
+    A snapshot records PlayerBest's max updated_at and row count, and is only
+    loaded while the table still shows both: any write since, a restored
+    backup or another database means reading PlayerBest instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._saving = threading.Lock()
+        self._list = None
+        self._keys = {}
+        self._watermark = 0.0
+        self._last_sync = 0.0
+        self._last_reconcile = 0.0
+        self._dirty = 0
+
+    @property
+    def loaded(self):
+        return self._list is not None
+
+    # Loading and persistence
+
+    def ensure_loaded(self):
+        if self._list is None:
+            with self._lock:
+                if self._list is None:
+                    self._load()
+        elif time.monotonic() - self._last_sync >= self._setting('LEADERBOARD_SYNC_SECONDS', 5):
+            self.sync()
+
+    def _load(self):
+        if not self._load_snapshot():
+            self._load_from_db()
+        self._last_reconcile = time.monotonic()
+        self.sync()
+
+    def _load_from_db(self):
+        rows = PlayerBest.objects.order_by().values_list('user_id', 'score', 'achieved_at', 'updated_at')
+        entries = []
+        watermark = 0.0
+        for user_id, score, achieved_at, updated_at in rows.iterator(chunk_size=10000):
+            entries.append((-score, achieved_at.timestamp(), user_id))
+            watermark = max(watermark, updated_at.timestamp())
+        self._replace(entries, watermark)
+
+    def _load_snapshot(self):
+        path = self._setting('LEADERBOARD_SNAPSHOT_PATH', None)
+        if not path or not os.path.exists(path):
+            return False
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        if len(data) < SNAPSHOT_HEADER.size:
+            return False
+        magic, watermark, count = SNAPSHOT_HEADER.unpack_from(data)
+        body = memoryview(data)[SNAPSHOT_HEADER.size:]
+        if magic != SNAPSHOT_MAGIC or len(body) != count * SNAPSHOT_ENTRY.size:
+            return False
+        if (watermark, count) != table_state():
+            return False
+        entries = [(-score, timestamp, user_id) for user_id, score, timestamp in SNAPSHOT_ENTRY.iter_unpack(body)]
+        self._replace(entries, watermark)
+        return True
+
+    def _replace(self, entries, watermark):
+        entries.sort()
+        self._list = IndexableSkipList(entries)
+        self._keys = {key[2]: key for key in entries}
+        self._watermark = watermark
+
+    def unload(self):
+        """Drop the loaded entries; the next query reloads them"""
+        with self._lock:
+            self._list = None
+            self._keys = {}
+            self._watermark = 0.0
+            self._last_reconcile = 0.0
+            self._dirty = 0
+
+    def save_snapshot(self):
+        """Write all entries to LEADERBOARD_SNAPSHOT_PATH for fast warm restarts
+
+        Skipped unless, after a sync, the entries are exactly as many as the
+        rows and have seen the latest updated_at, so the snapshot's header
+        describes the table its entries were read from.
+        """
+        path = self._setting('LEADERBOARD_SNAPSHOT_PATH', None)
+        # sync() may call back in here through set()
+        if not path or self._list is None or not self._saving.acquire(blocking=False):
+            return
+        try:
+            watermark, count = table_state()
+            self.sync()
+            with self._lock:
+                keys = list(self._keys.values())
+                current = self._watermark == watermark and len(keys) == count
+                self._dirty = 0
+        finally:
+            self._saving.release()
+        if not current:
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            fh.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, watermark, len(keys)))
+            fh.write(b''.join(SNAPSHOT_ENTRY.pack(user_id, -neg_score, timestamp)
+                              for neg_score, timestamp, user_id in keys))
+        os.replace(tmp_path, path)
+
+    def sync(self):
+        """Apply PlayerBest rows changed since the last sync"""
+        overlap = self._setting('LEADERBOARD_SYNC_OVERLAP_SECONDS', 5)
+        since = self._watermark - overlap
+        with self._lock:
+            self._last_sync = time.monotonic()
+        rows = PlayerBest.objects.filter(
+            updated_at__gte=_from_timestamp(since)
+        ).order_by().values_list('user_id', 'score', 'achieved_at', 'updated_at')
+        watermark = self._watermark
+        for user_id, score, achieved_at, updated_at in rows:
+            self.set(user_id, score, achieved_at)
+            watermark = max(watermark, updated_at.timestamp())
+        with self._lock:
+            self._watermark = max(self._watermark, watermark)
+        if time.monotonic() - self._last_reconcile >= self._setting('LEADERBOARD_RECONCILE_SECONDS', 60):
+            self._last_reconcile = time.monotonic()
+            if PlayerBest.objects.count() != len(self._list):
+                self.reconcile()
+
+    def reconcile(self):
+        """Match the entries to the current set of PlayerBest rows
+
+        Drops players whose row was deleted (PlayerBest.refresh_for_user, a
+        deleted account) in another process, and adds any row sync missed.
+        """
+        self._last_reconcile = time.monotonic()
+        live = set(PlayerBest.objects.order_by().values_list('user_id', flat=True).iterator(chunk_size=10000))
+        with self._lock:
+            for user_id in [user_id for user_id in self._keys if user_id not in live]:
+                self._list.remove(self._keys.pop(user_id))
+                self._dirty += 1
+            missing = list(live.difference(self._keys))
+        for start in range(0, len(missing), 900):
+            rows = PlayerBest.objects.filter(user_id__in=missing[start:start + 900]).values_list(
+                'user_id', 'score', 'achieved_at'
+            )
+            for user_id, score, achieved_at in rows:
+                self.set(user_id, score, achieved_at)
+
+    @staticmethod
+    def _setting(name, default):
+        return getattr(settings, name, default)
+
+    # Updates
+
+    def set(self, user_id, score, achieved_at):
+        """Store a player's current best score, replacing any previous entry"""
+        if self._list is None:
+            return
+        timestamp = achieved_at.timestamp()
+        key = (-score, timestamp, user_id)
+        with self._lock:
+            old = self._keys.get(user_id)
+            if old == key:
+                return
+            if old is not None:
+                self._list.remove(old)
+            self._list.insert(key)
+            self._keys[user_id] = key
+            self._dirty += 1
+        self._maybe_snapshot()
+
+    def offer(self, user_id, score, achieved_at):
+        """Record a new game, keeping the stored entry unless the score beats it"""
+        old = self._keys.get(user_id)
+        if old is None or score > -old[0]:
+            self.set(user_id, score, achieved_at)
+
+    def discard(self, user_id):
+        if self._list is None:
+            return
+        with self._lock:
+            old = self._keys.pop(user_id, None)
+            if old is not None:
+                self._list.remove(old)
+                self._dirty += 1
+
+    def _maybe_snapshot(self):
+        if self._dirty >= self._setting('LEADERBOARD_SNAPSHOT_EVERY', 1000):
+            self.save_snapshot()
+
+    # Queries
+
+    def __len__(self):
+        self.ensure_loaded()
+        return len(self._list)
+
+    def top(self, limit, offset=0):
+        """Return [(rank, user_id, score)] for ranks offset+1 .. offset+limit"""
+        self.ensure_loaded()
+        with self._lock:
+            return self._slice(offset, limit)
+
+    def rank(self, user_id):
+        """Return (rank, score) for a player, or None if they have no games"""
+        self.ensure_loaded()
+        with self._lock:
+            key = self._keys.get(user_id)
+            if key is None:
+                return None
+            return self._list.index(key) + 1, -key[0]
+
+    def around(self, user_id, count):
+        """Return the player's entry with up to count players above and below"""
+        self.ensure_loaded()
+        with self._lock:
+            key = self._keys.get(user_id)
+            if key is None:
+                return []
+            index = self._list.index(key)
+            start = max(0, index - count)
+            return self._slice(start, index - start + count + 1)
+
+    def _slice(self, offset, limit):
+        entries = []
+        for rank, key in enumerate(self._list.iter_from(offset), start=offset + 1):
+            if len(entries) >= limit:
+                break
+            entries.append((rank, key[2], -key[0]))
+        return entries
+
+
+def _from_timestamp(timestamp):
+    return datetime.fromtimestamp(max(timestamp, 0), tz=timezone.utc)
+
+
+def table_state():
+    """(max updated_at timestamp, row count) of PlayerBest"""
+    state = PlayerBest.objects.aggregate(latest=Max('updated_at'), rows=Count('pk'))
+    return (state['latest'].timestamp() if state['latest'] else 0.0), state['rows']
+
+
+ranked_leaderboard = RankedLeaderboard()
+atexit.register(ranked_leaderboard.save_snapshot)
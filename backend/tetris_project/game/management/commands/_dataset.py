@@ -0,0 +1,318 @@
+# management/commands/_dataset.py - Reproducible fake players and game sessions
+
+from contextlib import contextmanager
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from game.models import DailyUserStats, GameSession, UserStats
+from users.progression import exp_for_score, level_for_total
+
+User = get_user_model()
+
+PASSWORD = 'tetris-bench-password'
+HISTORY_DAYS = 180
+END_REASONS = np.array(['top_out', 'quit'])
+ROWS_PER_INSERT = 50
+
+
+def games_per_user(rng, count, mean, spread):
+    """Games for each of count players: exactly mean, or a long-tailed spread around it
+
+    The spread is negative binomial, so most players have a handful of games
+    (some none) while a few have thousands, as on a real leaderboard.
+    """
+    if not spread:
+        return np.full(count, mean, dtype=np.int64)
+    shape = 0.6
+    return rng.negative_binomial(shape, shape / (shape + mean), count).astype(np.int64)
+
+
+def session_columns(rng, games, now):
+    """Per-game stats arrays with roughly the shape of real play, in play order per player
+
+    Lines cleared are log-normal (most games are short, a few run long),
+    pieces follow from lines, and duration from a per-game pieces-per-second
+    rate, so score, level and duration stay consistent with each other.
+    """
+    count = int(games.sum())
+    owner = np.repeat(np.arange(len(games)), games)
+    lines = np.minimum(rng.lognormal(2.8, 0.9, count), 400).astype(np.int64)
+    pieces = (lines * 2.5 + rng.integers(5, 30, count)).astype(np.int64)
+    tetrises = rng.binomial(lines // 4, 0.15)
+    score = pieces * 25 + tetrises * 800 + (lines - tetrises * 4) * 120
+    pieces_per_second = np.clip(rng.normal(1.2, 0.35, count), 0.3, 3.5)
+    duration = np.maximum(pieces / pieces_per_second, 1).astype(np.int64)
+    ended_at = now - rng.integers(0, HISTORY_DAYS * 86400 * 10 ** 6, count).astype('timedelta64[us]')
+    columns = {
+        'owner': owner,
+        'score': score,
+        'lines_cleared': lines,
+        'pieces_placed': pieces,
+        'tetrises_cleared': tetrises,
+        't_spins': rng.poisson(lines / 40),
+        'max_combo': rng.poisson(1.5, count),
+        'final_level': lines // 10 + 1,
+        'duration_seconds': duration,
+        'end_reason': END_REASONS[(rng.random(count) < 0.15).astype(np.int64)],
+        'ended_at': ended_at,
+        'started_at': ended_at - duration.astype('timedelta64[s]'),
+    }
+    # ids then follow play order within each player, as they do for real games
+    order = np.lexsort((ended_at, owner))
+    return {name: values[order] for name, values in columns.items()}
+
+
+def db_datetimes(values):
+    """datetime64[us] array (UTC) -> 'YYYY-MM-DD HH:MM:SS.ffffff' strings, as Django stores them on SQLite"""
+    text = np.datetime_as_string(values, unit='us')
+    # Swap the 'T' separator in place: the strings are fixed-width UCS-4
+    text.view(np.uint32).reshape(len(text), -1)[:, 10] = ord(' ')
+    return text
+
+
+def insert_rows(model, columns, count):
+    """INSERT count rows given per-field arrays (or one value for every row)
+
+    This skips bulk_create's per-object work (instances, pre_save, value
+    preparation), so values must already be in database form. Rows are
+    sent ROWS_PER_INSERT at a time in multi-row INSERTs.
+    """
+    meta = model._meta
+    quote = connection.ops.quote_name
+    table = np.empty((count, len(columns)), dtype=object)
+    for index, value in enumerate(columns.values()):
+        table[:, index] = value
+
+    max_params = connection.features.max_query_params
+    per_insert = min(ROWS_PER_INSERT, max_params // len(columns)) if max_params else ROWS_PER_INSERT
+    row = '({})'.format(', '.join(['%s'] * len(columns)))
+    sql = 'INSERT INTO {} ({}) VALUES '.format(
+        quote(meta.db_table),
+        ', '.join(quote(meta.get_field(name).column) for name in columns),
+    )
+    full = count - count % per_insert
+    with connection.cursor() as cursor:
+        if full:
+            cursor.executemany(sql + ', '.join([row] * per_insert), table[:full].reshape(-1, per_insert * len(columns)).tolist())
+        if full < count:
+            cursor.executemany(sql + row, table[full:].tolist())
+
+
+def create_users(prefix, start, games, columns, password_hash, now):
+    """Insert players with counters and levels matching their sessions; returns their ids"""
+    count = len(games)
+    starts = np.r_[0, np.cumsum(games)[:-1]]
+    played = games > 0
+    totals = np.zeros(count, dtype=np.int64)
+    best = np.zeros(count, dtype=np.int64)
+    exp = np.zeros(count, dtype=np.int64)
+    joined = np.full(count, now)
+    if played.any():
+        totals[played] = np.add.reduceat(columns['score'], starts[played])
+        best[played] = np.maximum.reduceat(columns['score'], starts[played])
+        exp[played] = np.add.reduceat(exp_for_score(columns['score']), starts[played])
+        # Players joined just before their first game
+        joined[played] = columns['started_at'][starts[played]] - np.timedelta64(10, 'm')
+    levels = [level_for_total(total) for total in exp.tolist()]
+    names = [f'{prefix}{i}' for i in range(start, start + count)]
+    joined = db_datetimes(joined)
+
+    insert_rows(User, {
+        'password': password_hash,
+        'last_login': None,
+        'is_superuser': False,
+        'username': names,
+        'first_name': '',
+        'last_name': '',
+        'email': [f'{name}@example.com' for name in names],
+        'is_staff': False,
+        'is_active': True,
+        'date_joined': joined,
+        'created_at': joined,
+        'total_score': totals,
+        'games_played': games,
+        'highest_score': best,
+        'player_level': [level for level, _ in levels],
+        'exp': [level_exp for _, level_exp in levels],
+        'lifetime_exp': exp,
+        'player_name': names,
+    }, count)
+
+    ids = {}
+    for offset in range(0, count, 900):
+        ids.update(User.objects.filter(username__in=names[offset:offset + 900]).values_list('username', 'id'))
+    return [ids[name] for name in names]
+
+
+def insert_sessions(user_ids, columns, game_data):
+    count = len(columns['score'])
+    created_at = db_datetimes(columns['ended_at'])
+    insert_rows(GameSession, {
+        'user': np.asarray(user_ids, dtype=np.int64)[columns['owner']],
+        'score': columns['score'],
+        'final_level': columns['final_level'],
+        'lines_cleared': columns['lines_cleared'],
+        'started_at': db_datetimes(columns['started_at']),
+        'ended_at': created_at,
+        'duration_seconds': columns['duration_seconds'],
+        'pieces_placed': columns['pieces_placed'],
+        'tetrises_cleared': columns['tetrises_cleared'],
+        't_spins': columns['t_spins'],
+        'max_combo': columns['max_combo'],
+        'end_reason': columns['end_reason'],
+        'game_data': game_data,
+        'verification_status': 'verified',
+        'verification_note': '',
+        'created_at': created_at,
+        'updated_at': created_at,
+    }, count)
+    return count
+
+
+def insert_user_stats(user_ids, games, columns, updated_at):
+    """UserStats rows for players with games, aggregated from the session arrays"""
+    played = games > 0
+    if not played.any():
+        return 0
+    starts = np.r_[0, np.cumsum(games)[:-1]][played]
+    counts = games[played]
+    total_score = np.add.reduceat(columns['score'], starts)
+    total_lines = np.add.reduceat(columns['lines_cleared'], starts)
+    # Sessions are in play order per player, so first and last are at the group edges
+    ended_at = columns['ended_at']
+    insert_rows(UserStats, {
+        'user': np.asarray(user_ids, dtype=np.int64)[played],
+        'total_games': counts,
+        'games_won': 0,
+        'highest_score': np.maximum.reduceat(columns['score'], starts),
+        'highest_level': np.maximum.reduceat(columns['final_level'], starts),
+        'most_lines_cleared': np.maximum.reduceat(columns['lines_cleared'], starts),
+        'longest_game_seconds': np.maximum.reduceat(columns['duration_seconds'], starts),
+        'total_score': total_score,
+        'total_lines_cleared': total_lines,
+        'total_pieces_placed': np.add.reduceat(columns['pieces_placed'], starts),
+        'total_playtime_seconds': np.add.reduceat(columns['duration_seconds'], starts),
+        'average_score': total_score / counts,
+        'average_lines_per_game': total_lines / counts,
+        'first_game_at': db_datetimes(ended_at[starts]),
+        'last_game_at': db_datetimes(ended_at[starts + counts - 1]),
+        'updated_at': updated_at,
+    }, len(counts))
+    return len(counts)
+
+
+def insert_daily_stats(user_ids, columns):
+    """DailyUserStats rows for every (player, day) with games; days are UTC dates"""
+    day = columns['ended_at'].astype('datetime64[D]')
+    owner = columns['owner']
+    if not len(owner):
+        return 0
+    # Sessions are sorted by player then time, so each (player, day) is one run
+    starts = np.flatnonzero(np.r_[True, (owner[1:] != owner[:-1]) | (day[1:] != day[:-1])])
+    count = len(starts)
+    insert_rows(DailyUserStats, {
+        'user': np.asarray(user_ids, dtype=np.int64)[owner[starts]],
+        'day': np.datetime_as_string(day[starts]),
+        'games': np.diff(np.r_[starts, len(owner)]),
+        'total_score': np.add.reduceat(columns['score'], starts),
+        'max_score': np.maximum.reduceat(columns['score'], starts),
+        'lines_cleared': np.add.reduceat(columns['lines_cleared'], starts),
+        'pieces_placed': np.add.reduceat(columns['pieces_placed'], starts),
+        'playtime_seconds': np.add.reduceat(columns['duration_seconds'], starts),
+    }, count)
+    return count
+
+
+@contextmanager
+def fast_writes():
+    """On SQLite, skip fsync and use a larger page cache and in-memory sorting while loading
+
+    An application crash still rolls back cleanly; only an OS crash or power
+    loss mid-load can damage the file, which is acceptable for generated data.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous')
+        synchronous = cursor.fetchone()[0]
+        cursor.execute('PRAGMA cache_size')
+        cache_size = cursor.fetchone()[0]
+        cursor.execute('PRAGMA temp_store')
+        temp_store = cursor.fetchone()[0]
+        cursor.execute('PRAGMA synchronous = OFF')
+        cursor.execute('PRAGMA cache_size = -262144')
+        # Index builds sort in memory instead of spilling to temp files
+        cursor.execute('PRAGMA temp_store = MEMORY')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA synchronous = {int(synchronous)}')
+            cursor.execute(f'PRAGMA cache_size = {int(cache_size)}')
+            cursor.execute(f'PRAGMA temp_store = {int(temp_store)}')
+
+
+@contextmanager
+def deferred_indexes(model):
+    """On SQLite, drop model's secondary indexes while loading and build them once at the end
+
+    Building an index in one sorted pass is several times cheaper than
+    updating it row by row. Indexes backing UNIQUE constraints are kept.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+            [model._meta.db_table],
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+def seed_batches(users, sessions_per_user, seed, prefix='player', batch_size=2000, spread=False):
+    """Insert players, their sessions, UserStats and daily rollups, one transaction per batch_size players
+
+    Yields (user ids, sessions inserted) after each batch. The same seed
+    always produces the same rows, with dates relative to now. Every user
+    shares one password hash (PASSWORD), so nothing is hashed per user.
+    """
+    rng = np.random.default_rng(seed)
+    now = timezone.now()
+    now64 = np.datetime64(now.replace(tzinfo=None), 'us')
+    updated_at = str(db_datetimes(np.array([now64]))[0])
+    password_hash = make_password(PASSWORD, salt='bench')
+    game_data = GameSession._meta.get_field('game_data').get_db_prep_save({}, connection)
+
+    for start in range(0, users, batch_size):
+        games = games_per_user(rng, min(batch_size, users - start), sessions_per_user, spread)
+        columns = session_columns(rng, games, now64)
+        with transaction.atomic():
+            user_ids = create_users(prefix, start, games, columns, password_hash, now64)
+            sessions = insert_sessions(user_ids, columns, game_data)
+            insert_user_stats(user_ids, games, columns, updated_at)
+            insert_daily_stats(user_ids, columns)
+        yield user_ids, sessions
+
+
+def seed_players(users, sessions_per_user, seed, prefix='player', batch_size=2000):
+    """Insert users with sessions_per_user games each; returns (users, sessions) created"""
+    created_users = 0
+    created_sessions = 0
+    for user_ids, sessions in seed_batches(users, sessions_per_user, seed, prefix, batch_size):
+        created_users += len(user_ids)
+        created_sessions += sessions
+    return created_users, created_sessions
@@ -0,0 +1,51 @@
+# management/commands/_helpers.py - Shared helpers for bulk maintenance commands
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_since(value):
+    """Parse a --since value given as YYYY-MM-DD or an ISO datetime"""
+    if value is None:
+        return None
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Invalid --since value: {value}')
+        since = timezone.datetime(day.year, day.month, day.day)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def split_range(low, high, parts):
+    """Split the inclusive id range [low, high] into contiguous sub-ranges"""
+    step = max(1, -(-(high - low + 1) // parts))
+    return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+
+def init_worker():
+    # Spawned workers start with a fresh interpreter; forked ones reuse the
+    # parent's setup but must not share its database connections
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def run_ranges(func, ranges, workers, *args):
+    """Yield ((low, high), result) as func(low, high, *args) finishes for each range"""
+    if workers == 1:
+        for low, high in ranges:
+            yield (low, high), func(low, high, *args)
+        return
+
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        futures = {pool.submit(func, low, high, *args): (low, high) for low, high in ranges}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -0,0 +1,244 @@
+# management/commands/archive_sessions.py
+
+import os
+import statistics
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from game.archive import (
+    REPLAY_FIELDS, SESSION_FIELDS, concat_columns, month_of, rows_to_columns, session_archive,
+    take_rows, write_partition,
+)
+from game.management.commands._helpers import parse_since
+from game.models import GameReplay, GameSession, PlayerBest, UserAchievement, VersusMatch
+
+BENCH_USERS = 200
+
+
+def archivable(cutoff):
+    """Settled, counted sessions older than cutoff that no other row points at
+
+    Rejected games stay in the table, where the stats rebuilds skip them.
+    """
+    return (
+        GameSession.counted().filter(created_at__lt=cutoff)
+        .exclude(verification_status='pending')
+        .exclude(id__in=PlayerBest.objects.values('session_id'))
+        .exclude(id__in=VersusMatch.objects.values('session_one_id'))
+        .exclude(id__in=VersusMatch.objects.values('session_two_id'))
+        .exclude(id__in=UserAchievement.objects.filter(game_session__isnull=False).values('game_session_id'))
+    )
+
+
+def next_month(moment):
+    if moment.month == 12:
+        return moment.replace(year=moment.year + 1, month=1)
+    return moment.replace(month=moment.month + 1)
+
+
+def referenced(ids):
+    """Those of ids that a PlayerBest, VersusMatch or UserAchievement row points at (indexed lookups)"""
+    found = set(PlayerBest.objects.filter(session_id__in=ids).values_list('session_id', flat=True))
+    found.update(VersusMatch.objects.filter(session_one_id__in=ids).values_list('session_one_id', flat=True))
+    found.update(VersusMatch.objects.filter(session_two_id__in=ids).values_list('session_two_id', flat=True))
+    found.update(UserAchievement.objects.filter(game_session_id__in=ids).values_list('game_session_id', flat=True))
+    return found
+
+
+def delete_chunk(ids):
+    """Delete sessions and their replays without signals, so stats keep counting them; returns deleted ids"""
+    with transaction.atomic():
+        # Re-check: a game may have become someone's best or been linked since it was read
+        protected = referenced(ids)
+        ids = [session_id for session_id in ids if session_id not in protected]
+        if ids:
+            quote = connection.ops.quote_name
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {quote(GameReplay._meta.db_table)} WHERE {quote("session_id")} IN ({placeholders})',
+                    ids,
+                )
+                cursor.execute(
+                    f'DELETE FROM {quote(GameSession._meta.db_table)} WHERE {quote("id")} IN ({placeholders})',
+                    ids,
+                )
+    return ids
+
+
+def dedupe(columns):
+    """Keep the last copy of each id (a rerun after an interrupted delete archives rows again)"""
+    ids = columns['id']
+    _, first_from_end = np.unique(ids[::-1], return_index=True)
+    if len(first_from_end) == len(ids):
+        return columns
+    return take_rows(columns, np.sort(len(ids) - 1 - first_from_end))
+
+
+def hot_queries(user_ids):
+    """Representative reads on GameSession and its indexes, as name -> [(sql, params)]"""
+    sessions = GameSession.objects.order_by()
+    per_user = {
+        'history page (user, -created_at)': lambda user_id: (
+            sessions.filter(user_id=user_id).order_by('-created_at', '-id')[:21]
+        ),
+        'best scores page (user, -score)': lambda user_id: (
+            sessions.filter(user_id=user_id).order_by('-score', '-id')[:21]
+        ),
+        'games per player (count)': lambda user_id: (
+            sessions.filter(user_id=user_id).values('user_id').annotate(games=Count('id')).values('games')
+        ),
+    }
+    queries = {
+        name: [make(user_id).query.sql_with_params() for user_id in user_ids]
+        for name, make in per_user.items()
+    }
+    queries['top 100 ranked (-score)'] = [
+        sessions.filter(verification_status__in=GameSession.RANKED_STATUSES).order_by('-score')[:100]
+        .query.sql_with_params()
+    ] * 20
+    return queries
+
+
+def time_queries(queries, repeats=3):
+    """p50 and p95 milliseconds of single executions, without building model instances"""
+    timings = {}
+    with connection.cursor() as cursor:
+        for name, statements in queries.items():
+            samples = []
+            for attempt in range(repeats + 1):
+                for sql, params in statements:
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    if attempt:
+                        samples.append((time.perf_counter() - started) * 1000)
+            samples.sort()
+            timings[name] = (statistics.median(samples), samples[int(len(samples) * 0.95)])
+    return timings
+
+
+class Command(BaseCommand):
+    help = 'Move old game sessions into monthly columnar archive files under ARCHIVE_DIR'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', required=True,
+                            help='Archive games older than this many days, or than a date (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Sessions deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between delete transactions')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+        parser.add_argument('--bench', action='store_true',
+                            help='Time common GameSession queries before and after archiving')
+
+    def handle(self, *args, **options):
+        if not session_archive.directory:
+            raise CommandError('Set ARCHIVE_DIR to archive sessions')
+        cutoff = self.parse_cutoff(options['older_than'])
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        if not options['dry_run']:
+            players, games = session_archive.purge_deleted_players()
+            if games:
+                self.stdout.write(f'Purged {games} archived sessions of {players} deleted players')
+
+        candidates = archivable(cutoff)
+        first = candidates.order_by('created_at').values_list('created_at', flat=True).first()
+        if first is None:
+            self.stdout.write(self.style.WARNING(f'No sessions to archive before {cutoff:%Y-%m-%d %H:%M}.'))
+            return
+
+        before = None
+        if options['bench']:
+            user_ids = self.bench_users()
+            queries = hot_queries(user_ids)
+            before = time_queries(queries)
+
+        started = time.monotonic()
+        total_archived = total_kept = 0
+        month_start = timezone.localtime(first).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        while month_start < cutoff:
+            month_end = min(next_month(month_start), cutoff)
+            archived, kept = self.archive_month(candidates, month_start, month_end, options)
+            total_archived += archived
+            total_kept += kept
+            month_start = next_month(month_start)
+
+        elapsed = time.monotonic() - started
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total_archived} sessions older than {cutoff:%Y-%m-%d %H:%M} in {elapsed:.1f}s'
+            + (f' ({total_kept} kept because they became referenced meanwhile)' if total_kept else '')
+        ))
+
+        if before is not None and not options['dry_run']:
+            after = time_queries(queries)
+            self.stdout.write(f'{"query (" + str(len(user_ids)) + " players)":<36} {"before p50/p95 ms":>20} {"after p50/p95 ms":>20}')
+            for name, (median, worst) in before.items():
+                new_median, new_worst = after[name]
+                self.stdout.write(
+                    f'{name:<36} {median:>11.2f} / {worst:<7.2f} {new_median:>11.2f} / {new_worst:<7.2f}'
+                )
+
+    def parse_cutoff(self, value):
+        if value.isdigit():
+            return timezone.now() - timedelta(days=int(value))
+        try:
+            return parse_since(value)
+        except CommandError:
+            raise CommandError(f'Invalid --older-than value: {value}')
+
+    def bench_users(self):
+        """Evenly spread players who have games in the table now"""
+        user_ids = sorted(set(GameSession.objects.order_by().values_list('user_id', flat=True).distinct()))
+        step = max(1, len(user_ids) // BENCH_USERS)
+        return user_ids[::step][:BENCH_USERS]
+
+    def archive_month(self, candidates, month_start, month_end, options):
+        """Archive one month; returns (sessions archived, sessions kept in the table)"""
+        sessions = candidates.filter(created_at__gte=month_start, created_at__lt=month_end)
+        month = month_of(month_start)
+        if options['dry_run']:
+            count = sessions.count()
+            if count:
+                self.stdout.write(f'{month}: {count} sessions')
+            return count, 0
+
+        rows = list(sessions.order_by('id').values_list(*SESSION_FIELDS, *REPLAY_FIELDS).iterator(chunk_size=5000))
+        if not rows:
+            return 0, 0
+        columns = rows_to_columns(rows)
+        del rows
+        path = session_archive.month_path(month)
+        with session_archive.locked():
+            existing = session_archive.partition(month)
+            merged = columns if existing is None else dedupe(concat_columns(existing.to_columns(), columns))
+            write_partition(path, merged)
+            del merged
+
+        # The archive is written first, so an interrupted run never loses games
+        ids = columns['id'].tolist()
+        deleted = set()
+        for start in range(0, len(ids), options['chunk_size']):
+            deleted.update(delete_chunk(ids[start:start + options['chunk_size']]))
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        kept = [session_id for session_id in ids if session_id not in deleted]
+        if kept:
+            # Still in the table, so the archive must not count them too
+            session_archive.drop_sessions(kept)
+
+        size = sum(entry.stat().st_size for entry in os.scandir(path))
+        self.stdout.write(
+            f'{month}: archived {len(deleted)} sessions, {size / max(len(deleted), 1):.0f} bytes per game on disk'
+            + (f', {len(kept)} kept' if kept else '')
+        )
+        return len(deleted), len(kept)
@@ -0,0 +1,223 @@
+# management/commands/backfill_achievements.py
+
+import heapq
+import time
+from itertools import islice
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min, Q
+
+from game.achievements import CUMULATIVE_FACTS, SESSION_FACTS, compile_rule
+from game.archive import session_archive, unique_ids
+from game.management.commands._helpers import run_ranges, split_range
+from game.models import Achievement, GameSession, UserAchievement
+
+User = get_user_model()
+
+COLUMNS = ('id', 'user_id') + SESSION_FACTS
+
+
+def load_rules(achievement_filter):
+    """Compile the selected achievements' conditions"""
+    achievements = Achievement.objects.order_by('id')
+    if achievement_filter:
+        lookup = Q(name=achievement_filter)
+        if achievement_filter.isdigit():
+            lookup |= Q(id=int(achievement_filter))
+        achievements = achievements.filter(lookup)
+
+    rules = []
+    for achievement_id, conditions in achievements.values_list('id', 'conditions'):
+        rule = compile_rule(achievement_id, conditions)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+
+def chunk_arrays(rows, carry):
+    """Turn a chunk of session rows into per-fact arrays
+
+    Rows are ordered by (user_id, created_at), so running stats facts are
+    cumulative sums that restart at each user. carry holds the previous
+    chunk's totals for the user it ended on.
+    """
+    columns = list(zip(*rows))
+    arrays = {}
+    for name, values in zip(COLUMNS, columns):
+        if name == 'duration_seconds':
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        else:
+            arrays[name] = np.array(values, dtype=np.int64)
+
+    user_ids = arrays['user_id']
+    starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]])
+    group_sizes = np.diff(np.r_[starts, len(user_ids)])
+    continues_carry = carry['user_id'] == user_ids[0]
+
+    for fact, source in CUMULATIVE_FACTS.items():
+        values = np.ones(len(user_ids), dtype=np.int64) if source is None else arrays[source]
+        totals = np.cumsum(values)
+        # Subtract everything accumulated before each user's first row in this chunk
+        before_group = np.r_[0, totals[:-1]][starts]
+        running = totals - np.repeat(before_group, group_sizes)
+        if continues_carry:
+            running[:group_sizes[0]] += carry[fact]
+        arrays[fact] = running
+    return arrays
+
+
+def table_rows(low, high, chunk_size):
+    """COLUMNS + (created_at,) of the table's counted sessions for users in [low, high], in play order"""
+    sessions = (
+        GameSession.counted().filter(user_id__gte=low, user_id__lte=high)
+        .order_by('user_id', 'created_at', 'id')
+        .values_list(*COLUMNS, 'created_at')
+    )
+    position = None
+    while True:
+        # Each page is read in full before writing so no cursor stays open
+        # across inserts (SQLite cannot upgrade a reader with other writers)
+        page = sessions
+        if position is not None:
+            user_id, created_at, session_id = position
+            page = page.filter(
+                Q(user_id__gt=user_id)
+                | Q(user_id=user_id, created_at__gt=created_at)
+                | Q(user_id=user_id, created_at=created_at, id__gt=session_id)
+            )
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        last = rows[-1]
+        position = (last[1], last[-1], last[0])
+        yield from rows
+
+
+def backfill_range(low, high, achievement_filter, chunk_size, dry_run):
+    """Award missing achievements to users with ids in [low, high], archived games included"""
+    rules = load_rules(achievement_filter)
+    if not rules:
+        return 0, 0
+
+    # Archived games of players deleted since the last purge_archive are skipped
+    players = set(User.objects.filter(pk__gte=low, pk__lte=high).values_list('pk', flat=True))
+    archived = (
+        row for row in session_archive.range_values(low, high, COLUMNS + ('created_at',), chunk_size)
+        if row[1] in players
+    )
+    # Rows end with (created_at, archived); merged in play order per user
+    rows = unique_ids(heapq.merge(
+        ((*row, False) for row in table_rows(low, high, chunk_size)),
+        ((*row, True) for row in archived),
+        key=lambda row: (row[1], row[-2], row[0]),
+    ))
+
+    awarded = 0
+    scanned = 0
+    carry = {'user_id': None}
+    carry_earned = set()
+    while chunk := list(islice(rows, chunk_size)):
+        archived_ids = {row[0] for row in chunk if row[-1]}
+        count, carry, carry_earned = backfill_chunk(
+            [row[:-2] for row in chunk], rules, carry, carry_earned, dry_run, archived_ids
+        )
+        awarded += count
+        scanned += len(chunk)
+    return scanned, awarded
+
+
+def backfill_chunk(rows, rules, carry, carry_earned, dry_run, archived_ids=frozenset()):
+    arrays = chunk_arrays(rows, carry)
+    user_ids = arrays['user_id']
+    first_user, last_user = int(user_ids[0]), int(user_ids[-1])
+
+    earned = set(
+        UserAchievement.objects.filter(user_id__gte=first_user, user_id__lte=last_user)
+        .values_list('user_id', 'achievement_id')
+    )
+    if carry['user_id'] == first_user:
+        # Awards made for this user in the previous chunk (not yet visible on --dry-run)
+        earned.update((first_user, achievement_id) for achievement_id in carry_earned)
+
+    new_achievements = []
+    for rule in rules:
+        mask = np.ones(len(user_ids), dtype=bool)
+        for fact, compare, value in rule.checks:
+            mask &= compare(arrays[fact], value)
+        matches = np.flatnonzero(mask)
+        if not len(matches):
+            continue
+        # Rows are in play order, so each user's first match is when they earned it
+        matched_users, first = np.unique(user_ids[matches], return_index=True)
+        for user_id, index in zip(matched_users.tolist(), matches[first].tolist()):
+            if (user_id, rule.achievement_id) in earned:
+                continue
+            session_id = int(arrays['id'][index])
+            new_achievements.append(UserAchievement(
+                user_id=user_id,
+                achievement_id=rule.achievement_id,
+                # An archived game has no row to point at
+                game_session_id=None if session_id in archived_ids else session_id,
+                score_when_earned=int(arrays['score'][index]),
+            ))
+
+    if new_achievements and not dry_run:
+        UserAchievement.objects.bulk_create(new_achievements, ignore_conflicts=True)
+
+    last_earned = {
+        achievement_id for user_id, achievement_id in earned if user_id == last_user
+    } | {ua.achievement_id for ua in new_achievements if ua.user_id == last_user}
+    new_carry = {'user_id': last_user}
+    for fact in CUMULATIVE_FACTS:
+        new_carry[fact] = int(arrays[fact][-1])
+    return len(new_achievements), new_carry, last_earned
+
+
+class Command(BaseCommand):
+    help = 'Award achievements retroactively by replaying every game session, archived ones included'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--achievement', help='Only backfill this achievement (id or name)')
+        parser.add_argument('--dry-run', action='store_true', help='Report awards without saving them')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Sessions evaluated per batch')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        if chunk_size < 1 or workers < 1:
+            raise CommandError('--chunk-size and --workers must be positive')
+        if not load_rules(options['achievement']):
+            raise CommandError('No achievements with supported conditions matched')
+
+        bounds = GameSession.objects.aggregate(low=Min('user_id'), high=Max('user_id'))
+        archived_low, archived_high = session_archive.user_bounds()
+        lows = [value for value in (bounds['low'], archived_low) if value is not None]
+        highs = [value for value in (bounds['high'], archived_high) if value is not None]
+        if not lows:
+            self.stdout.write(self.style.WARNING('No game sessions found.'))
+            return
+
+        ranges = split_range(min(lows), max(highs), workers * 4)
+        started = time.monotonic()
+        scanned = awarded = 0
+        results = run_ranges(
+            backfill_range, ranges, workers,
+            options['achievement'], chunk_size, options['dry_run'],
+        )
+        for done, ((low, high), (range_scanned, range_awarded)) in enumerate(results, start=1):
+            scanned += range_scanned
+            awarded += range_awarded
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'[{done}/{len(ranges)}] users {low}-{high} done, {scanned} sessions, '
+                f'{awarded} awards, {scanned / elapsed if elapsed else scanned:.0f} sessions/s'
+            )
+
+        verb = 'Would award' if options['dry_run'] else 'Awarded'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {awarded} achievements from {scanned} sessions '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,301 @@
+# management/commands/bench_endpoints.py
+
+import argparse
+import io
+import json
+import platform
+import time
+from itertools import count
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from game import urls as game_urls
+from game.engine.replay import HARD_DROP, LEFT, ROTATE, ReplayEncoder
+from game.leaderboard import ranked_leaderboard
+from game.percentiles import score_distributions
+from game.management.commands._dataset import PASSWORD, seed_players
+from game.management.commands.loadtest_http import percentile
+from game.models import GameReplay, GameSession, PlayerBest
+from users import urls as user_urls
+
+User = get_user_model()
+
+BENCH_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+SUBMITTED_GAME = {
+    'score': 4200, 'final_level': 3, 'lines_cleared': 24, 'pieces_placed': 70,
+    'tetrises_cleared': 2, 'duration_seconds': 95,
+}
+
+
+def sample_replay(seed):
+    encoder = ReplayEncoder(seed)
+    for frame in range(0, 6000, 30):
+        encoder.add(frame, (LEFT, ROTATE, HARD_DROP)[frame // 30 % 3])
+    return encoder.finish()
+
+
+def endpoint_specs(player, session_id):
+    """(label, url name, url kwargs, method, body, user) for every route
+
+    body may be a callable taking the iteration number, for requests that
+    must differ each time (e.g. registering a new username).
+    """
+    return [
+        ('scores GET', 'scores', {}, 'GET', None, player),
+        ('scores POST', 'scores', {}, 'POST', {'score': 1200, 'level': 2, 'lines_cleared': 12, 'duration': 60}, player),
+        ('user_scores', 'user_scores', {}, 'GET', None, player),
+        ('game_sessions GET', 'game_sessions', {}, 'GET', None, player),
+        ('game_sessions POST', 'game_sessions', {}, 'POST', SUBMITTED_GAME, player),
+        ('game_session_detail PUT', 'game_session_detail', {'pk': session_id}, 'PUT', {'max_combo': 3}, player),
+        ('game_session_detail DELETE', 'game_session_detail', {'pk': session_id}, 'DELETE', None, player),
+        ('game_session_replay', 'game_session_replay', {'pk': session_id}, 'GET', None, player),
+        ('user_achievements', 'user_achievements', {}, 'GET', None, player),
+        ('global_leaderboard', 'global_leaderboard', {}, 'GET', None, None),
+        # The test client is WSGI, so this measures the 501 refusal, not a stream
+        ('leaderboard_stream', 'leaderboard_stream', {}, 'GET', None, None),
+        ('leaderboard_rank', 'leaderboard_rank', {}, 'GET', None, player),
+        ('leaderboard_around_me', 'leaderboard_around_me', {}, 'GET', None, player),
+        ('score_percentile', 'score_percentile', {}, 'GET', None, player),
+        ('game_history', 'game_history', {}, 'GET', None, player),
+        ('game_history_export', 'game_history_export', {}, 'GET', None, player),
+        ('user_stats', 'user_stats', {}, 'GET', None, player),
+        ('user_stats_timeseries', 'user_stats_timeseries', {}, 'GET', None, player),
+        ('response_cache_stats', 'response_cache_stats', {}, 'GET', None, player),
+        ('submit_score', 'submit_score', {}, 'POST', SUBMITTED_GAME, player),
+        ('submit_scores_batch', 'submit_scores_batch', {}, 'POST', {'sessions': [SUBMITTED_GAME] * 10}, player),
+        ('register', 'register', {}, 'POST', lambda i: {
+            'username': f'bench{i}', 'email': f'bench{i}@example.com',
+            'password': PASSWORD, 'password_confirm': PASSWORD, 'player_name': f'Bench {i}',
+        }, None),
+        ('login', 'login', {}, 'POST', {'identifier': player.username, 'password': PASSWORD}, None),
+        ('profile', 'profile', {}, 'GET', None, player),
+        ('update_profile', 'update_profile', {}, 'PUT', {'player_name': 'Bench Player'}, player),
+    ]
+
+
+def url_names():
+    return {pattern.name for module in (game_urls, user_urls) for pattern in module.urlpatterns if pattern.name}
+
+
+def measure(client, method, path, body, headers, warmup, iterations, serial):
+    """Run one request warmup + iterations times, each rolled back; returns (status, seconds, queries)"""
+    timings = []
+    queries = []
+    status = None
+    for i in range(warmup + iterations):
+        data = body(next(serial)) if callable(body) else body
+        # The query log keeps 9000 entries; once full, captured counts would read 0
+        connection.queries_log.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.generic(
+                    method, path,
+                    json.dumps(data) if data is not None else '',
+                    content_type='application/json', **headers,
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        status = response.status_code
+        if i >= warmup:
+            timings.append(elapsed)
+            queries.append(len(captured))
+    return status, sorted(timings), sorted(queries)
+
+
+def history_sizes(value):
+    try:
+        sizes = [int(size) for size in value.split(',') if size.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Expected comma-separated game counts, got {value!r}')
+    if any(size < 1 for size in sizes):
+        raise argparse.ArgumentTypeError('Game counts must be positive')
+    return sizes
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Regression messages for endpoints slower (p95) or chattier than the baseline"""
+    regressions = []
+    for label, base in baseline.get('results', {}).items():
+        current = results.get(label)
+        if current is None:
+            continue
+        limit = base['p95_ms'] * (1 + threshold)
+        if current['p95_ms'] > limit and current['p95_ms'] - base['p95_ms'] >= min_delta_ms:
+            regressions.append(
+                f"{label}: p95 {current['p95_ms']:.2f} ms vs {base['p95_ms']:.2f} ms baseline"
+            )
+        if current['queries'] > base['queries']:
+            regressions.append(f"{label}: {current['queries']} queries vs {base['queries']} baseline")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API endpoint against a seeded SQLite database and report latency and queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Players to seed')
+        parser.add_argument('--sessions-per-user', type=int, default=50, help='Games seeded per player')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=200, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per endpoint')
+        parser.add_argument('--only', action='append', help='Only run endpoints with this label (repeatable)')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='Baseline JSON from an earlier --output run')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed p95 slowdown against the baseline, as a fraction')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help='Ignore p95 slowdowns smaller than this')
+        parser.add_argument('--history-sizes', type=history_sizes, default=(),
+                            help='Also time submit_score for players with these many games already '
+                                 'played, comma-separated (e.g. 10,1000,100000)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_endpoints runs on SQLite; set DATABASE_URL=sqlite:///bench.sqlite3')
+        if options['users'] < 1 or options['sessions_per_user'] < 1 or options['iterations'] < 1:
+            raise CommandError('--users, --sessions-per-user and --iterations must be positive')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)
+
+        # A fresh in-memory test database; the configured one is never touched
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(LEADERBOARD_SNAPSHOT_PATH=None, PERCENTILE_DIR=None, ARCHIVE_DIR=None,
+                                   CACHES=BENCH_CACHES):
+                results = self.run_benchmarks(options)
+        finally:
+            # Never snapshot the bench players over the real leaderboard or percentiles at exit
+            ranked_leaderboard.unload()
+            score_distributions.unload()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'users': options['users'],
+                'sessions_per_user': options['sessions_per_user'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'history_sizes': options['history_sizes'],
+                'async_views': settings.USE_ASYNC_VIEWS,
+                'python': platform.python_version(),
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'], options['min_delta_ms'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
+
+    def seed(self, options):
+        started = time.monotonic()
+        users, sessions = seed_players(options['users'], options['sessions_per_user'], options['seed'])
+        PlayerBest.rebuild()
+        call_command('create_achievements', stdout=io.StringIO())
+        call_command('backfill_achievements', stdout=io.StringIO())
+        self.stdout.write(
+            f'Seeded {users} users and {sessions} sessions in {time.monotonic() - started:.1f}s'
+        )
+
+    def run_benchmarks(self, options):
+        self.seed(options)
+
+        player = User.objects.order_by('id').first()
+        # Staff, so the admin-only cache stats endpoint can be measured too
+        player.is_staff = True
+        player.save(update_fields=['is_staff'])
+        session = GameSession.objects.filter(user=player).order_by('id').first()
+        GameReplay.objects.create(session=session, seed=options['seed'], data=sample_replay(options['seed']))
+        tokens = {}
+
+        specs = endpoint_specs(player, session.pk)
+        missing = url_names() - {spec[1] for spec in specs}
+        if missing:
+            raise CommandError(f"No benchmark spec for: {', '.join(sorted(missing))}")
+        if options['only']:
+            specs = [spec for spec in specs if spec[0] in options['only']]
+
+        # A view that raises is reported with its 500 instead of stopping the run
+        client = Client(raise_request_exception=False)
+        serial = count()
+        results = {}
+        self.stdout.write(f"{'endpoint':<28}{'status':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+        for label, name, kwargs, method, body, user in specs:
+            results[label] = self.run_spec(client, serial, tokens, label, name, kwargs, method, body, user, options)
+
+        if options['history_sizes']:
+            results.update(self.run_history_sizes(client, serial, tokens, options))
+        return results
+
+    def run_spec(self, client, serial, tokens, label, name, kwargs, method, body, user, options):
+        """Time one endpoint spec, print its row and return its result"""
+        headers = {}
+        if user is not None:
+            if user.pk not in tokens:
+                tokens[user.pk] = str(RefreshToken.for_user(user).access_token)
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {tokens[user.pk]}'
+        path = reverse(name, kwargs=kwargs)
+        status, timings, queries = measure(
+            client, method, path, body, headers, options['warmup'], options['iterations'], serial,
+        )
+        result = {
+            'method': method,
+            'path': path,
+            'status': status,
+            'p50_ms': percentile(timings, 0.50) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+            'p99_ms': percentile(timings, 0.99) * 1000,
+            'mean_ms': sum(timings) / len(timings) * 1000,
+            'queries': percentile(queries, 0.50),
+        }
+        line = (
+            f"{label:<28}{status:>7}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+            f"{result['p99_ms']:>9.2f}{result['queries']:>9}"
+        )
+        self.stdout.write(line if status < 400 else self.style.WARNING(line))
+        return result
+
+    def run_history_sizes(self, client, serial, tokens, options):
+        """submit_score for players who already played each of --history-sizes games
+
+        Submitting folds the game into stored totals, so latency and query
+        count should stay flat however long the player's history is.
+        """
+        self.stdout.write("\nsubmit_score by games already played")
+        results = {}
+        for offset, size in enumerate(options['history_sizes']):
+            started = time.monotonic()
+            seed_players(1, size, options['seed'] + offset + 1, prefix=f'history{size}-')
+            player = User.objects.get(username=f'history{size}-0')
+            PlayerBest.refresh_for_user(player.pk)
+            self.stdout.write(f'  seeded {size} games in {time.monotonic() - started:.1f}s')
+            label = f'submit_score @{size} games'
+            results[label] = self.run_spec(
+                client, serial, tokens, label, 'submit_score', {}, 'POST', SUBMITTED_GAME, player, options,
+            )
+        return results
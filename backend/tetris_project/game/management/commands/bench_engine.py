@@ -0,0 +1,67 @@
+# management/commands/bench_engine.py
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.engine import ROTATIONS, Game
+
+
+def fits_anywhere(game):
+    """Whether the current piece fits at the spawn row in some rotation and column"""
+    return any(
+        game.fits(rotation, x, game.y)
+        for rotation in range(4)
+        for x in range(len(ROTATIONS[game.piece][rotation].masks))
+    )
+
+
+def random_placements(count, seed):
+    """Spawn-and-drop count pieces at random rotations and columns, starting a new game on top-out
+
+    Returns (placements, games, lines cleared). Moves that do not fit at the
+    spawn row are retried with another choice and are not counted; a piece
+    that fits nowhere there ends the game, as it would top out.
+    """
+    rng = random.Random(seed)
+    game = Game(seed=seed)
+    placements = games = lines = 0
+    while placements < count:
+        rotation = rng.randrange(4)
+        x = rng.randrange(len(ROTATIONS[game.piece][rotation].masks))
+        if game.place(rotation, x) >= 0:
+            if not game.game_over:
+                placements += 1
+                continue
+        elif fits_anywhere(game):
+            continue
+        lines += game.lines
+        games += 1
+        game = Game(seed=rng.getrandbits(32))
+    return placements, games + 1, lines + game.lines
+
+
+class Command(BaseCommand):
+    help = 'Time random spawn-and-drop placements on the server-side engine (one core)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--placements', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=3, help='Runs; the best one is reported')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['placements'] < 1 or options['repeat'] < 1:
+            raise CommandError('--placements and --repeat must be positive')
+
+        best = None
+        for run in range(options['repeat']):
+            started = time.perf_counter()
+            placements, games, lines = random_placements(options['placements'], options['seed'] + run)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'run {run + 1}: {placements} placements over {games} games ({lines} lines) '
+                f'in {elapsed:.2f}s = {placements / elapsed:,.0f}/s'
+            )
+            best = max(best or 0, placements / elapsed)
+        self.stdout.write(self.style.SUCCESS(f'Best: {best:,.0f} placements/s'))
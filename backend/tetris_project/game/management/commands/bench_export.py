@@ -0,0 +1,150 @@
+# management/commands/bench_export.py
+
+import gc
+import os
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from game.management.commands._dataset import (
+    PASSWORD, deferred_indexes, fast_writes, insert_sessions, session_columns,
+)
+from game.management.commands.bench_endpoints import BENCH_CACHES
+from game.models import GameSession
+from game.serializers import GameSessionSerializer
+
+User = get_user_model()
+
+SEED_BATCH = 50000
+VARIANTS = (
+    ('ndjson', '?format=ndjson'),
+    ('csv', '?format=csv'),
+    ('ndjson + gzip', '?format=ndjson&gzip=1'),
+    ('csv + gzip', '?format=csv&gzip=1'),
+)
+
+
+def current_rss():
+    """Resident set size in bytes (Linux), else the peak so far"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Command(BaseCommand):
+    help = "Time the streaming game history export for one player with many games and track memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=1000000, help="Games seeded for the exporting player")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--compare-rows', type=int, default=20000,
+                            help='Games serialized the buffered way (GameSessionSerializer) for comparison')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_export runs on SQLite; set DATABASE_URL=sqlite:///bench.sqlite3')
+        if options['sessions'] < 1:
+            raise CommandError('--sessions must be positive')
+
+        # A fresh in-memory test database; the configured one is never touched
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(ARCHIVE_DIR=None, CACHES=BENCH_CACHES):
+                self.run_benchmarks(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, sessions, seed):
+        """One player with the given number of games, inserted SEED_BATCH at a time"""
+        started = time.monotonic()
+        player = User.objects.create_user(
+            username='exporter', email='exporter@example.com', password=PASSWORD, player_name='Exporter',
+        )
+        rng = np.random.default_rng(seed)
+        now = np.datetime64(timezone.now().replace(tzinfo=None), 'us')
+        game_data = GameSession._meta.get_field('game_data').get_db_prep_save({}, connection)
+        with fast_writes(), deferred_indexes(GameSession):
+            for start in range(0, sessions, SEED_BATCH):
+                columns = session_columns(rng, np.array([min(SEED_BATCH, sessions - start)]), now)
+                with transaction.atomic():
+                    insert_sessions([player.pk], columns, game_data)
+        self.stdout.write(f'Seeded {sessions} sessions in {time.monotonic() - started:.1f}s')
+        return player
+
+    def run_benchmarks(self, options):
+        sessions = options['sessions']
+        player = self.seed(sessions, options['seed'])
+        client = Client()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(player).access_token}'}
+        path = reverse('game_history_export')
+
+        self.stdout.write(
+            f"{'export':<16}{'rows/s':>11}{'MB/s':>8}{'size MB':>9}{'seconds':>9}{'RSS growth MB':>15}"
+        )
+        for label, query in VARIANTS:
+            gc.collect()
+            baseline = peak = current_rss()
+            size = 0
+            started = time.perf_counter()
+            response = client.get(path + query, **headers)
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                peak = max(peak, current_rss())
+            response.close()
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f'{label}: status {response.status_code}')
+            self.stdout.write(
+                f'{label:<16}{sessions / elapsed:>11,.0f}{size / elapsed / 1e6:>8.1f}{size / 1e6:>9.1f}'
+                f'{elapsed:>9.2f}{(peak - baseline) / 1e6:>15.1f}'
+            )
+
+        # Python heap at 10% of the rows and at the end: flat if nothing accumulates
+        gc.collect()
+        tracemalloc.start()
+        response = client.get(path, **headers)
+        rows = 0
+        early_peak = None
+        for chunk in response.streaming_content:
+            rows += chunk.count(b'\n')
+            if early_peak is None and rows >= sessions // 10:
+                early_peak = tracemalloc.get_traced_memory()[1]
+        response.close()
+        final_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'ndjson heap peak: {early_peak / 1e6:.1f} MB after {sessions // 10} rows, '
+            f'{final_peak / 1e6:.1f} MB after {rows} rows'
+        )
+
+        compare_rows = min(options['compare_rows'], sessions)
+        if compare_rows:
+            gc.collect()
+            tracemalloc.start()
+            queryset = GameSession.objects.filter(user=player).select_related('user').order_by('-created_at')
+            GameSessionSerializer(queryset[:compare_rows], many=True).data
+            buffered_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stdout.write(
+                f'Buffered GameSessionSerializer: {buffered_peak / 1e6:.1f} MB heap for {compare_rows} rows '
+                f'(~{buffered_peak / compare_rows * sessions / 1e9:.1f} GB at {sessions})'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Peak RSS of the whole run: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB'
+        ))
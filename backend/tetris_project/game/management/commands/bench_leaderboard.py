@@ -0,0 +1,125 @@
+# management/commands/bench_leaderboard.py
+
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import OuterRef, Subquery
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from game.leaderboard import ranked_leaderboard
+from game.management.commands._dataset import fast_writes, seed_players
+from game.management.commands.bench_endpoints import BENCH_CACHES
+from game.management.commands.loadtest_http import percentile
+from game.models import GameSession, PlayerBest
+from game.percentiles import score_distributions
+from game.serializers import LeaderboardSerializer, PlayerBestSerializer
+
+
+def subquery_leaderboard():
+    """The global leaderboard as it was before PlayerBest: a correlated subquery per session"""
+    top_sessions = GameSession.objects.filter(user=OuterRef('user')).order_by('-score', 'created_at')
+    return GameSession.objects.filter(pk=Subquery(top_sessions.values('pk')[:1])).order_by('-score')
+
+
+def player_best_leaderboard():
+    return PlayerBest.objects.select_related('user', 'session').order_by('-score', 'achieved_at')
+
+
+def timed(func, iterations):
+    """(sorted seconds, queries of the last run) for iterations calls of func"""
+    timings = []
+    queries = 0
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        queries = len(captured)
+    return sorted(timings), queries
+
+
+class Command(BaseCommand):
+    help = 'Compare the PlayerBest leaderboard with the old correlated subquery on a large seeded database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000, help='Players to seed')
+        parser.add_argument('--sessions-per-user', type=int, default=50, help='Games seeded per player')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=200, help='Timed requests of the current endpoint')
+        parser.add_argument('--subquery-iterations', type=int, default=3,
+                            help='Timed runs of the old subquery, which scans every session')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_leaderboard runs on SQLite; set DATABASE_URL=sqlite:///bench.sqlite3')
+        if min(options['users'], options['sessions_per_user'], options['iterations'],
+               options['subquery_iterations']) < 1:
+            raise CommandError('--users, --sessions-per-user and the iteration counts must be positive')
+
+        # A fresh in-memory test database; the configured one is never touched
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(LEADERBOARD_SNAPSHOT_PATH=None, PERCENTILE_DIR=None, ARCHIVE_DIR=None,
+                                   CACHES=BENCH_CACHES):
+                self.run_benchmarks(options)
+        finally:
+            ranked_leaderboard.unload()
+            score_distributions.unload()
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def run_benchmarks(self, options):
+        started = time.monotonic()
+        with fast_writes():
+            users, sessions = seed_players(options['users'], options['sessions_per_user'], options['seed'])
+        self.stdout.write(f'Seeded {users} users and {sessions} sessions in {time.monotonic() - started:.1f}s')
+        started = time.monotonic()
+        PlayerBest.rebuild()
+        self.stdout.write(f'rebuild_player_best: {time.monotonic() - started:.1f}s')
+
+        # Same players in the same order (the old query broke ties arbitrarily, so compare scores)
+        old_top = list(subquery_leaderboard().values_list('score', flat=True)[:100])
+        new_top = list(PlayerBest.objects.order_by('-score', 'achieved_at').values_list('score', flat=True)[:100])
+        if old_top != new_top:
+            raise CommandError('PlayerBest disagrees with the subquery leaderboard')
+
+        self.stdout.write(f"{'leaderboard (query + serializer)':<44}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}")
+        rows = [
+            ('old subquery, every player (as served)',
+             lambda: LeaderboardSerializer(subquery_leaderboard().select_related('user'), many=True).data,
+             options['subquery_iterations']),
+            ('PlayerBest, every player',
+             lambda: PlayerBestSerializer(player_best_leaderboard(), many=True).data,
+             options['subquery_iterations']),
+            ('old subquery, top 100',
+             lambda: LeaderboardSerializer(subquery_leaderboard().select_related('user')[:100], many=True).data,
+             options['subquery_iterations']),
+            ('PlayerBest, top 100',
+             lambda: PlayerBestSerializer(player_best_leaderboard()[:100], many=True).data,
+             options['iterations']),
+        ]
+        client = Client()
+        path = reverse('global_leaderboard')
+        for query in ('?limit=100', f'?limit=100&offset={max(0, users - 100)}'):
+            # Each request is a cache miss: the bench cache is cleared in between
+            def request(query=query):
+                cache.clear()
+                response = client.get(path + query)
+                if response.status_code != 200:
+                    raise CommandError(f'leaderboard{query}: status {response.status_code}')
+            rows.append((f'endpoint (uncached) {query}', request, options['iterations']))
+
+        for label, func, iterations in rows:
+            timings, queries = timed(func, iterations)
+            self.stdout.write(
+                f'{label:<44}{percentile(timings, 0.5) * 1000:>10.2f}'
+                f'{percentile(timings, 0.95) * 1000:>10.2f}{queries:>9}'
+            )
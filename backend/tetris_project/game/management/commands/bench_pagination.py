@@ -0,0 +1,141 @@
+# management/commands/bench_pagination.py
+
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from game.management.commands._dataset import (
+    PASSWORD, deferred_indexes, fast_writes, insert_sessions, session_columns,
+)
+from game.management.commands.bench_endpoints import BENCH_CACHES
+from game.models import GameSession
+from game.pagination import KeysetPagination
+
+User = get_user_model()
+
+SEED_BATCH = 50000
+# (endpoint, keyset field)
+LISTS = (
+    ('user_scores', 'score'),
+    ('game_history', 'created_at'),
+)
+# A deep page may cost this many times page 1 before the run fails
+MAX_DEEP_RATIO = 3.0
+
+
+def deep_position(player, field, depth):
+    """The (value, id) a client's cursor holds after paging past the first depth games"""
+    return tuple(
+        GameSession.objects.filter(user=player).order_by(f'-{field}', '-id')
+        .values_list(field, 'id')[depth - 1]
+    )
+
+
+def explain(queryset):
+    """The database's plan for queryset, one line per step"""
+    return queryset.explain().strip().splitlines()
+
+
+class Command(BaseCommand):
+    help = 'Time a deep keyset page against page 1 for one player with many games, and show the query plans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=1000000, help='Games seeded for the player')
+        parser.add_argument('--depth', type=float, default=0.99,
+                            help='Where the deep cursor points, as a fraction of the games')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50, help='Requests timed per page')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_pagination runs on SQLite; set DATABASE_URL=sqlite:///bench.sqlite3')
+        if options['sessions'] < 2 * options['page_size']:
+            raise CommandError('--sessions must cover at least two pages')
+        if not 0 < options['depth'] < 1:
+            raise CommandError('--depth must be between 0 and 1')
+
+        # A fresh in-memory test database; the configured one is never touched
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(ARCHIVE_DIR=None, CACHES=BENCH_CACHES):
+                self.run_benchmarks(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, sessions, seed):
+        """One player with the given number of games, inserted SEED_BATCH at a time"""
+        started = time.monotonic()
+        player = User.objects.create_user(
+            username='pager', email='pager@example.com', password=PASSWORD, player_name='Pager',
+        )
+        rng = np.random.default_rng(seed)
+        now = np.datetime64(timezone.now().replace(tzinfo=None), 'us')
+        game_data = GameSession._meta.get_field('game_data').get_db_prep_save({}, connection)
+        with fast_writes(), deferred_indexes(GameSession):
+            for start in range(0, sessions, SEED_BATCH):
+                columns = session_columns(rng, np.array([min(SEED_BATCH, sessions - start)]), now)
+                with transaction.atomic():
+                    insert_sessions([player.pk], columns, game_data)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(f'Seeded {sessions} sessions in {time.monotonic() - started:.1f}s')
+        return player
+
+    def time_page(self, client, path, headers, repeat):
+        """Median milliseconds per request"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(path, **headers)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{path}: status {response.status_code}')
+        return float(np.median(timings))
+
+    def run_benchmarks(self, options):
+        sessions = options['sessions']
+        page_size = options['page_size']
+        depth = min(int(sessions * options['depth']), sessions - page_size)
+        player = self.seed(sessions, options['seed'])
+        client = Client()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(player).access_token}'}
+
+        failures = []
+        self.stdout.write(f"{'list':<14}{'page 1 ms':>11}{f'after {depth} ms':>20}{'ratio':>8}")
+        for name, field in LISTS:
+            path = f'{reverse(name)}?page_size={page_size}'
+            paginator = KeysetPagination(field)
+            position = deep_position(player, field, depth)
+            cursor = paginator.encode_cursor(position)
+            first_ms = self.time_page(client, path, headers, options['repeat'])
+            deep_ms = self.time_page(client, f'{path}&cursor={cursor}', headers, options['repeat'])
+            ratio = deep_ms / first_ms
+            self.stdout.write(f'{name:<14}{first_ms:>11.2f}{deep_ms:>20.2f}{ratio:>8.2f}')
+            if ratio > MAX_DEEP_RATIO:
+                failures.append(f'{name}: deep page {ratio:.1f}x page 1')
+
+            # The query paginate_queryset issues for that cursor
+            plan = explain(paginator.after(GameSession.objects.filter(user=player), position)[:page_size + 1])
+            for line in plan:
+                self.stdout.write(f'    {line}')
+            if any('TEMP B-TREE' in line for line in plan):
+                failures.append(f'{name}: the deep page sorts instead of reading the index in order')
+
+        if failures:
+            raise CommandError('Deep pages are not index range reads:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            f'Deep pages within {MAX_DEEP_RATIO:g}x of page 1 and read in index order'
+        ))
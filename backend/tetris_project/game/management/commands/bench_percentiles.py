@@ -0,0 +1,132 @@
+# management/commands/bench_percentiles.py
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from game.percentiles import (
+    empty_histograms, game_speeds, pack_histograms, unpack_histograms,
+)
+
+QUANTILES = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999)
+SHARDS = 8
+SINGLE_ADDS = 200000
+
+
+def synthetic_values(count, seed):
+    """Long-tailed scores with some zero games, and game speeds from plausible durations"""
+    rng = np.random.default_rng(seed)
+    scores = np.rint(rng.lognormal(np.log(8000), 1.3, count))
+    scores[rng.random(count) < 0.03] = 0
+    durations = np.rint(rng.gamma(2.0, 150.0, count))
+    lines = np.rint(durations / 60 * rng.gamma(4.0, 4.0, count))
+    pieces = np.rint(durations * rng.gamma(6.0, 0.25, count))
+    lines_per_minute, pieces_per_second = game_speeds(lines, pieces, durations)
+    return {
+        'score': scores,
+        'lines_per_minute': lines_per_minute,
+        'pieces_per_second': pieces_per_second,
+    }
+
+
+def check_metric(histogram, values):
+    """Worst quantile relative error and percentile errors against the exact answers"""
+    exact = np.sort(values)
+    count = len(exact)
+    worst_quantile = 0.0
+    worst_points = 0.0
+    out_of_bounds = []
+    for q in QUANTILES:
+        true_value = exact[int(q * (count - 1))]
+        estimate = histogram.quantile(q)
+        if true_value >= histogram.min_value:
+            error = abs(estimate - true_value) / true_value
+            worst_quantile = max(worst_quantile, error)
+            if error > histogram.accuracy * (1 + 1e-9):
+                out_of_bounds.append(f'q={q}: {estimate:.4g} vs {true_value:.4g}')
+
+        # Only players within a factor gamma of the value may be misplaced
+        percentile = histogram.percentile(true_value)
+        below = 100.0 * np.searchsorted(exact, true_value, 'left') / count
+        low = 100.0 * np.searchsorted(exact, true_value / histogram.gamma, 'left') / count
+        high = 100.0 * np.searchsorted(exact, true_value * histogram.gamma, 'right') / count
+        worst_points = max(worst_points, abs(percentile - below))
+        if true_value >= histogram.min_value and not low - 1e-9 <= percentile <= high + 1e-9:
+            out_of_bounds.append(f'percentile at {true_value:.4g}: {percentile:.3f} outside [{low:.3f}, {high:.3f}]')
+    return worst_quantile, worst_points, out_of_bounds
+
+
+class Command(BaseCommand):
+    help = 'Check the percentile sketches against exact quantiles on synthetic data and time them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000000, help='Synthetic values per metric')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count < 2:
+            raise CommandError('--count must be at least 2')
+        data = synthetic_values(count, options['seed'])
+
+        # Built in shards and merged, as the per-process delta files are
+        histograms = empty_histograms()
+        whole = empty_histograms()
+        started = time.perf_counter()
+        for shard in range(SHARDS):
+            partial = empty_histograms()
+            for metric, values in data.items():
+                partial[metric].add_many(values[shard::SHARDS])
+            for metric, histogram in partial.items():
+                histograms[metric].merge(histogram)
+        build_seconds = time.perf_counter() - started
+        for metric, values in data.items():
+            whole[metric].add_many(values)
+        if any(not np.array_equal(whole[m].counts, histograms[m].counts) for m in data):
+            raise CommandError('Merged shards differ from a histogram of all values')
+
+        failures = []
+        for metric, values in data.items():
+            worst_quantile, worst_points, out_of_bounds = check_metric(histograms[metric], values)
+            self.stdout.write(
+                f'{metric:<18} {len(values)} values, {histograms[metric].size} buckets: '
+                f'worst quantile error {worst_quantile:.3%}, '
+                f'worst percentile error {worst_points:.3f} points'
+            )
+            failures.extend(f'{metric} {problem}' for problem in out_of_bounds)
+
+        blob = pack_histograms(histograms, 1)
+        started = time.perf_counter()
+        restored = unpack_histograms(blob)
+        unpack_ms = (time.perf_counter() - started) * 1000
+        if restored is None or any(
+            not np.array_equal(restored[1][m].counts, histograms[m].counts) for m in histograms
+        ):
+            failures.append('blob round trip changed the counts')
+
+        # O(1) updates as done on submit: one Python call per value
+        single = empty_histograms()['score']
+        values = data['score'][:SINGLE_ADDS].tolist()
+        started = time.perf_counter()
+        for value in values:
+            single.add(value)
+        add_seconds = time.perf_counter() - started
+
+        score = histograms['score']
+        started = time.perf_counter()
+        for value in values[:10000]:
+            score.percentile(value)
+        query_us = (time.perf_counter() - started) / 10000 * 1e6
+
+        self.stdout.write(
+            f'bulk build {count * len(data) / build_seconds:,.0f} values/s, '
+            f'single add {len(values) / add_seconds:,.0f} values/s, '
+            f'percentile query {query_us:.1f} µs, '
+            f'blob {len(blob)} bytes (unpack {unpack_ms:.2f} ms)'
+        )
+        if failures:
+            raise CommandError('Accuracy bound violated:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            f'All quantiles within {score.accuracy:.1%} relative error of the exact values'
+        ))
@@ -0,0 +1,129 @@
+# management/commands/bench_spectate.py
+
+import asyncio
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.engine import BOARD_WIDTH, Game
+from game.spectate import EMPTY_META, EMPTY_ROWS, LiveGame, Spectator, encode_frame, engine_state
+
+
+def bot_frames(frames, seed):
+    """Publisher frames from random play, plus each state's size as full board arrays"""
+    rng = random.Random(seed)
+    game_number = 1
+    game = Game(seed=seed)
+    base = (None, EMPTY_ROWS, EMPTY_META)
+    result = []
+    while len(result) < frames:
+        if game.game_over:
+            game_number += 1
+            game = Game(seed=rng.getrandbits(32))
+        action = rng.random()
+        if action < 0.3:
+            game.move(rng.choice((-1, 1)))
+        elif action < 0.45:
+            game.rotate()
+        elif action < 0.95:
+            game.step()
+        else:
+            game.hard_drop()
+
+        state = (game_number, *engine_state(game))
+        text = encode_frame(*base, *state)
+        if text is not None:
+            base = state
+            result.append((json.loads(text), full_board_bytes(game)))
+    return result
+
+
+def full_board_bytes(game):
+    """Size of the same state sent as createBoard-style 10x20 arrays"""
+    return len(json.dumps({
+        'board': game.to_matrix(),
+        'piece': [game.piece, game.rotation, game.x, game.y],
+        'next': game.next_piece, 'score': game.score, 'lines': game.lines,
+    }, separators=(',', ':')))
+
+
+async def run_bench(frames, spectators, slow, slow_delay, interval, seed):
+    sent = {'fast': [0, 0], 'slow': [0, 0]}
+
+    def make_send(kind, delay):
+        counter = sent[kind]
+
+        async def send(message):
+            counter[0] += 1
+            counter[1] += len(message['text'])
+            if delay:
+                await asyncio.sleep(delay)
+        return send
+
+    room = LiveGame(0)
+    viewers = [Spectator(room, make_send('fast', 0)) for _ in range(spectators)]
+    viewers += [Spectator(room, make_send('slow', slow_delay)) for _ in range(slow)]
+    for viewer in viewers:
+        room.spectators.add(viewer)
+    tasks = [asyncio.ensure_future(viewer.run(interval)) for viewer in viewers]
+    await asyncio.sleep(0)
+
+    published = bot_frames(frames, seed)
+    full_bytes = sum(size for _, size in published)
+    started = time.perf_counter()
+    for frame, _ in published:
+        room.apply(frame)
+        # Let the viewers run between frames, as the publisher's socket would
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    timed_messages = sent['fast'][0] + sent['slow'][0]
+    # Let capped and slow viewers catch up to the final state
+    await asyncio.sleep(max(interval, slow_delay) * 2)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return len(published), full_bytes, sent, timed_messages, elapsed
+
+
+class Command(BaseCommand):
+    help = 'Benchmark live-spectating fan-out: messages per second and bytes per frame'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frames', type=int, default=20000, help='Publisher frames to send')
+        parser.add_argument('--spectators', type=int, default=100, help='Viewers that keep up')
+        parser.add_argument('--slow', type=int, default=0, help='Viewers whose sends take --slow-delay')
+        parser.add_argument('--slow-delay', type=float, default=0.05, help='Seconds per send for slow viewers')
+        parser.add_argument('--fps', type=float, default=0, help='Frame rate cap per viewer (0 = none)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['frames'] < 1 or options['spectators'] < 0 or options['slow'] < 0:
+            raise CommandError('--frames must be positive and viewer counts non-negative')
+        interval = 1.0 / options['fps'] if options['fps'] > 0 else 0.0
+
+        published, full_bytes, sent, timed_messages, elapsed = asyncio.run(run_bench(
+            options['frames'], options['spectators'], options['slow'],
+            options['slow_delay'], interval, options['seed'],
+        ))
+
+        fast_messages, fast_bytes = sent['fast']
+        slow_messages, slow_bytes = sent['slow']
+        messages = fast_messages + slow_messages
+        self.stdout.write(f'{published} frames published to {options["spectators"]} + {options["slow"]} slow viewers')
+        if messages:
+            self.stdout.write(
+                f'Bytes per frame: {(fast_bytes + slow_bytes) / messages:.1f} as diffs, '
+                f'{full_bytes / published:.1f} as full {BOARD_WIDTH}-wide board arrays'
+            )
+        if options['slow']:
+            self.stdout.write(
+                f'Slow viewers received {slow_messages / options["slow"]:.0f} frames each '
+                f'({slow_bytes / max(slow_messages, 1):.1f} bytes per frame)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{timed_messages} messages in {elapsed:.2f}s, {timed_messages / elapsed:.0f} messages/s'
+        ))
@@ -0,0 +1,91 @@
+# management/commands/generate_fake_data.py
+
+import io
+import time
+from contextlib import nullcontext
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from game.management.commands._dataset import deferred_indexes, fast_writes, seed_batches
+from game.management.commands.backfill_achievements import backfill_range
+from game.models import Achievement, GameSession, PlayerBest
+from game.percentiles import score_distributions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with reproducible fake players, games, stats, daily rollups, achievements and percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000, help='Players to create')
+        parser.add_argument('--sessions-per-user', type=float, default=20,
+                            help='Average games per player (long-tailed per player)')
+        parser.add_argument('--fixed-sessions', action='store_true',
+                            help='Give every player exactly --sessions-per-user games')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='fake', help='Username prefix; must not be in use yet')
+        parser.add_argument('--batch-sessions', type=int, default=100000,
+                            help='Roughly how many sessions to insert per transaction')
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='Update GameSession indexes row by row instead of rebuilding them after the load')
+        parser.add_argument('--no-achievements', action='store_true', help='Skip awarding achievements')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        mean = options['sessions_per_user']
+        if options['fixed_sessions']:
+            mean = int(mean)
+        if users < 1 or mean <= 0 or options['batch_sessions'] < 1:
+            raise CommandError('--users, --sessions-per-user and --batch-sessions must be positive')
+        prefix = options['prefix']
+        if User.objects.filter(username=f'{prefix}0').exists():
+            raise CommandError(f'Users named {prefix}N already exist; pass another --prefix')
+
+        batch_size = max(1, int(options['batch_sessions'] / mean))
+        started = time.monotonic()
+        created_users = created_sessions = 0
+        low = high = None
+        indexes = nullcontext() if options['keep_indexes'] else deferred_indexes(GameSession)
+        with fast_writes(), indexes:
+            for user_ids, sessions in seed_batches(
+                users, mean, options['seed'], prefix, batch_size, spread=not options['fixed_sessions'],
+            ):
+                low = user_ids[0] if low is None else low
+                high = user_ids[-1]
+                created_users += len(user_ids)
+                created_sessions += sessions
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{created_users}/{users} users, {created_sessions} sessions, '
+                    f'{created_sessions / elapsed:.0f} sessions/s'
+                )
+        load_seconds = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created_users} users, {created_sessions} sessions and their stats in '
+            f'{load_seconds:.1f}s ({created_sessions / load_seconds:.0f} sessions/s, '
+            f'{created_users / load_seconds:.0f} users/s)'
+        ))
+
+        if not options['no_achievements']:
+            started = time.monotonic()
+            if not Achievement.objects.exists():
+                call_command('create_achievements', stdout=io.StringIO())
+            with fast_writes():
+                scanned, awarded = backfill_range(low, high, None, 20000, False)
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Awarded {awarded} achievements from {scanned} sessions in {elapsed:.1f}s '
+                f'({scanned / elapsed if elapsed else scanned:.0f} sessions/s)'
+            ))
+
+        started = time.monotonic()
+        rebuilt = PlayerBest.rebuild()
+        self.stdout.write(f'Rebuilt {rebuilt} leaderboard entries in {time.monotonic() - started:.1f}s')
+
+        # Bulk inserts skip the submit hooks, so the sketches start over from the database
+        started = time.monotonic()
+        score_distributions.rebuild()
+        self.stdout.write(f'Rebuilt percentile sketches in {time.monotonic() - started:.1f}s')
@@ -0,0 +1,132 @@
+# management/commands/loadtest_http.py
+
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = [
+    '/api/game/leaderboard/',
+    '/api/game/user-stats/',
+    '/api/game/achievements/',
+    '/api/auth/profile/',
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; return its status code"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Server closed the connection')
+    status = int(status_line.split()[1])
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, requests, deadline, latencies, errors):
+    """One keep-alive connection issuing requests back to back until the deadline"""
+    reader = writer = None
+    position = 0
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            request = requests[position % len(requests)]
+            position += 1
+            started = time.perf_counter()
+            writer.write(request)
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as exc:
+            errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host, port, requests, concurrency, duration):
+    latencies = []
+    errors = {}
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*(
+        client(host, port, requests[i % len(requests):] + requests[:i % len(requests)],
+               deadline, latencies, errors)
+        for i in range(concurrency)
+    ))
+    return latencies, errors, time.monotonic() - started
+
+
+class Command(BaseCommand):
+    help = 'Drive a running server with many concurrent keep-alive clients and report throughput and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='Server to test, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', dest='paths', help='Path to request (repeatable)')
+        parser.add_argument('--concurrency', type=int, default=500, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+        parser.add_argument('--token', help='JWT access token sent as a Bearer header')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('base_url must be a plain http:// URL')
+        if options['concurrency'] < 1 or options['duration'] <= 0:
+            raise CommandError('--concurrency and --duration must be positive')
+
+        host = url.hostname
+        port = url.port or 80
+        headers = f'Host: {url.netloc}\r\nConnection: keep-alive\r\nAccept: application/json\r\n'
+        if options['token']:
+            headers += f"Authorization: Bearer {options['token']}\r\n"
+        paths = options['paths'] or DEFAULT_PATHS
+        requests = [f'GET {path} HTTP/1.1\r\n{headers}\r\n'.encode() for path in paths]
+
+        self.stdout.write(
+            f"{options['concurrency']} clients for {options['duration']:.0f}s against "
+            f"{options['base_url']} ({len(paths)} paths)"
+        )
+        latencies, errors, elapsed = asyncio.run(
+            run_load(host, port, requests, options['concurrency'], options['duration'])
+        )
+
+        latencies.sort()
+        for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+            self.stdout.write(f'{name}: {percentile(latencies, fraction) * 1000:.1f} ms')
+        if errors:
+            self.stdout.write(self.style.WARNING(f'Errors: {errors}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(latencies)} requests in {elapsed:.1f}s, {len(latencies) / elapsed:.0f} requests/s'
+        ))
@@ -0,0 +1,104 @@
+# management/commands/loadtest_versus.py
+
+import asyncio
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.engine.replay import HARD_DROP, LEFT, RIGHT, ROTATE, SOFT_DROP
+from game.management.commands.loadtest_http import percentile
+from game.versus import Match, MatchScheduler, Seat
+
+BOT_INPUTS = (LEFT, LEFT, RIGHT, RIGHT, ROTATE, SOFT_DROP, HARD_DROP)
+INPUT_INTERVAL = 0.05
+
+
+async def run_load(matches, duration, rate, apm, fps, seed):
+    rng = random.Random(seed)
+    sent = [0, 0]
+    finished = [0]
+    live = set()
+
+    async def send(message):
+        sent[0] += 1
+        sent[1] += len(message.get('text', ''))
+
+    def new_match():
+        seats = [Seat(None, f'bot{rng.getrandbits(16)}', send) for _ in range(2)]
+        match = Match(*seats, seed=rng.getrandbits(32), rate=rate)
+        for seat in seats:
+            seat.writer = asyncio.ensure_future(seat.run_writer(1.0 / fps if fps else 0.0))
+        live.add(match)
+        scheduler.add(match)
+
+    def replace(match):
+        # Keep the number of running matches constant
+        finished[0] += 1
+        live.discard(match)
+        for seat in match.seats:
+            seat.writer.cancel()
+        new_match()
+
+    scheduler = MatchScheduler(on_finish=replace, rate=rate)
+    for _ in range(matches):
+        new_match()
+
+    # Inputs arrive off-tick, as they would from sockets
+    chance = apm / 60 * INPUT_INTERVAL
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        await asyncio.sleep(INPUT_INTERVAL)
+        for match in live:
+            for seat in match.seats:
+                if rng.random() < chance:
+                    seat.queue_inputs([rng.choice(BOT_INPUTS)])
+
+    for match in list(live):
+        scheduler.matches.discard(match)
+        for seat in match.seats:
+            seat.writer.cancel()
+    await asyncio.sleep(2 / rate)
+    return scheduler, finished[0], sent
+
+
+class Command(BaseCommand):
+    help = 'Run many bot versus matches in-process and report tick latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--matches', type=int, default=300, help='Concurrent matches')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+        parser.add_argument('--tick-rate', type=int, default=60, help='Match ticks per second')
+        parser.add_argument('--apm', type=float, default=150, help='Inputs per minute per bot')
+        parser.add_argument('--fps', type=float, default=60, help='Updates per second sent to each bot (0 = no cap)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['matches'] < 1 or options['duration'] <= 0 or options['tick_rate'] < 1:
+            raise CommandError('--matches, --duration and --tick-rate must be positive')
+
+        started = time.process_time()
+        scheduler, finished, (messages, sent_bytes) = asyncio.run(run_load(
+            options['matches'], options['duration'], options['tick_rate'],
+            options['apm'], options['fps'], options['seed'],
+        ))
+        cpu = time.process_time() - started
+
+        period_ms = 1000 / options['tick_rate']
+        lateness = sorted(scheduler.lateness)
+        durations = sorted(scheduler.durations)
+        self.stdout.write(
+            f"{options['matches']} matches at {options['tick_rate']} ticks/s for "
+            f"{options['duration']:.0f}s ({period_ms:.1f} ms per tick)"
+        )
+        for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99), ('max', 1.0)):
+            self.stdout.write(
+                f'{name}: tick started {percentile(lateness, fraction) * 1000:.2f} ms late, '
+                f'ran {percentile(durations, fraction) * 1000:.2f} ms'
+            )
+        if scheduler.skipped:
+            self.stdout.write(self.style.WARNING(f'{scheduler.skipped} ticks skipped to keep up'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{scheduler.ticks} ticks, {finished} matches finished, {messages} updates '
+            f'({sent_bytes / max(messages, 1):.0f} bytes avg), {cpu / options["duration"] * 100:.0f}% CPU'
+        ))
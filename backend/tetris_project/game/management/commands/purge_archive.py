@@ -0,0 +1,21 @@
+# management/commands/purge_archive.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game.archive import session_archive
+
+
+class Command(BaseCommand):
+    help = 'Drop archived game sessions of deleted players (archive_sessions also does this first)'
+
+    def handle(self, *args, **options):
+        if not session_archive.directory:
+            raise CommandError('Set ARCHIVE_DIR to purge archived sessions')
+
+        started = time.monotonic()
+        players, games = session_archive.purge_deleted_players()
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {games} archived sessions of {players} deleted players in {time.monotonic() - started:.1f}s'
+        ))
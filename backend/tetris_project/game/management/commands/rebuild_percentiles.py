@@ -0,0 +1,18 @@
+# management/commands/rebuild_percentiles.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from game.percentiles import score_distributions
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the percentile sketches behind percentile/ from PlayerBest and verified games'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        totals = score_distributions.rebuild()
+        elapsed = time.monotonic() - started
+        counted = ', '.join(f'{count} {metric}' for metric, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt percentile sketches ({counted}) in {elapsed:.1f}s'))
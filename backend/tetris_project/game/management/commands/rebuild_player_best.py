@@ -0,0 +1,22 @@
+# management/commands/rebuild_player_best.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from game.models import PlayerBest
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-player best score table used by the leaderboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuilt = PlayerBest.rebuild(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rebuilt} player best scores in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,71 @@
+# management/commands/rebuild_user_stats.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db.models import Max, Min
+
+from game.models import GameSession, UserStats
+from game.management.commands._helpers import parse_since, run_ranges, split_range
+
+User = get_user_model()
+
+
+def rebuild_range(low, high, since, chunk_size):
+    """Rebuild stats for every user with an id in [low, high]"""
+    users = User.objects.filter(id__gte=low, id__lte=high)
+    if since is not None:
+        users = users.filter(
+            id__in=GameSession.objects.filter(created_at__gte=since).values('user_id')
+        )
+
+    # Materialize the ids first so no read cursor stays open while writing
+    user_ids = list(users.order_by('id').values_list('id', flat=True))
+    rebuilt = 0
+    for start in range(0, len(user_ids), chunk_size):
+        rebuilt += UserStats.rebuild_for_users(user_ids[start:start + chunk_size])
+    return rebuilt
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserStats for all players with set-based aggregation'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild players who played since this date (YYYY-MM-DD or ISO datetime)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Users per GROUP BY query')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+
+    def handle(self, *args, **options):
+        since = parse_since(options['since'])
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        if chunk_size < 1 or workers < 1:
+            raise CommandError('--chunk-size and --workers must be positive')
+
+        bounds = User.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.WARNING('No users found.'))
+            return
+
+        # Use more ranges than workers so progress is reported as they finish
+        ranges = split_range(bounds['low'], bounds['high'], workers * 4)
+        started = time.monotonic()
+        rebuilt = 0
+
+        for done, ((low, high), count) in enumerate(run_ranges(rebuild_range, ranges, workers, since, chunk_size), start=1):
+            rebuilt += count
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'[{done}/{len(ranges)}] users {low}-{high} done, '
+                f'{rebuilt} rebuilt, {rebuilt / elapsed if elapsed else rebuilt:.0f} users/s'
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {rebuilt} users in {elapsed:.1f}s '
+            f'({rebuilt / elapsed if elapsed else rebuilt:.0f} users/s)'
+        ))
@@ -0,0 +1,58 @@
+# management/commands/rollup_sessions.py
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from game.models import DailyUserStats
+from game.management.commands._helpers import parse_since, run_ranges, split_range
+
+User = get_user_model()
+
+
+def rollup_range(low, high, since):
+    return DailyUserStats.rebuild_range(low, high, since)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-day DailyUserStats rollup from game sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild days from this date on (YYYY-MM-DD or ISO datetime)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Users per GROUP BY query')
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+
+    def handle(self, *args, **options):
+        since = parse_since(options['since'])
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        if chunk_size < 1 or workers < 1:
+            raise CommandError('--chunk-size and --workers must be positive')
+
+        bounds = User.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.WARNING('No users found.'))
+            return
+
+        parts = max(workers * 4, -(-(bounds['high'] - bounds['low'] + 1) // chunk_size))
+        ranges = split_range(bounds['low'], bounds['high'], parts)
+        started = time.monotonic()
+        rows = 0
+
+        for done, ((low, high), count) in enumerate(run_ranges(rollup_range, ranges, workers, since), start=1):
+            rows += count
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'[{done}/{len(ranges)}] users {low}-{high} done, '
+                f'{rows} day rows, {rows / elapsed if elapsed else rows:.0f} rows/s'
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {rows} daily rollup rows in {elapsed:.1f}s'
+        ))
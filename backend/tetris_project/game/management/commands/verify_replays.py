@@ -0,0 +1,168 @@
+# management/commands/verify_replays.py
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from game.engine.simulate import verify
+from game.management.commands.backfill_achievements import backfill_range
+from game.models import DailyUserStats, GameSession, UserAchievement, UserStats, record_player_best
+from game.verification import refresh_pending_count
+from users.progression import revoke_games
+from tetris_project.cache_versions import bump_version, user_namespace
+
+CLAIMED_FIELDS = ('score', 'lines_cleared', 'tetrises_cleared', 'pieces_placed')
+REPLAY_CHUNK_SIZE = 20000  # games per chunk when re-awarding a player's achievements
+
+
+def verify_job(job):
+    """Re-simulate one replay; runs in a worker process without touching the database"""
+    session_id, data, claimed = job
+    ok, reason = verify(bytes(data), claimed)
+    return session_id, ok, reason[:200]
+
+
+def release_missing_replays():
+    """Pending sessions without a replay can never be verified; leave them unverified (unranked)"""
+    with transaction.atomic():
+        ids = list(
+            GameSession.objects.select_for_update(skip_locked=True)
+            .filter(verification_status='pending', replay__isnull=True)
+            .values_list('id', flat=True)
+        )
+        if ids:
+            GameSession.objects.filter(id__in=ids).update(
+                verification_status='unverified', verification_note='No replay submitted'
+            )
+    return len(ids)
+
+
+def load_batch(batch_size):
+    """Claim up to batch_size pending sessions; call inside the transaction that applies them
+
+    The rows stay locked until that transaction ends and other workers skip
+    them, so no session is verified (and promoted) twice.
+    """
+    rows = (
+        GameSession.objects.select_for_update(skip_locked=True)
+        .filter(verification_status='pending', replay__isnull=False)
+        .order_by('id')
+        .values_list('id', 'user_id', 'created_at', 'duration_seconds', 'replay__data', *CLAIMED_FIELDS)[:batch_size]
+    )
+    jobs = []
+    sessions = {}
+    for session_id, user_id, created_at, duration, data, *claimed in rows:
+        claimed = dict(zip(CLAIMED_FIELDS, claimed))
+        jobs.append((session_id, data, claimed))
+        # Enough of the game for PlayerBest and the percentile sketches
+        sessions[session_id] = GameSession(
+            id=session_id, user_id=user_id, created_at=created_at, score=claimed['score'],
+            lines_cleared=claimed['lines_cleared'], pieces_placed=claimed['pieces_placed'],
+            duration_seconds=duration,
+        )
+    return jobs, sessions
+
+
+def apply_results(results, sessions):
+    """Store verdicts, promote verified games to the leaderboard and revoke what rejected ones granted"""
+    verified = []
+    rejected = []
+    for session_id, ok, reason in results:
+        session = sessions[session_id]
+        session.verification_status = 'verified' if ok else 'rejected'
+        session.verification_note = reason
+        (verified if ok else rejected).append(session)
+
+    # bulk_update skips post_save, so stats are not applied a second time
+    with transaction.atomic():
+        GameSession.objects.bulk_update(
+            sessions.values(), ['verification_status', 'verification_note']
+        )
+        for session in verified:
+            record_player_best(session)
+        if rejected:
+            revoke_rejected(rejected)
+    return len(verified)
+
+
+def revoke_rejected(sessions):
+    """Undo what rejected games granted at submit: counters, EXP, stats, day rollups and achievements
+
+    Call after their status is stored. Achievements they earned go, then
+    the players' remaining games are replayed, so one a genuine game also
+    earned comes back credited to that game.
+    """
+    games = {}
+    for session in sessions:
+        games.setdefault(session.user_id, []).append(session)
+    UserAchievement.objects.filter(game_session_id__in=[session.id for session in sessions]).delete()
+    UserStats.rebuild_for_users(list(games))
+    highest = dict(UserStats.objects.filter(user_id__in=games).values_list('user_id', 'highest_score'))
+    for user_id, user_games in games.items():
+        revoke_games(user_id, [session.score for session in user_games], highest.get(user_id, 0))
+        for day in {DailyUserStats.day_of(session.created_at) for session in user_games}:
+            DailyUserStats.refresh_day(user_id, day)
+        backfill_range(user_id, user_id, None, REPLAY_CHUNK_SIZE, dry_run=False)
+        transaction.on_commit(partial(bump_version, user_namespace(user_id)))
+
+
+class Command(BaseCommand):
+    help = 'Verify pending game sessions by re-simulating their replays'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of simulation processes')
+        parser.add_argument('--batch-size', type=int, default=500, help='Sessions claimed per batch')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size']
+        if workers < 1 or batch_size < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+
+        # Fork the pool before any connection is open so children never share one
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            self.run(pool, workers, batch_size, options['poll_interval'], options['once'])
+
+    def run(self, pool, workers, batch_size, poll_interval, once):
+        started = time.monotonic()
+        total = verified_total = rejected_total = released_total = 0
+        while True:
+            released = release_missing_replays()
+            total += released
+            released_total += released
+            batch_started = time.monotonic()
+            with transaction.atomic():
+                jobs, sessions = load_batch(batch_size)
+                if jobs:
+                    chunksize = max(1, len(jobs) // (workers * 4))
+                    results = list(pool.map(verify_job, jobs, chunksize=chunksize))
+                    verified = apply_results(results, sessions)
+            if not jobs:
+                refresh_pending_count()
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+            elapsed = time.monotonic() - batch_started
+
+            total += len(jobs)
+            verified_total += verified
+            rejected_total += len(jobs) - verified
+            rate = len(jobs) / elapsed if elapsed else len(jobs)
+            self.stdout.write(
+                f'{len(jobs)} replays ({verified} verified) in {elapsed:.2f}s, '
+                f'{rate:.0f} replays/s, {rate / workers:.0f} replays/s per core, '
+                f'{refresh_pending_count()} pending'
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {total} sessions: {verified_total} verified, {rejected_total} rejected, '
+            f'{released_total} without a replay left unverified in {elapsed:.1f}s'
+        ))
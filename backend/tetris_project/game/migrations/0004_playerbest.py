@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_player_best(apps, schema_editor):
+    GameSession = apps.get_model('game', 'GameSession')
+    PlayerBest = apps.get_model('game', 'PlayerBest')
+    sessions = (
+        GameSession.objects.order_by('user_id', '-score', 'created_at')
+        .values_list('user_id', 'score', 'id', 'created_at')
+    )
+    batch = []
+    last_user_id = None
+    for user_id, score, session_id, created_at in sessions.iterator(chunk_size=5000):
+        if user_id == last_user_id:
+            continue
+        last_user_id = user_id
+        batch.append(PlayerBest(user_id=user_id, score=score, session_id=session_id, achieved_at=created_at))
+        if len(batch) >= 5000:
+            PlayerBest.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        PlayerBest.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_userachievement_userstats_alter_achievement_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerBest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField(default=0)),
+                ('achieved_at', models.DateTimeField()),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='game.gamesession')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-score', 'achieved_at'],
+                'indexes': [models.Index(fields=['-score', 'achieved_at'], name='game_player_score_e63464_idx')],
+            },
+        ),
+        migrations.RunPython(populate_player_best, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_playerbest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playerbest',
+            index=models.Index(fields=['achieved_at'], name='game_player_achieve_bee820_idx'),
+        ),
+    ]
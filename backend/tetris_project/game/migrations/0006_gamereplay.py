@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_playerbest_achieved_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameReplay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seed', models.BigIntegerField()),
+                ('data', models.BinaryField()),
+                ('event_count', models.IntegerField(default=0)),
+                ('frame_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='replay', to='game.gamesession')),
+            ],
+        ),
+    ]
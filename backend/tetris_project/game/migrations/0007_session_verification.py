@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_gamereplay'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='playerbest',
+            name='game_player_achieve_bee820_idx',
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='verification_note',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        # Games recorded before replays existed stay on the leaderboard
+        migrations.AddField(
+            model_name='gamesession',
+            name='verification_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('verified', 'Verified'), ('rejected', 'Rejected')], db_index=True, default='verified', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='gamesession',
+            name='verification_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('verified', 'Verified'), ('rejected', 'Rejected')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='playerbest',
+            name='updated_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0008_versusmatch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('games', models.IntegerField(default=0)),
+                ('total_score', models.BigIntegerField(default=0)),
+                ('max_score', models.IntegerField(default=0)),
+                ('lines_cleared', models.IntegerField(default=0)),
+                ('pieces_placed', models.IntegerField(default=0)),
+                ('playtime_seconds', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'day'],
+                'unique_together': {('user', 'day')},
+            },
+        ),
+    ]
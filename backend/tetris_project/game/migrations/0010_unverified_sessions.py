@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+def rank_replayless_sessions(apps, schema_editor):
+    """Games sent without a replay were rejected (or left pending); rank them as unverified"""
+    GameSession = apps.get_model('game', 'GameSession')
+    GameReplay = apps.get_model('game', 'GameReplay')
+    GameSession.objects.filter(verification_status='pending').exclude(
+        id__in=GameReplay.objects.values('session_id')
+    ).update(verification_status='unverified', verification_note='No replay submitted')
+    GameSession.objects.filter(
+        verification_status='rejected', verification_note='No replay submitted'
+    ).update(verification_status='unverified')
+
+
+def unrank_replayless_sessions(apps, schema_editor):
+    GameSession = apps.get_model('game', 'GameSession')
+    GameSession.objects.filter(verification_status='unverified').update(
+        verification_status='rejected', verification_note='No replay submitted'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0009_dailyuserstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gamesession',
+            name='verification_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('verified', 'Verified'), ('rejected', 'Rejected'), ('unverified', 'Unverified')], db_index=True, default='unverified', max_length=20),
+        ),
+        # PlayerBest and the percentile sketches pick these up with
+        # rebuild_player_best and rebuild_percentiles
+        migrations.RunPython(rank_replayless_sessions, unrank_replayless_sessions),
+    ]
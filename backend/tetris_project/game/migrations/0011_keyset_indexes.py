@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0010_unverified_sessions'),
+    ]
+
+    operations = [
+        # The new indexes first, so the lists are never left without one
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['user', '-score', '-id'], name='game_gamese_user_id_2ecbb1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='game_gamese_user_id_b8b0ae_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='gamesession',
+            name='game_gamese_user_id_a9b4fe_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='gamesession',
+            name='game_gamese_user_id_c1faf8_idx',
+        ),
+    ]
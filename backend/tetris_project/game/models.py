@@ -1,9 +1,12 @@
 # models.py - Enhanced game tracking models
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Value, ExpressionWrapper
+from django.db.models.functions import Coalesce, Greatest, Least, TruncDate
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.utils import timezone
+from datetime import datetime, time, timedelta
 import json
 
 User = get_user_model()
@@ -38,6 +41,21 @@ class GameSession(models.Model):
     
     # Additional data (JSON field for flexibility)
     game_data = models.JSONField(default=dict, blank=True)
+
+    # Replay verification; games sent with a replay wait as pending until the
+    # worker re-simulates them, games without one stay unverified. Only
+    # verified games are ranked; rejected ones count towards nothing
+    VERIFICATION_STATUSES = [
+        ('pending', 'Pending'),
+        ('verified', 'Verified'),
+        ('rejected', 'Rejected'),
+        ('unverified', 'Unverified'),
+    ]
+    RANKED_STATUSES = ('verified',)
+    verification_status = models.CharField(
+        max_length=20, choices=VERIFICATION_STATUSES, default='unverified', db_index=True
+    )
+    verification_note = models.CharField(max_length=200, blank=True, default='')
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -46,19 +64,29 @@ class GameSession(models.Model):
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', '-score']),
+            # Keyset pages order by (field, id) descending; ending the index
+            # in id lets a page be read straight off it without a sort
+            models.Index(fields=['user', '-score', '-id']),
             models.Index(fields=['-score']),
-            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', '-created_at', '-id']),
         ]
     
     def __str__(self):
         return f"{self.user.username} - {self.score} points - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
     
-    def save(self, *args, **kwargs):
+    @classmethod
+    def counted(cls):
+        """Sessions that count towards stats, EXP and achievements: all but rejected ones"""
+        return cls.objects.exclude(verification_status='rejected')
+
+    def set_duration(self):
         # Auto-calculate duration if ended_at is set
         if self.ended_at and self.started_at:
             duration = self.ended_at - self.started_at
             self.duration_seconds = int(duration.total_seconds())
+
+    def save(self, *args, **kwargs):
+        self.set_duration()
         super().save(*args, **kwargs)
     
     @property
@@ -84,6 +112,35 @@ class GameSession(models.Model):
             return round(self.pieces_placed / self.duration_seconds, 2)
         return 0
 
+class GameReplay(models.Model):
+    """Compressed input recording of a game (format in game/engine/replay.py)"""
+    session = models.OneToOneField(GameSession, on_delete=models.CASCADE, related_name='replay')
+    seed = models.BigIntegerField()
+    data = models.BinaryField()
+    event_count = models.IntegerField(default=0)
+    frame_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Replay of session {self.session_id} ({len(self.data)} bytes)"
+
+class VersusMatch(models.Model):
+    """A server-run head-to-head match and the pair of game sessions it produced"""
+    session_one = models.OneToOneField(GameSession, on_delete=models.CASCADE, related_name='versus_as_one')
+    session_two = models.OneToOneField(GameSession, on_delete=models.CASCADE, related_name='versus_as_two')
+    winner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    seed = models.BigIntegerField()
+    ticks = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Versus match {self.pk}: sessions {self.session_one_id} and {self.session_two_id}"
+
 class Achievement(models.Model):
     """Define available achievements"""
     name = models.CharField(max_length=100)
@@ -159,51 +216,515 @@ class UserStats(models.Model):
     def __str__(self):
         return f"{self.user.username} - Stats"
     
+    # Aggregates over GameSession used by the repair paths, keyed by the
+    # UserStats field they populate
+    STATS_AGGREGATES = {
+        'total_games': models.Count('id'),
+        'highest_score': models.Max('score'),
+        'highest_level': models.Max('final_level'),
+        'most_lines_cleared': models.Max('lines_cleared'),
+        'longest_game_seconds': models.Max('duration_seconds'),
+        'total_score': models.Sum('score'),
+        'total_lines_cleared': models.Sum('lines_cleared'),
+        'total_pieces_placed': models.Sum('pieces_placed'),
+        'total_playtime_seconds': models.Sum('duration_seconds'),
+        'first_game_at': models.Min('created_at'),
+        'last_game_at': models.Max('created_at'),
+    }
+    REBUILT_FIELDS = list(STATS_AGGREGATES) + ['average_score', 'average_lines_per_game', 'updated_at']
+    STATS_MAXIMA = ('highest_score', 'highest_level', 'most_lines_cleared', 'longest_game_seconds', 'last_game_at')
+    STATS_MINIMA = ('first_game_at',)
+
+    def set_totals(self, totals):
+        """Copy an aggregate row (see STATS_AGGREGATES) onto this instance"""
+        for field in self.STATS_AGGREGATES:
+            value = totals.get(field)
+            if field in ('first_game_at', 'last_game_at'):
+                setattr(self, field, value)
+            else:
+                setattr(self, field, value or 0)
+
+        # Averages
+        if self.total_games > 0:
+            self.average_score = self.total_score / self.total_games
+            self.average_lines_per_game = self.total_lines_cleared / self.total_games
+        else:
+            self.average_score = 0
+            self.average_lines_per_game = 0
+        self.updated_at = timezone.now()
+
     def update_stats(self):
-        """Recalculate all stats from game sessions"""
-        games = GameSession.objects.filter(user=self.user)
-        
-        if games.exists():
-            self.total_games = games.count()
-            self.highest_score = games.aggregate(models.Max('score'))['score__max'] or 0
-            self.highest_level = games.aggregate(models.Max('final_level'))['final_level__max'] or 0
-            self.most_lines_cleared = games.aggregate(models.Max('lines_cleared'))['lines_cleared__max'] or 0
-            self.longest_game_seconds = games.aggregate(models.Max('duration_seconds'))['duration_seconds__max'] or 0
-            
-            # Totals
-            totals = games.aggregate(
-                total_score=models.Sum('score'),
-                total_lines=models.Sum('lines_cleared'),
-                total_pieces=models.Sum('pieces_placed'),
-                total_time=models.Sum('duration_seconds')
-            )
-            
-            self.total_score = totals['total_score'] or 0
-            self.total_lines_cleared = totals['total_lines'] or 0
-            self.total_pieces_placed = totals['total_pieces'] or 0
-            self.total_playtime_seconds = totals['total_time'] or 0
-            
-            # Averages
-            if self.total_games > 0:
-                self.average_score = self.total_score / self.total_games
-                self.average_lines_per_game = self.total_lines_cleared / self.total_games
-            
-            # Dates
-            self.first_game_at = games.earliest('created_at').created_at
-            self.last_game_at = games.latest('created_at').created_at
-        
+        """Recalculate all stats from game sessions (repair path, scans full history)"""
+        totals = GameSession.counted().filter(user=self.user).aggregate(**self.STATS_AGGREGATES)
+        self.add_archived({self.user_id: totals}, [self.user_id])
+        self.set_totals(totals)
         self.save()
 
+    @classmethod
+    def add_archived(cls, totals_by_user, user_ids):
+        """Fold archived games (see game/archive.py) into aggregate rows keyed by user id"""
+        from .archive import add_totals, session_archive
+
+        for user_id, archived in session_archive.user_totals(user_ids).items():
+            add_totals(totals_by_user.setdefault(user_id, {}), archived, cls.STATS_MAXIMA, cls.STATS_MINIMA)
+
+    @classmethod
+    def rebuild_for_users(cls, user_ids):
+        """Recalculate stats for many users with one GROUP BY and bulk writes"""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return 0
+
+        rows = (
+            GameSession.counted().filter(user_id__in=user_ids)
+            .order_by()
+            .values('user_id')
+            .annotate(**cls.STATS_AGGREGATES)
+        )
+        totals_by_user = {row['user_id']: row for row in rows}
+        cls.add_archived(totals_by_user, user_ids)
+
+        existing = {stats.user_id: stats for stats in cls.objects.filter(user_id__in=user_ids)}
+        to_create = []
+        for user_id in user_ids:
+            user_stats = existing.get(user_id)
+            if user_stats is None:
+                if user_id not in totals_by_user:
+                    continue
+                user_stats = cls(user_id=user_id)
+                to_create.append(user_stats)
+            user_stats.set_totals(totals_by_user.get(user_id, {}))
+
+        with transaction.atomic():
+            if existing:
+                cls.objects.bulk_update(existing.values(), cls.REBUILT_FIELDS)
+            if to_create:
+                cls.objects.bulk_create(to_create)
+        return len(existing) + len(to_create)
+
+    @classmethod
+    def apply_session(cls, session):
+        """Fold one new game session into the stored totals with a single UPDATE"""
+        cls.apply_sessions(session.user_id, [session])
+
+    @classmethod
+    def apply_sessions(cls, user_id, sessions):
+        """Fold a player's new game sessions into the stored totals with a single UPDATE"""
+        if not sessions:
+            return
+        games = len(sessions)
+        score = sum(session.score for session in sessions)
+        lines = sum(session.lines_cleared for session in sessions)
+        pieces = sum(session.pieces_placed for session in sessions)
+        durations = [session.duration_seconds or 0 for session in sessions]
+        first_played = min(session.created_at for session in sessions)
+        last_played = max(session.created_at for session in sessions)
+
+        # MySQL and MariaDB evaluate SET assignments left to right, each seeing
+        # the ones before it, so the averages come first: they must read the
+        # old totals on every backend
+        updated = cls.objects.filter(user_id=user_id).update(
+            average_score=ExpressionWrapper(
+                (F('total_score') + score) * 1.0 / (F('total_games') + games),
+                output_field=models.FloatField(),
+            ),
+            average_lines_per_game=ExpressionWrapper(
+                (F('total_lines_cleared') + lines) * 1.0 / (F('total_games') + games),
+                output_field=models.FloatField(),
+            ),
+            total_games=F('total_games') + games,
+            highest_score=Greatest('highest_score', Value(max(s.score for s in sessions))),
+            highest_level=Greatest('highest_level', Value(max(s.final_level for s in sessions))),
+            most_lines_cleared=Greatest('most_lines_cleared', Value(max(s.lines_cleared for s in sessions))),
+            longest_game_seconds=Greatest('longest_game_seconds', Value(max(durations))),
+            total_score=F('total_score') + score,
+            total_lines_cleared=F('total_lines_cleared') + lines,
+            total_pieces_placed=F('total_pieces_placed') + pieces,
+            total_playtime_seconds=F('total_playtime_seconds') + sum(durations),
+            first_game_at=Least(Coalesce('first_game_at', Value(first_played)), Value(first_played)),
+            last_game_at=Greatest(Coalesce('last_game_at', Value(last_played)), Value(last_played)),
+            updated_at=timezone.now(),
+        )
+
+        if not updated:
+            # No stats row yet: build it from history, which already includes these games
+            user_stats, _ = cls.objects.get_or_create(user_id=user_id)
+            user_stats.update_stats()
+
+def beats(candidate, current):
+    """Whether a (score, achieved_at) pair outranks another: higher score, then the earlier game"""
+    return (-candidate[0], candidate[1]) < (-current[0], current[1])
+
+class PlayerBest(models.Model):
+    """Each player's best game, maintained on submit so the leaderboard is an index read"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    score = models.IntegerField(default=0)
+    session = models.ForeignKey(GameSession, on_delete=models.CASCADE, related_name='+')
+    achieved_at = models.DateTimeField()
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-score', 'achieved_at']
+        indexes = [
+            models.Index(fields=['-score', 'achieved_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - best {self.score}"
+
+    @classmethod
+    def record(cls, session):
+        """Make this session the player's best if it beats the stored one
+
+        Returns (improved, previous best score or None).
+        """
+        previous = cls.objects.filter(user_id=session.user_id).values_list('score', flat=True).first()
+        if previous is None:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(
+                        user_id=session.user_id,
+                        score=session.score,
+                        session=session,
+                        achieved_at=session.created_at,
+                    )
+                return True, None
+            except IntegrityError:
+                # A concurrent submit created the row first; retry the upgrade
+                return cls.record(session)
+
+        # Ties keep the earlier game, matching the old leaderboard ordering
+        if session.score <= previous:
+            return False, previous
+        updated = cls.objects.filter(user_id=session.user_id, score=previous).update(
+            score=session.score,
+            session=session,
+            achieved_at=session.created_at,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            # A concurrent submit changed the best in between; compare against the new one
+            return cls.record(session)
+        return True, previous
+
+    @classmethod
+    def refresh_for_user(cls, user_id, archived=True):
+        """Recompute a player's best from their ranked sessions (after edits or deletes)
+
+        Archived games count too (unless archived is False); one that wins is
+        restored to GameSession first.
+        """
+        best = (
+            GameSession.objects.filter(user_id=user_id, verification_status__in=GameSession.RANKED_STATUSES)
+            .order_by('-score', 'created_at')
+            .only('id', 'user_id', 'score', 'created_at')
+            .first()
+        )
+        if archived:
+            from .archive import session_archive
+
+            candidate = session_archive.best_sessions([user_id]).get(user_id)
+            if candidate is not None and (best is None or beats(candidate[:2], (best.score, best.created_at))):
+                best = next(iter(session_archive.restore([candidate[2]])), best)
+        if best is None:
+            cls.objects.filter(user_id=user_id).delete()
+            return None
+        cls.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                'score': best.score,
+                'session': best,
+                'achieved_at': best.created_at,
+                'updated_at': timezone.now(),
+            },
+        )
+        return best
+
+    @classmethod
+    def rebuild(cls, batch_size=5000):
+        """Rebuild the whole table with one ordered scan over ranked sessions"""
+        sessions = (
+            GameSession.objects.filter(verification_status__in=GameSession.RANKED_STATUSES)
+            .order_by('user_id', '-score', 'created_at')
+            .values_list('user_id', 'score', 'id', 'created_at')
+        )
+        rebuilt = 0
+        batch = []
+        last_user_id = None
+        with transaction.atomic():
+            cls.objects.all().delete()
+            for user_id, score, session_id, created_at in sessions.iterator(chunk_size=batch_size):
+                if user_id == last_user_id:
+                    continue
+                last_user_id = user_id
+                batch.append(cls(user_id=user_id, score=score, session_id=session_id, achieved_at=created_at))
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch)
+                    rebuilt += len(batch)
+                    batch = []
+            if batch:
+                cls.objects.bulk_create(batch)
+                rebuilt += len(batch)
+            rebuilt += cls.adopt_archived_bests()
+        return rebuilt
+
+    @classmethod
+    def adopt_archived_bests(cls, batch_size=5000):
+        """Point players whose best game is archived at it, restoring it to GameSession
+
+        Returns the number of players who had no best before.
+        """
+        from .archive import session_archive
+
+        archived = session_archive.best_sessions()
+        if not archived:
+            return 0
+        current = {
+            user_id: (score, achieved_at)
+            for user_id, score, achieved_at in cls.objects.values_list('user_id', 'score', 'achieved_at').iterator()
+        }
+        winners = [
+            user_id for user_id, candidate in archived.items()
+            if user_id not in current or beats(candidate[:2], current[user_id])
+        ]
+        # The archive may still hold games of players deleted since the last purge_archive
+        existing = set()
+        for start in range(0, len(winners), batch_size):
+            existing.update(User.objects.filter(pk__in=winners[start:start + batch_size]).values_list('pk', flat=True))
+        winners = [user_id for user_id in winners if user_id in existing]
+        if not winners:
+            return 0
+
+        with transaction.atomic():
+            sessions = session_archive.restore([archived[user_id][2] for user_id in winners])
+            adopted = [session.user_id for session in sessions]
+            for start in range(0, len(adopted), batch_size):
+                cls.objects.filter(user_id__in=adopted[start:start + batch_size]).delete()
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=session.user_id, score=session.score, session=session, achieved_at=session.created_at)
+                    for session in sessions
+                ],
+                batch_size=batch_size,
+            )
+        return sum(1 for user_id in adopted if user_id not in current)
+
+class DailyUserStats(models.Model):
+    """A player's games rolled up per day, kept current on submit for progress charts"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    day = models.DateField()
+    games = models.IntegerField(default=0)
+    total_score = models.BigIntegerField(default=0)
+    max_score = models.IntegerField(default=0)
+    lines_cleared = models.IntegerField(default=0)
+    pieces_placed = models.IntegerField(default=0)
+    playtime_seconds = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'day']
+        ordering = ['user', 'day']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.day}: {self.games} games"
+
+    # Aggregates over GameSession for one (user, day) row, keyed by field
+    ROLLUP_AGGREGATES = {
+        'games': models.Count('id'),
+        'total_score': Coalesce(models.Sum('score'), 0),
+        'max_score': Coalesce(models.Max('score'), 0),
+        'lines_cleared': Coalesce(models.Sum('lines_cleared'), 0),
+        'pieces_placed': Coalesce(models.Sum('pieces_placed'), 0),
+        'playtime_seconds': Coalesce(models.Sum('duration_seconds'), 0),
+    }
+
+    @staticmethod
+    def day_of(moment):
+        return timezone.localtime(moment).date()
+
+    @staticmethod
+    def day_start(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    @classmethod
+    def apply_sessions(cls, user_id, sessions):
+        """Fold a player's new games into their day rows: one UPDATE per day touched"""
+        days = {}
+        for session in sessions:
+            totals = days.setdefault(cls.day_of(session.created_at), [0, 0, 0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += session.score
+            totals[2] = max(totals[2], session.score)
+            totals[3] += session.lines_cleared
+            totals[4] += session.pieces_placed
+            totals[5] += session.duration_seconds or 0
+        for day, totals in days.items():
+            cls._add(user_id, day, *totals)
+
+    @classmethod
+    def _add(cls, user_id, day, games, score, best, lines, pieces, playtime):
+        updated = cls.objects.filter(user_id=user_id, day=day).update(
+            games=F('games') + games,
+            total_score=F('total_score') + score,
+            max_score=Greatest('max_score', Value(best)),
+            lines_cleared=F('lines_cleared') + lines,
+            pieces_placed=F('pieces_placed') + pieces,
+            playtime_seconds=F('playtime_seconds') + playtime,
+        )
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id, day=day, games=games, total_score=score, max_score=best,
+                    lines_cleared=lines, pieces_placed=pieces, playtime_seconds=playtime,
+                )
+        except IntegrityError:
+            # A concurrent submit created the day first; add to it instead
+            cls._add(user_id, day, games, score, best, lines, pieces, playtime)
+
+    @classmethod
+    def refresh_day(cls, user_id, day):
+        """Recompute one day from its sessions (after edits or deletes)"""
+        from .archive import add_totals, session_archive
+
+        start = cls.day_start(day)
+        end = start + timedelta(days=1)
+        totals = GameSession.counted().filter(
+            user_id=user_id, created_at__gte=start, created_at__lt=end
+        ).aggregate(**cls.ROLLUP_AGGREGATES)
+        # The archive cutoff may fall inside this day
+        archived = session_archive.daily_totals(user_ids=[user_id], since=start, until=end)
+        for extra in archived.values():
+            add_totals(totals, extra, maxima=('max_score',))
+        if not totals['games']:
+            cls.objects.filter(user_id=user_id, day=day).delete()
+            return
+        cls.objects.update_or_create(user_id=user_id, day=day, defaults=totals)
+
+    @classmethod
+    def rebuild_range(cls, low, high, since=None, batch_size=5000):
+        """Rebuild the rows of users with ids in [low, high] with one GROUP BY; since limits it to recent days"""
+        from .archive import add_totals, session_archive
+
+        sessions = GameSession.counted().filter(user_id__gte=low, user_id__lte=high)
+        existing = cls.objects.filter(user_id__gte=low, user_id__lte=high)
+        start = None
+        if since is not None:
+            since_day = cls.day_of(since)
+            start = cls.day_start(since_day)
+            sessions = sessions.filter(created_at__gte=start)
+            existing = existing.filter(day__gte=since_day)
+        rows = (
+            sessions.annotate(day=TruncDate('created_at'))
+            .order_by()
+            .values('user_id', 'day')
+            .annotate(**cls.ROLLUP_AGGREGATES)
+        )
+        # Read everything first so no cursor stays open while writing
+        totals = {(row['user_id'], row['day']): row for row in rows}
+        archived_days = session_archive.daily_totals(low=low, high=high, since=start)
+        if archived_days:
+            # Skip players deleted since the last purge_archive
+            players = set(User.objects.filter(pk__gte=low, pk__lte=high).values_list('pk', flat=True))
+            for (user_id, day), archived in archived_days.items():
+                if user_id in players:
+                    row = totals.setdefault((user_id, day), {'user_id': user_id, 'day': day})
+                    add_totals(row, archived, maxima=('max_score',))
+        rollups = [cls(**row) for row in totals.values()]
+        with transaction.atomic():
+            existing.delete()
+            cls.objects.bulk_create(rollups, batch_size=batch_size)
+        return len(rollups)
+
 # Signal to automatically update user stats when a game is saved
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+def record_player_best(session):
+    """Offer a ranked session to PlayerBest, the ranked leaderboard and the percentile sketches"""
+    from .broadcast import leaderboard_broadcaster
+    from .leaderboard import ranked_leaderboard
+    from .percentiles import score_distributions
+    from tetris_project.cache_versions import LEADERBOARD, bump_version
+
+    improved, previous = PlayerBest.record(session)
+    transaction.on_commit(lambda: score_distributions.add_game(session))
+    if not improved:
+        return
+    transaction.on_commit(lambda: score_distributions.replace_best(previous, session.score))
+    transaction.on_commit(lambda: bump_version(LEADERBOARD))
+    transaction.on_commit(
+        lambda: ranked_leaderboard.offer(session.user_id, session.score, session.created_at)
+    )
+    transaction.on_commit(leaderboard_broadcaster.notify)
+
+def refresh_player_best(user_id, archived=True):
+    """Recompute a player's best and mirror it into the ranked leaderboard and percentile sketches"""
+    from .broadcast import leaderboard_broadcaster
+    from .leaderboard import ranked_leaderboard
+    from .percentiles import score_distributions
+    from tetris_project.cache_versions import LEADERBOARD, bump_version
+
+    previous = PlayerBest.objects.filter(user_id=user_id).values_list('score', flat=True).first()
+    best = PlayerBest.refresh_for_user(user_id, archived=archived)
+    transaction.on_commit(lambda: bump_version(LEADERBOARD))
+    transaction.on_commit(leaderboard_broadcaster.notify)
+    transaction.on_commit(
+        lambda: score_distributions.replace_best(previous, best.score if best is not None else None)
+    )
+    if best is None:
+        transaction.on_commit(lambda: ranked_leaderboard.discard(user_id))
+    else:
+        transaction.on_commit(lambda: ranked_leaderboard.set(user_id, best.score, best.created_at))
+
+def refresh_daily_stats(session):
+    """Recompute the session's day in the rollup and drop the player's cached responses"""
+    from tetris_project.cache_versions import bump_version, user_namespace
+
+    DailyUserStats.refresh_day(session.user_id, DailyUserStats.day_of(session.created_at))
+    transaction.on_commit(lambda: bump_version(user_namespace(session.user_id)))
+
 @receiver(post_save, sender=GameSession)
-def update_user_stats(sender, instance, created, **kwargs):
+def update_user_stats(sender, instance, created, raw=False, **kwargs):
     """Automatically update user stats when a game is saved"""
+    if raw:
+        # Fixtures carry their own stats rows
+        return
     if created:
-        user_stats, created = UserStats.objects.get_or_create(user=instance.user)
-        user_stats.update_stats()
+        UserStats.apply_session(instance)
+        DailyUserStats.apply_sessions(instance.user_id, [instance])
+        if instance.verification_status in GameSession.RANKED_STATUSES:
+            record_player_best(instance)
+    else:
+        # An edited score may raise or lower the player's best
+        refresh_player_best(instance.user_id)
+        refresh_daily_stats(instance)
+
+@receiver(post_delete, sender=GameSession)
+def update_player_best(sender, instance, origin=None, **kwargs):
+    """Fall back to the next best game when a session is deleted"""
+    from .percentiles import score_distributions
+
+    # When the whole account goes, restoring an archived best would only
+    # insert a game the cascade then fails on
+    refresh_player_best(instance.user_id, archived=not deleting_user(origin))
+    if instance.verification_status in GameSession.RANKED_STATUSES:
+        transaction.on_commit(lambda: score_distributions.remove_game(instance))
+    refresh_daily_stats(instance)
+
+def deleting_user(origin):
+    """Whether a delete signal comes from deleting player accounts (their games cascade)"""
+    if isinstance(origin, models.QuerySet):
+        return origin.model is User
+    return isinstance(origin, User)
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def invalidate_achievement_rules(sender, **kwargs):
+    """Recompile achievement rules after definitions change"""
+    from .achievements import invalidate_rules
+
+    invalidate_rules()
 
 # Keep the original Score model for backward compatibility
 class Score(models.Model):
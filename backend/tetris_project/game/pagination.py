@@ -0,0 +1,123 @@
+# game/pagination.py - Keyset (cursor) pagination for per-user game lists
+
+import base64
+import json
+
+from django.db.models import DateTimeField, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+# Cursor integers must fit a BIGINT column, or the database rejects the query
+MAX_INT = 2 ** 63 - 1
+
+
+def is_db_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and -MAX_INT <= value <= MAX_INT
+
+
+class KeysetPagination(BasePagination):
+    """Pages through a queryset by (field, id) instead of OFFSET
+
+    Each page is a range read that starts right after the last row of the
+    previous page, so page 10,000 costs the same as page 1 and no COUNT(*)
+    is issued, given an index ending in (field, id) and no joins (the
+    bench_pagination command checks both). Rows are ordered descending on
+    `field`, ties broken by id. Cursors are opaque base64 tokens of the last
+    row's (field, id).
+
+    archived, if given, is called as archived(position, limit) and returns up
+    to limit more rows after position in the same order (archived sessions,
+    see game/archive.py); they are merged into the page, skipping ids the
+    table returned too.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, field):
+        self.field = field
+        self.page_size = api_settings.PAGE_SIZE or 20
+        self.next_position = None
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None, archived=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request, queryset.model)
+        queryset = self.after(queryset, position)
+
+        # Fetch one extra row to learn whether another page exists
+        rows = list(queryset[:page_size + 1])
+        if archived is not None:
+            # archive_sessions writes a month before deleting its games from the table
+            listed = {row.pk for row in rows}
+            rows.extend(row for row in archived(position, page_size + 1) if row.pk not in listed)
+            rows.sort(key=lambda row: (getattr(row, self.field), row.pk), reverse=True)
+            rows = rows[:page_size + 1]
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_position = (getattr(last, self.field), last.pk)
+        return rows
+
+    def after(self, queryset, position):
+        """queryset in page order, starting right after position (None: from the top)"""
+        queryset = queryset.order_by(f'-{self.field}', '-id')
+        if position is None:
+            return queryset
+        value, last_id = position
+        # The leading <= bound lets the database range-scan the index
+        return queryset.filter(
+            Q(**{f'{self.field}__lte': value}),
+            Q(**{f'{self.field}__lt': value}) | Q(id__lt=last_id),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        value, last_id = position
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        token = json.dumps([value, last_id], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request, model):
+        """(value, id) of the cursor, checked against model's field; NotFound if it was tampered with"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            token = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            value, last_id = json.loads(token)
+            if isinstance(model._meta.get_field(self.field), DateTimeField):
+                # Compared with aware datetimes (rows, the archive), so it must be one too
+                value = parse_datetime(value) if isinstance(value, str) else None
+                if value is None or timezone.is_naive(value):
+                    raise ValueError
+            elif not is_db_int(value):
+                raise ValueError
+            if not is_db_int(last_id):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return value, last_id
@@ -0,0 +1,483 @@
+# game/percentiles.py - Mergeable score distributions for "you beat X% of players"
+
+"""Approximate distributions of best scores and game speed
+
+Each metric is a LogHistogram: counts in buckets whose bounds grow by
+gamma = (1 + a) / (1 - a), a being PERCENTILE_RELATIVE_ACCURACY. Every
+value is within a relative error a of its bucket's representative, so
+quantiles are within a of the exact ones, and a percentile is exact except
+for the players whose value lies within a of the one asked about. Adding
+or removing a value is one bucket increment; histograms merge by adding
+counts.
+
+score counts each player's best ranked game (PlayerBest).
+lines_per_minute and pieces_per_second count every ranked (verified) game,
+archived ones included.
+
+Files in PERCENTILE_DIR:
+
+    base.bin               histograms built from the database, tagged with
+                           a random generation id
+    delta_<pid>_<tag>.bin  one process's changes since that base
+
+A process rewrites its own delta file after PERCENTILE_SNAPSHOT_EVERY
+updates or PERCENTILE_SYNC_SECONDS, whichever comes first, and at exit. Readers add every delta file of the base's generation
+to the base, re-reading them every PERCENTILE_SYNC_SECONDS. That way
+gunicorn workers and verify_replays see each other's updates without
+locking. rebuild_percentiles starts a new generation from the database and
+removes the old deltas; other processes pick it up on their next sync.
+Without PERCENTILE_DIR each process builds its base from the database on
+first use and only sees its own updates.
+
+Blob layout (little-endian):
+
+    header  4s magic, u64 generation, f64 relative accuracy, u32 metric count
+    metric  u16 name length, name, f64 min value, u32 bucket count,
+            u32 payload length, zlib-compressed int64 counts
+"""
+
+import atexit
+import math
+import os
+import secrets
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+from .archive import session_archive
+from .models import GameSession, PlayerBest
+
+# metric: (smallest value with its own bucket, largest value with its own bucket)
+METRICS = {
+    'score': (1.0, 1e9),
+    'lines_per_minute': (0.1, 1e4),
+    'pieces_per_second': (0.01, 1e3),
+}
+
+BLOB_MAGIC = b'TPS1'
+BLOB_HEADER = struct.Struct('<4sQdI')
+METRIC_NAME = struct.Struct('<H')
+METRIC_HEADER = struct.Struct('<dII')
+
+BASE_NAME = 'base.bin'
+DELTA_PREFIX = 'delta_'
+DB_CHUNK = 100000
+
+
+class LogHistogram:
+    """Value counts in logarithmic buckets with a bounded relative error
+
+    Slot 0 counts values below min_value (zero included). Slot i >= 1 covers
+    (min_value * gamma**(i-2), min_value * gamma**(i-1)]. Values above
+    max_value are counted in the last slot.
+    """
+
+    def __init__(self, min_value, max_value, accuracy, counts=None):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.size = 2 + math.ceil(math.log(max_value / min_value) / self._log_gamma)
+        self.counts = np.zeros(self.size, dtype=np.int64) if counts is None else counts
+
+    def empty(self):
+        return LogHistogram(self.min_value, self.max_value, self.accuracy)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def slot(self, value):
+        if value < self.min_value:
+            return 0
+        return min(self.size - 1, 1 + math.ceil(math.log(value / self.min_value) / self._log_gamma))
+
+    def slots(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        slots = np.zeros(len(values), dtype=np.int64)
+        above = values >= self.min_value
+        slots[above] = 1 + np.ceil(np.log(values[above] / self.min_value) / self._log_gamma)
+        return np.minimum(slots, self.size - 1)
+
+    def add(self, value, count=1):
+        self.counts[self.slot(value)] += count
+
+    def add_many(self, values):
+        self.counts += np.bincount(self.slots(values), minlength=self.size)
+
+    def merge(self, other):
+        self.counts += other.counts
+
+    def value_at(self, slot):
+        """Representative of a slot: within the relative accuracy of every value in it"""
+        if slot == 0:
+            return 0.0
+        return 2 * self.min_value * self.gamma ** (slot - 1) / (1 + self.gamma)
+
+    def quantile(self, q):
+        """Value at rank floor(q * (n - 1)) in ascending order, or None if empty"""
+        cumulative = np.cumsum(self.counts)
+        total = int(cumulative[-1])
+        if total <= 0:
+            return None
+        rank = int(q * (total - 1))
+        return self.value_at(int(np.searchsorted(cumulative, rank, side='right')))
+
+    def percentile(self, value):
+        """Percent of counted values below value, half of its own bucket included"""
+        total = self.total
+        if total <= 0:
+            return None
+        if value <= 0:
+            # Nothing is below zero; zeros only tie with each other
+            return 0.0
+        slot = self.slot(value)
+        below = int(self.counts[:slot].sum())
+        return 100.0 * (below + self.counts[slot] / 2) / total
+
+    # Binary form
+
+    def pack(self, name):
+        payload = zlib.compress(self.counts.astype('<i8').tobytes())
+        encoded = name.encode()
+        return (
+            METRIC_NAME.pack(len(encoded)) + encoded
+            + METRIC_HEADER.pack(self.min_value, self.size, len(payload)) + payload
+        )
+
+    def matches(self, min_value, size):
+        return min_value == self.min_value and size == self.size
+
+
+def empty_histograms(accuracy=None):
+    accuracy = accuracy or _setting('PERCENTILE_RELATIVE_ACCURACY', 0.01)
+    return {name: LogHistogram(low, high, accuracy) for name, (low, high) in METRICS.items()}
+
+
+def pack_histograms(histograms, generation):
+    accuracy = next(iter(histograms.values())).accuracy
+    parts = [BLOB_HEADER.pack(BLOB_MAGIC, generation, accuracy, len(histograms))]
+    parts.extend(histogram.pack(name) for name, histogram in histograms.items())
+    return b''.join(parts)
+
+
+def unpack_histograms(data):
+    """Return (generation, histograms), or None if data is not a blob for the current metrics"""
+    if len(data) < BLOB_HEADER.size:
+        return None
+    magic, generation, accuracy, count = BLOB_HEADER.unpack_from(data)
+    if magic != BLOB_MAGIC or accuracy != _setting('PERCENTILE_RELATIVE_ACCURACY', 0.01):
+        return None
+    histograms = empty_histograms(accuracy)
+    position = BLOB_HEADER.size
+    try:
+        for _ in range(count):
+            (length,) = METRIC_NAME.unpack_from(data, position)
+            position += METRIC_NAME.size
+            name = data[position:position + length].decode()
+            position += length
+            min_value, size, payload_length = METRIC_HEADER.unpack_from(data, position)
+            position += METRIC_HEADER.size
+            payload = data[position:position + payload_length]
+            position += payload_length
+            histogram = histograms.get(name)
+            if histogram is None or not histogram.matches(min_value, size):
+                return None
+            histogram.counts = np.frombuffer(zlib.decompress(payload), dtype='<i8').astype(np.int64)
+    except (struct.error, zlib.error, UnicodeDecodeError, ValueError):
+        return None
+    if any(len(histogram.counts) != histogram.size for histogram in histograms.values()):
+        return None
+    return generation, histograms
+
+
+def game_speeds(lines, pieces, durations):
+    """GameSession.lines_per_minute and pieces_per_second for arrays of games"""
+    durations = np.asarray(durations, dtype=np.float64)
+    played = durations > 0
+    safe = np.where(played, durations, 1.0)
+    lines_per_minute = np.where(played, np.round(np.asarray(lines) * 60 / safe, 1), 0.0)
+    pieces_per_second = np.where(played, np.round(np.asarray(pieces) / safe, 2), 0.0)
+    return lines_per_minute, pieces_per_second
+
+
+def histograms_from_db():
+    """Histograms of every player's best score and every ranked game's speed, archive included"""
+    histograms = empty_histograms()
+    scores = PlayerBest.objects.order_by().values_list('score', flat=True)
+    chunk = []
+    for score in scores.iterator(chunk_size=10000):
+        chunk.append(score)
+        if len(chunk) >= DB_CHUNK:
+            histograms['score'].add_many(chunk)
+            chunk = []
+    histograms['score'].add_many(chunk)
+
+    games = (
+        GameSession.objects.filter(verification_status__in=GameSession.RANKED_STATUSES).order_by()
+        .values_list('lines_cleared', 'pieces_placed', 'duration_seconds')
+    )
+    rows = []
+    for row in games.iterator(chunk_size=10000):
+        rows.append(row)
+        if len(rows) >= DB_CHUNK:
+            _add_games(histograms, rows)
+            rows = []
+    _add_games(histograms, rows)
+
+    for lines, pieces, durations in session_archive.ranked_games():
+        lines_per_minute, pieces_per_second = game_speeds(lines, pieces, durations)
+        histograms['lines_per_minute'].add_many(lines_per_minute)
+        histograms['pieces_per_second'].add_many(pieces_per_second)
+    return histograms
+
+
+def _add_games(histograms, rows):
+    if not rows:
+        return
+    lines, pieces, durations = np.array(rows, dtype=np.float64).T
+    lines_per_minute, pieces_per_second = game_speeds(lines, pieces, np.nan_to_num(durations))
+    histograms['lines_per_minute'].add_many(lines_per_minute)
+    histograms['pieces_per_second'].add_many(pieces_per_second)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+class ScoreDistributions:
+    """This process's view of the metric histograms: base + other processes' deltas + its own"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._pid = None
+        self._base = None
+        self._base_generation = None
+        self._others = None
+        self._local = None
+        self._generation = None
+        self._delta_path = None
+        self._dirty = 0
+        self._last_sync = 0.0
+        self._last_save = 0.0
+        self._last_generation_check = 0.0
+
+    @property
+    def directory(self):
+        return _setting('PERCENTILE_DIR', None)
+
+    @property
+    def loaded(self):
+        return self._base is not None and self._pid == os.getpid()
+
+    def _base_path(self):
+        return os.path.join(self.directory, BASE_NAME)
+
+    def _read_generation(self):
+        """Generation of the base file on disk, or None if there is none"""
+        data = _read(self._base_path())
+        if data is None or len(data) < BLOB_HEADER.size:
+            return None
+        magic, generation, _, _ = BLOB_HEADER.unpack_from(data)
+        return generation if magic == BLOB_MAGIC else None
+
+    def _check_process(self):
+        # A forked worker must not report or overwrite its parent's changes
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._base = self._others = self._base_generation = None
+            self._start_local(None)
+
+    def _start_local(self, generation):
+        self._local = empty_histograms()
+        self._generation = generation
+        self._dirty = 0
+        self._delta_path = None
+        if generation is not None and self.directory:
+            name = f'{DELTA_PREFIX}{os.getpid()}_{secrets.token_hex(4)}.bin'
+            self._delta_path = os.path.join(self.directory, name)
+
+    # Loading and persistence
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self._lock:
+                self._check_process()
+                if self._base is None:
+                    self._load()
+        elif time.monotonic() - self._last_sync >= _setting('PERCENTILE_SYNC_SECONDS', 5):
+            self.sync()
+
+    def _load(self):
+        loaded = None
+        if self.directory:
+            data = _read(self._base_path())
+            loaded = unpack_histograms(data) if data is not None else None
+        if loaded is None:
+            loaded = self._build_base()
+        self._base_generation, self._base = loaded
+        if self._generation != self._base_generation:
+            self._start_local(self._base_generation)
+        self._read_others()
+
+    def _build_base(self):
+        generation = secrets.randbits(63)
+        histograms = histograms_from_db()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_atomic(self._base_path(), pack_histograms(histograms, generation))
+        return generation, histograms
+
+    def _read_others(self):
+        others = empty_histograms()
+        directory = self.directory
+        if directory:
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if not name.startswith(DELTA_PREFIX) or not name.endswith('.bin') or path == self._delta_path:
+                    continue
+                data = _read(path)
+                loaded = unpack_histograms(data) if data is not None else None
+                if loaded is None or loaded[0] != self._base_generation:
+                    continue
+                for metric, histogram in loaded[1].items():
+                    others[metric].merge(histogram)
+        self._others = others
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Pick up other processes' deltas, or a new base written by rebuild_percentiles"""
+        with self._lock:
+            self._last_sync = time.monotonic()
+            if not self.directory:
+                return
+            if self._read_generation() != self._base_generation:
+                self._load()
+            else:
+                self._read_others()
+
+    def save(self):
+        """Write this process's changes to its delta file"""
+        if not self.directory or self._delta_path is None or self._pid != os.getpid() or not self._dirty:
+            return
+        with self._lock:
+            generation = self._read_generation()
+            if generation != self._generation:
+                # The base was rebuilt from the database, which already has these changes
+                self._start_local(generation)
+                return
+            data = pack_histograms(self._local, generation)
+            self._dirty = 0
+            self._last_save = time.monotonic()
+        _write_atomic(self._delta_path, data)
+
+    def rebuild(self):
+        """Start a new generation from the database, dropping every delta file"""
+        with self._lock:
+            self._check_process()
+            self._base_generation, self._base = self._build_base()
+            self._start_local(self._base_generation)
+            directory = self.directory
+            if directory:
+                for name in os.listdir(directory):
+                    if name.startswith(DELTA_PREFIX):
+                        try:
+                            os.remove(os.path.join(directory, name))
+                        except OSError:
+                            pass
+            self._others = empty_histograms()
+            self._last_sync = time.monotonic()
+            return {name: histogram.total for name, histogram in self._base.items()}
+
+    def unload(self):
+        """Forget all state; the next query loads it again"""
+        with self._lock:
+            self._pid = None
+            self._base = self._others = self._local = None
+            self._base_generation = self._generation = self._delta_path = None
+            self._dirty = 0
+
+    # Updates
+
+    def _tracking(self):
+        """True if changes made now belong in the local delta"""
+        self._check_process()
+        if self._generation is None and self.directory:
+            # No base anywhere yet: whoever builds it reads these games from the database
+            now = time.monotonic()
+            if now - self._last_generation_check >= _setting('PERCENTILE_SYNC_SECONDS', 5):
+                self._last_generation_check = now
+                generation = self._read_generation()
+                if generation is not None:
+                    self._start_local(generation)
+        return self._generation is not None
+
+    def _apply(self, changes):
+        with self._lock:
+            if not self._tracking():
+                return
+            for metric, value, count in changes:
+                self._local[metric].add(value, count)
+            self._dirty += 1
+            due = (
+                self._dirty >= _setting('PERCENTILE_SNAPSHOT_EVERY', 1000)
+                or time.monotonic() - self._last_save >= _setting('PERCENTILE_SYNC_SECONDS', 5)
+            )
+        if due:
+            self.save()
+
+    def add_game(self, session, count=1):
+        """Count a ranked game's speed"""
+        self._apply([
+            ('lines_per_minute', session.lines_per_minute, count),
+            ('pieces_per_second', session.pieces_per_second, count),
+        ])
+
+    def remove_game(self, session):
+        self.add_game(session, count=-1)
+
+    def replace_best(self, previous, score):
+        """Move a player's best score from previous to score (either may be None)"""
+        changes = []
+        if previous is not None:
+            changes.append(('score', previous, -1))
+        if score is not None:
+            changes.append(('score', score, 1))
+        if changes:
+            self._apply(changes)
+
+    # Queries
+
+    def histogram(self, metric):
+        """Merged histogram for a metric, with negative counts from stale deltas clipped"""
+        self.ensure_loaded()
+        with self._lock:
+            counts = self._base[metric].counts + self._others[metric].counts + self._local[metric].counts
+            histogram = self._base[metric].empty()
+        histogram.counts = np.maximum(counts, 0)
+        return histogram
+
+
+score_distributions = ScoreDistributions()
+atexit.register(score_distributions.save)
@@ -0,0 +1,151 @@
+# game/response_cache.py - Versioned cache of rendered JSON responses
+
+"""Cached GET responses keyed by a version counter
+
+Each cached view belongs to a namespace ('leaderboard', or 'user:<id>' for a
+player's own data) whose version token lives in tetris_project/cache_versions.py;
+writers bump it, so every older entry becomes unreachable at once and simply
+expires. Entries hold the rendered JSON bytes, so a hit skips serialization
+and rendering entirely, and carry an ETag / Last-Modified for conditional GETs.
+"""
+
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework.renderers import JSONRenderer
+
+from tetris_project.cache_versions import current_version
+
+
+class CacheStats:
+    """Per-view hit/miss counters for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, name, outcome):
+        with self._lock:
+            counts = self._counts.setdefault(name, {'hits': 0, 'misses': 0, 'not_modified': 0})
+            counts[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for name, counts in self._counts.items():
+                served = counts['hits'] + counts['misses'] + counts['not_modified']
+                result[name] = dict(
+                    counts,
+                    hit_rate=round((counts['hits'] + counts['not_modified']) / served, 4) if served else 0.0,
+                )
+            return result
+
+
+cache_stats = CacheStats()
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def _build_response(request, entry):
+    body, etag, last_modified = entry
+    if _not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _entry_key(name, namespace_name, version, request, key_params):
+    # Only the parsed parameters the view reads: arbitrary query strings must
+    # not each get an entry of their own
+    params = key_params(request) if key_params is not None else ()
+    return f'response-cache:{name}:{namespace_name}:v{version}:{request.path}:{params!r}'
+
+
+def _new_entry(response):
+    # DRF responses are still unrendered here; plain Django ones carry bytes
+    body = JSONRenderer().render(response.data) if hasattr(response, 'data') else response.content
+    return body, quote_etag(hashlib.md5(body).hexdigest()), time.time()
+
+
+def _hit(name, request, entry):
+    response = _build_response(request, entry)
+    cache_stats.record(name, 'not_modified' if response.status_code == 304 else 'hits')
+    return response
+
+
+def cached_response(name, namespace, key_params=None):
+    """Cache a GET view's 200 responses under namespace(request)
+
+    namespace is a callable returning the namespace name for the request.
+    key_params, if the view reads query parameters, returns them parsed and
+    clamped the way the view does; any other parameter is ignored.
+    Apply below @api_view so authentication and permissions still run.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            namespace_name = namespace(request)
+            version = current_version(namespace_name)
+            key = _entry_key(name, namespace_name, version, request, key_params)
+
+            entry = cache.get(key)
+            if entry is not None:
+                return _hit(name, request, entry)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = _new_entry(response)
+            cache.set(key, entry, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+            cache_stats.record(name, 'misses')
+            return _build_response(request, entry)
+        return wrapper
+    return decorator
+
+
+def acached_response(name, namespace, key_params=None):
+    """cached_response for native async views; shares entries with the sync views"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await view(request, *args, **kwargs)
+
+            # The file cache does no network I/O, and its a*() methods are
+            # thread hops around the same calls, so call them directly
+            namespace_name = namespace(request)
+            version = current_version(namespace_name)
+            key = _entry_key(name, namespace_name, version, request, key_params)
+
+            entry = cache.get(key)
+            if entry is not None:
+                return _hit(name, request, entry)
+
+            response = await view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = _new_entry(response)
+            cache.set(key, entry, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+            cache_stats.record(name, 'misses')
+            return _build_response(request, entry)
+        return wrapper
+    return decorator
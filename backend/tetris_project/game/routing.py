@@ -0,0 +1,26 @@
+# game/routing.py - WebSocket routes, served under ASGI only (see tetris_project/asgi.py)
+
+import re
+
+from . import spectate, versus
+
+ROUTES = (
+    (re.compile(r'^/ws/games/play/$'), spectate.play),
+    (re.compile(r'^/ws/games/(?P<player_id>\d+)/watch/$'), spectate.watch),
+    (re.compile(r'^/ws/versus/$'), versus.play),
+)
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI entry point for websocket connections"""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    for pattern, handler in ROUTES:
+        match = pattern.match(scope['path'])
+        if match:
+            kwargs = {name: int(value) for name, value in match.groupdict().items()}
+            await handler(scope, receive, send, **kwargs)
+            return
+    await send({'type': 'websocket.close', 'code': spectate.CLOSE_NOT_FOUND})
@@ -1,8 +1,17 @@
+import base64
+import binascii
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
-    Score, GameSession, Achievement, UserAchievement, UserStats
+    Score, GameSession, Achievement, UserAchievement, UserStats, PlayerBest, GameReplay
 )
+from .engine.replay import ReplayError, summarize
 from users.serializers import UserProfileSerializer
+from users.progression import exp_to_next_level
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -39,17 +48,123 @@ class GameSessionSerializer(serializers.ModelSerializer):
             'tetrises_cleared', 't_spins', 'max_combo', 'started_at', 'ended_at',
             'duration_seconds', 'duration_formatted', 'lines_per_minute',
             'pieces_per_second', 'end_reason', 'end_reason_display', 'game_data',
-            'created_at', 'updated_at'
+            'verification_status', 'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'user', 'started_at', 'ended_at', 'duration_formatted',
-            'lines_per_minute', 'pieces_per_second', 'created_at', 'updated_at'
+            'lines_per_minute', 'pieces_per_second', 'verification_status',
+            'created_at', 'updated_at'
         ]
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+# Base64-encoded replay upload, validated by decoding the whole event stream
+class ReplayField(serializers.Field):
+    default_error_messages = {
+        'invalid': 'Replay must be base64-encoded replay data.',
+        'too_large': 'Replay is larger than {max_bytes} bytes.',
+        'corrupt': 'Invalid replay: {error}',
+    }
+
+    def to_internal_value(self, value):
+        try:
+            data = base64.b64decode(value, validate=True)
+        except (TypeError, ValueError, binascii.Error):
+            self.fail('invalid')
+
+        max_bytes = getattr(settings, 'REPLAY_MAX_BYTES', 64 * 1024)
+        if len(data) > max_bytes:
+            self.fail('too_large', max_bytes=max_bytes)
+        try:
+            seed, events, frames = summarize(data)
+        except ReplayError as exc:
+            self.fail('corrupt', error=exc)
+        return {'data': data, 'seed': seed, 'event_count': events, 'frame_count': frames}
+
+    def to_representation(self, value):
+        return base64.b64encode(bytes(value.data)).decode('ascii')
+
+# GameSession submission with an optional replay and, for games played offline, their end time
+class SubmitScoreSerializer(GameSessionSerializer):
+    replay = ReplayField(write_only=True, required=False)
+    ended_at = serializers.DateTimeField(required=False)
+
+    class Meta(GameSessionSerializer.Meta):
+        fields = GameSessionSerializer.Meta.fields + ['replay']
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if 'ended_at' in attrs:
+            duration = timedelta(seconds=max(attrs.get('duration_seconds') or 0, 0))
+            now = timezone.now()
+            # Neither in the future (a clock running ahead) nor further back than
+            # the game and some clock skew, so a backdated game cannot win ties
+            earliest = now - duration - timedelta(seconds=settings.SCORE_CLOCK_SKEW_SECONDS)
+            attrs['ended_at'] = min(max(attrs['ended_at'], earliest), now)
+            attrs['started_at'] = attrs['ended_at'] - duration
+        return attrs
+
+    def create(self, validated_data):
+        return self.create_many(self.context['request'].user, [validated_data])[0]
+
+    @staticmethod
+    def create_many(user, items):
+        """Insert validated submissions with two bulk INSERTs (no post_save signals)
+
+        Games that carry ended_at are dated by it rather than by the time of
+        the upload. Both submit endpoints insert through here, then apply
+        stats, EXP and achievements once for all the games.
+        """
+        sessions = []
+        replays = []
+        for validated_data in items:
+            data = dict(validated_data)
+            replay = data.pop('replay', None)
+            session = GameSession(user=user, **data)
+            if replay is not None:
+                # Ranked once verify_replays has re-simulated it; otherwise it stays unverified and unranked
+                session.verification_status = 'pending'
+            session.set_duration()
+            sessions.append(session)
+            replays.append(replay)
+
+        with transaction.atomic():
+            GameSession.objects.bulk_create(sessions)
+            if not connection.features.can_return_rows_from_bulk_insert:
+                assign_inserted_ids(sessions)
+            # auto_now_add overwrote created_at on the way in
+            dated = [session for session in sessions if session.ended_at is not None]
+            for session in dated:
+                session.created_at = session.ended_at
+            GameSession.objects.bulk_update(dated, ['created_at'])
+            GameReplay.objects.bulk_create([
+                GameReplay(session=session, **replay)
+                for session, replay in zip(sessions, replays)
+                if replay is not None
+            ])
+        return sessions
+
+
+def assign_inserted_ids(sessions):
+    """Set the ids of sessions just inserted by one bulk_create on MySQL, which does not return them
+
+    InnoDB gives the rows of one multi-row INSERT consecutive auto-increment
+    values (steps of auto_increment_increment) starting at LAST_INSERT_ID(),
+    unless an INSERT ... SELECT into the same table runs concurrently with
+    innodb_autoinc_lock_mode=2; nothing here issues one.
+    """
+    if connection.vendor != 'mysql':
+        raise NotImplementedError(f'bulk inserts on {connection.vendor} do not return ids')
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT LAST_INSERT_ID(), @@auto_increment_increment')
+        first_id, step = cursor.fetchone()
+    for offset, session in enumerate(sessions):
+        session.pk = first_id + offset * step
+        session._state.adding = False
+
+
 # Achievement definition serializer
 class AchievementSerializer(serializers.ModelSerializer):
     class Meta:
@@ -92,10 +207,10 @@ class UserStatsSerializer(serializers.ModelSerializer):
         ]
 
     def get_exp_needed_for_next_level(self, obj):
-        return obj.player_level * 1000
+        return exp_to_next_level(obj.player_level)
 
     def get_progress_percent(self, obj):
-        needed = obj.player_level * 1000
+        needed = exp_to_next_level(obj.player_level)
         return round((obj.exp / needed) * 100, 2)
 
 # GameSession-based leaderboard serializer
@@ -109,3 +224,20 @@ class LeaderboardSerializer(serializers.ModelSerializer):
             'duration_seconds', 'created_at'
         ]
         read_only_fields = fields
+
+# PlayerBest-based leaderboard serializer (same shape as LeaderboardSerializer)
+class PlayerBestSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='session_id', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
+    final_level = serializers.IntegerField(source='session.final_level', read_only=True)
+    lines_cleared = serializers.IntegerField(source='session.lines_cleared', read_only=True)
+    duration_seconds = serializers.IntegerField(source='session.duration_seconds', read_only=True)
+    created_at = serializers.DateTimeField(source='achieved_at', read_only=True)
+
+    class Meta:
+        model = PlayerBest
+        fields = [
+            'id', 'username', 'score', 'final_level', 'lines_cleared',
+            'duration_seconds', 'created_at'
+        ]
+        read_only_fields = fields
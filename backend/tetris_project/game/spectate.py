@@ -0,0 +1,322 @@
+# game/spectate.py - Live spectating of in-progress games over WebSockets
+
+"""Live games
+
+A player's client connects to /ws/games/play/?token=<access token> and
+publishes its state; anyone can watch at /ws/games/<player id>/watch/.
+Each player has one room here, shared by every game they play while
+connected.
+
+Publisher and spectator frames use the same JSON shape, with every key
+optional:
+
+    {"g": 3,                      new game number: reset to an empty board first
+     "r": [[19, 1023], [18, 7]],  changed rows as [row, bitmask]; row 0 is the
+                                  top, bit c is column c (as in game/engine)
+     "p": [2, 1, 4, 7],           active piece [type index, rotation, x, y] or null
+     "n": 5,                      next piece type index
+     "s": 1200, "l": 4,           score and lines
+     "a": 0}                      0 once the player has disconnected
+
+A frame only carries what changed since the frame before it. Each viewer
+gets a frame computed against what that viewer last received, at most
+SPECTATE_MAX_FPS times a second, so a slow viewer skips intermediate states
+instead of queueing them. Frames are encoded once per distinct base, so
+viewers that keep up share the same encoded text.
+
+Rooms live in the ASGI process that accepted the publisher; run a single
+ASGI worker, or route a player's sockets to one worker, to spectate across
+connections.
+"""
+
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+
+from users.authentication import AsyncJWTAuthentication
+from .engine import BOARD_HEIGHT, BOARD_WIDTH, FULL_ROW, PIECE_TYPES
+
+EMPTY_ROWS = (0,) * BOARD_HEIGHT
+# (piece, next piece, score, lines, active)
+EMPTY_META = (None, None, 0, 0, 1)
+META_KEYS = ('p', 'n', 's', 'l', 'a')
+
+# WebSocket close codes (4000-4999 are free for applications)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_INVALID = 4400
+CLOSE_REPLACED = 4409
+
+class FrameError(ValueError):
+    """Raised for a publisher frame that does not describe a valid state"""
+
+
+def diff_state(base_game, base_rows, base_meta, game, rows, meta):
+    """Frame dict for the change from one state to another (empty if none)"""
+    frame = {}
+    if game != base_game:
+        frame['g'] = game
+        base_rows = EMPTY_ROWS
+        base_meta = EMPTY_META
+    changed = [[index, row] for index, (old, row) in enumerate(zip(base_rows, rows)) if old != row]
+    if changed:
+        frame['r'] = changed
+    for key, old, value in zip(META_KEYS, base_meta, meta):
+        if old != value:
+            frame[key] = list(value) if key == 'p' and value is not None else value
+    return frame
+
+
+def encode_frame(*states):
+    """Encode diff_state() as JSON text; None if nothing changed"""
+    frame = diff_state(*states)
+    if not frame:
+        return None
+    return json.dumps(frame, separators=(',', ':'))
+
+
+def engine_state(game, active=1):
+    """(rows, meta) of a game/engine Game, as published by the client"""
+    piece = None if game.game_over else (game.piece, game.rotation, game.x, game.y)
+    return tuple(game.rows), (piece, game.next_piece, game.score, game.lines, active)
+
+
+def _int(value, low, high):
+    if type(value) is not int or not low <= value <= high:
+        raise FrameError(f'Expected an integer in [{low}, {high}]')
+    return value
+
+
+def parse_piece(value):
+    if value is None:
+        return None
+    if not isinstance(value, list) or len(value) != 4:
+        raise FrameError('Piece must be [type, rotation, x, y]')
+    piece, rotation, x, y = value
+    return (
+        _int(piece, 0, len(PIECE_TYPES) - 1),
+        _int(rotation, 0, 3),
+        _int(x, -3, BOARD_WIDTH),
+        _int(y, -4, BOARD_HEIGHT),
+    )
+
+
+class LiveGame:
+    """One player's room: the latest published state and its spectators"""
+
+    def __init__(self, player_id):
+        self.player_id = player_id
+        self.game = 0
+        self.rows = EMPTY_ROWS
+        self.meta = EMPTY_META
+        self.publisher = None
+        self.spectators = set()
+        # Encoded frames for the current state, keyed by the viewer's base state
+        self._frames = {}
+
+    def apply(self, frame):
+        """Apply a publisher frame (parsed JSON) and wake the spectators"""
+        if not isinstance(frame, dict):
+            raise FrameError('Frame must be an object')
+
+        game = self.game
+        rows = self.rows
+        meta = self.meta
+        if 'g' in frame:
+            game = _int(frame['g'], 0, 2 ** 31)
+            if game != self.game:
+                rows = EMPTY_ROWS
+                meta = EMPTY_META
+
+        changes = frame.get('r', [])
+        if not isinstance(changes, list) or len(changes) > BOARD_HEIGHT:
+            raise FrameError(f'Expected at most {BOARD_HEIGHT} row changes')
+        if changes:
+            rows = list(rows)
+            for change in changes:
+                if not isinstance(change, list) or len(change) != 2:
+                    raise FrameError('Row change must be [row, bitmask]')
+                rows[_int(change[0], 0, BOARD_HEIGHT - 1)] = _int(change[1], 0, FULL_ROW)
+            rows = tuple(rows)
+
+        piece, next_piece, score, lines, active = meta
+        if 'p' in frame:
+            piece = parse_piece(frame['p'])
+        if 'n' in frame:
+            next_piece = None if frame['n'] is None else _int(frame['n'], 0, len(PIECE_TYPES) - 1)
+        if 's' in frame:
+            score = _int(frame['s'], 0, 2 ** 53)
+        if 'l' in frame:
+            lines = _int(frame['l'], 0, 2 ** 31)
+        self._update(game, rows, (piece, next_piece, score, lines, active))
+
+    def set_active(self, active):
+        piece, next_piece, score, lines, _ = self.meta
+        self._update(self.game, self.rows, (piece, next_piece, score, lines, int(active)))
+
+    def _update(self, game, rows, meta):
+        if (game, rows, meta) == (self.game, self.rows, self.meta):
+            return
+        self.game = game
+        self.rows = rows
+        self.meta = meta
+        self._frames.clear()
+        for spectator in self.spectators:
+            spectator.changed.set()
+
+    def frame_for(self, spectator):
+        """Encoded frame taking a spectator from what it last received to now"""
+        key = (spectator.game, spectator.rows, spectator.meta)
+        try:
+            return self._frames[key]
+        except KeyError:
+            text = encode_frame(*key, self.game, self.rows, self.meta)
+            self._frames[key] = text
+            return text
+
+
+class Spectator:
+    """One viewer: tracks the state it was last sent so frames can be diffs"""
+    __slots__ = ('room', 'send', 'changed', 'game', 'rows', 'meta')
+
+    def __init__(self, room, send):
+        self.room = room
+        self.send = send
+        self.changed = asyncio.Event()
+        self.game = None
+        self.rows = EMPTY_ROWS
+        self.meta = EMPTY_META
+
+    async def run(self, interval):
+        """Send the latest state whenever it changes, at most once per interval"""
+        loop = asyncio.get_running_loop()
+        self.changed.set()
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            room = self.room
+            text = room.frame_for(self)
+            if text is None:
+                continue
+            # Remember the state before awaiting; later changes set the event again
+            self.game, self.rows, self.meta = room.game, room.rows, room.meta
+            sent_at = loop.time()
+            await self.send({'type': 'websocket.send', 'text': text})
+            if interval:
+                await asyncio.sleep(max(0.0, sent_at + interval - loop.time()))
+
+
+class LiveGames:
+    """Rooms in this process, keyed by player id"""
+
+    def __init__(self):
+        self._rooms = {}
+
+    def __len__(self):
+        return len(self._rooms)
+
+    def get(self, player_id):
+        return self._rooms.get(player_id)
+
+    def open(self, player_id):
+        room = self._rooms.get(player_id)
+        if room is None:
+            room = self._rooms[player_id] = LiveGame(player_id)
+        return room
+
+    def release(self, room):
+        """Forget a room nobody is publishing to or watching"""
+        if room.publisher is None and not room.spectators and self._rooms.get(room.player_id) is room:
+            del self._rooms[room.player_id]
+
+
+live_games = LiveGames()
+
+
+def max_message_bytes():
+    return getattr(settings, 'SPECTATE_MAX_MESSAGE_BYTES', 2048)
+
+
+def frame_interval():
+    fps = getattr(settings, 'SPECTATE_MAX_FPS', 20)
+    return 1.0 / fps if fps else 0.0
+
+
+async def close(send, code):
+    await send({'type': 'websocket.close', 'code': code})
+
+
+async def authenticate(scope):
+    """User for the ?token= access token, or None (browsers cannot set WebSocket headers)"""
+    token = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+    if not token:
+        return None
+    authenticator = AsyncJWTAuthentication()
+    try:
+        return await authenticator.aget_user(authenticator.get_validated_token(token[0].encode()))
+    except AuthenticationFailed:
+        return None
+
+
+async def play(scope, receive, send):
+    user = await authenticate(scope)
+    if user is None:
+        await close(send, CLOSE_UNAUTHORIZED)
+        return
+
+    room = live_games.open(user.pk)
+    if room.publisher is not None:
+        # A newer tab takes over; the old publisher is told why it was closed
+        await close(room.publisher, CLOSE_REPLACED)
+    room.publisher = send
+    await send({'type': 'websocket.accept'})
+    room.set_active(True)
+
+    limit = max_message_bytes()
+    try:
+        while True:
+            message = await receive()
+            if message['type'] != 'websocket.receive':
+                break
+            text = message.get('text')
+            if text is None or len(text) > limit:
+                await close(send, CLOSE_INVALID)
+                break
+            try:
+                room.apply(json.loads(text))
+            except (ValueError, FrameError):
+                await close(send, CLOSE_INVALID)
+                break
+    finally:
+        if room.publisher is send:
+            room.publisher = None
+            room.set_active(False)
+        live_games.release(room)
+
+
+async def watch(scope, receive, send, player_id):
+    room = live_games.get(player_id)
+    if room is None:
+        await close(send, CLOSE_NOT_FOUND)
+        return
+
+    await send({'type': 'websocket.accept'})
+    spectator = Spectator(room, send)
+    room.spectators.add(spectator)
+    writer = asyncio.ensure_future(spectator.run(frame_interval()))
+    try:
+        # Spectators only listen; any message or a disconnect ends the stream
+        receiver = asyncio.ensure_future(receive())
+        await asyncio.wait({writer, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        receiver.cancel()
+        if writer.done() and not writer.cancelled():
+            writer.result()
+    except OSError:
+        pass
+    finally:
+        writer.cancel()
+        room.spectators.discard(spectator)
+        live_games.release(room)
@@ -1,3 +1,878 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.progression import exp_for_score, level_for_total
+from users.user_cache import user_cache
+
+from .engine import (
+    BOARD_HEIGHT, BOARD_WIDTH, FULL_ROW, PIECE_TYPES, ROTATIONS, TETROMINOS, Game, PieceSequence,
+    calculate_drop_time, calculate_score,
+)
+from .archive import session_archive
+from .broadcast import LeaderboardBroadcaster
+from .management.commands.bench_percentiles import check_metric, synthetic_values
+from .management.commands.verify_replays import apply_results, load_batch
+from .leaderboard import ranked_leaderboard
+from .models import (
+    Achievement, DailyUserStats, GameReplay, GameSession, PlayerBest, UserAchievement, UserStats,
+)
+from .pagination import KeysetPagination
+from .percentiles import empty_histograms, pack_histograms, score_distributions, unpack_histograms
+
+User = get_user_model()
+
+# Runtime files off and a cache private to the test run
+TEST_SETTINGS = {
+    'LEADERBOARD_SNAPSHOT_PATH': None,
+    'PERCENTILE_DIR': None,
+    'ARCHIVE_DIR': None,
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+}
+
+
+# A literal port of services/gameLogic.js and the dropPiece / hardDrop steps of
+# hooks/useGame.js: boards are lists of rows of 0 / colour, pieces are dicts.
+# The engine must behave exactly like this on every input.
+
+def js_create_board():
+    return [[0] * BOARD_WIDTH for _ in range(BOARD_HEIGHT)]
+
+
+def js_spawn(piece_type):
+    shape = [list(row) for row in TETROMINOS[piece_type]['shape']]
+    return {
+        'type': piece_type,
+        'shape': shape,
+        'color': TETROMINOS[piece_type]['color'],
+        'x': BOARD_WIDTH // 2 - len(shape[0]) // 2,
+        'y': 0,
+    }
+
+
+def js_is_valid_position(board, piece, dx=0, dy=0):
+    for y, row in enumerate(piece['shape']):
+        for x, cell in enumerate(row):
+            if cell:
+                new_x = piece['x'] + x + dx
+                new_y = piece['y'] + y + dy
+                if new_x < 0 or new_x >= BOARD_WIDTH or new_y >= BOARD_HEIGHT:
+                    return False
+                if new_y >= 0 and board[new_y][new_x]:
+                    return False
+    return True
+
+
+def js_rotate_piece(piece):
+    shape = piece['shape']
+    rotated = [[row[i] for row in shape][::-1] for i in range(len(shape[0]))]
+    return dict(piece, shape=rotated)
+
+
+def js_place_piece(board, piece):
+    new_board = [list(row) for row in board]
+    for y, row in enumerate(piece['shape']):
+        for x, cell in enumerate(row):
+            if cell and piece['y'] + y >= 0:
+                new_board[piece['y'] + y][piece['x'] + x] = piece['color']
+    return new_board
+
+
+def js_clear_lines(board):
+    new_board = [row for row in board if any(cell == 0 for cell in row)]
+    lines_cleared = BOARD_HEIGHT - len(new_board)
+    while len(new_board) < BOARD_HEIGHT:
+        new_board.insert(0, [0] * BOARD_WIDTH)
+    return new_board, lines_cleared
+
+
+def js_calculate_score(lines_cleared, blocks_placed=0):
+    return {0: 0, 1: 100, 2: 300, 3: 500, 4: 800}[lines_cleared] + blocks_placed * 25
+
+
+JS_DROP_TABLE = {
+    0: 800, 1: 716, 2: 633, 3: 550, 4: 466, 5: 383, 6: 300, 7: 216, 8: 133,
+    9: 100, 10: 83, 13: 50, 16: 33, 19: 16, 29: 1,
+}
+
+
+def js_calculate_drop_time(lines_cleared_total):
+    level = lines_cleared_total // 10
+    levels = sorted(JS_DROP_TABLE)
+    time = JS_DROP_TABLE[levels[0]]
+    for lv in levels:
+        if level >= lv:
+            time = JS_DROP_TABLE[lv]
+        else:
+            break
+    return time
+
+
+class JsGame:
+    """useGame.js state driven the same way as engine.Game"""
+
+    def __init__(self, seed):
+        self.sequence = PieceSequence(seed)
+        self.board = js_create_board()
+        self.score = 0
+        self.lines = 0
+        self.game_over = False
+        self.piece = js_spawn(PIECE_TYPES[self.sequence.next()])
+        self.next_piece = js_spawn(PIECE_TYPES[self.sequence.next()])
+
+    def move(self, dx, dy=0):
+        if self.game_over or not js_is_valid_position(self.board, self.piece, dx, dy):
+            return False
+        self.piece = dict(self.piece, x=self.piece['x'] + dx, y=self.piece['y'] + dy)
+        return True
+
+    def rotate(self):
+        rotated = js_rotate_piece(self.piece)
+        if self.game_over or not js_is_valid_position(self.board, rotated):
+            return False
+        self.piece = rotated
+        return True
+
+    def drop_piece(self):
+        if self.game_over or self.move(0, 1):
+            return
+        if self.piece['y'] <= 0:
+            self.game_over = True
+            return
+        board, lines_cleared = js_clear_lines(js_place_piece(self.board, self.piece))
+        blocks_placed = sum(1 for row in self.piece['shape'] for cell in row if cell)
+        self.board = board
+        self.lines += lines_cleared
+        self.score += js_calculate_score(lines_cleared, blocks_placed)
+        self.piece = self.next_piece
+        self.next_piece = js_spawn(PIECE_TYPES[self.sequence.next()])
+
+    def hard_drop(self):
+        if self.game_over:
+            return
+        new_y = self.piece['y']
+        while js_is_valid_position(self.board, self.piece, 0, new_y - self.piece['y'] + 1):
+            new_y += 1
+        self.piece = dict(self.piece, y=new_y)
+        self.drop_piece()
+
+    def matrix(self):
+        return [[1 if cell else 0 for cell in row] for row in self.board]
+
+
+def random_rows(rng, fill=0.45, top_empty=4):
+    """Random board rows (bitmasks) with the top rows left empty and no full row"""
+    rows = [0] * top_empty
+    for _ in range(BOARD_HEIGHT - top_empty):
+        row = sum(1 << c for c in range(BOARD_WIDTH) if rng.random() < fill)
+        rows.append(row & ~(1 << rng.randrange(BOARD_WIDTH)))
+    return rows
+
+
+def full_row_but(column):
+    return FULL_ROW & ~(1 << column)
+
+
+class FixedPieces:
+    """A PieceSequence stand-in returning the given piece indexes, then the last one forever"""
+
+    def __init__(self, indexes):
+        self.indexes = list(indexes)
+
+    def next(self):
+        return self.indexes.pop(0) if len(self.indexes) > 1 else self.indexes[0]
+
+
+def rows_to_board(rows):
+    return [['#fff' if (row >> c) & 1 else 0 for c in range(BOARD_WIDTH)] for row in rows]
+
+
+class EngineConformanceTests(SimpleTestCase):
+    """game/engine against the rules in services/gameLogic.js and hooks/useGame.js"""
+
+    def assertSameState(self, game, js, context):
+        self.assertEqual(game.to_matrix(), js.matrix(), context)
+        self.assertEqual(game.game_over, js.game_over, context)
+        self.assertEqual((game.score, game.lines), (js.score, js.lines), context)
+        if not game.game_over:
+            rotation = ROTATIONS[game.piece][game.rotation]
+            self.assertEqual(game.piece_type, js.piece['type'], context)
+            self.assertEqual([list(row) for row in rotation.shape], js.piece['shape'], context)
+            self.assertEqual((game.x, game.y), (js.piece['x'], js.piece['y']), context)
+
+    def test_rotations_match_rotate_piece(self):
+        for index, piece_type in enumerate(PIECE_TYPES):
+            piece = js_spawn(piece_type)
+            for rotation in ROTATIONS[index]:
+                self.assertEqual([list(row) for row in rotation.shape], piece['shape'], piece_type)
+                self.assertEqual(rotation.cells, sum(map(sum, piece['shape'])))
+                piece = js_rotate_piece(piece)
+            # Four turns come back to the spawn shape
+            self.assertEqual(piece['shape'], js_spawn(piece_type)['shape'])
+
+    def test_spawn_matches_get_random_tetromino(self):
+        for index, piece_type in enumerate(PIECE_TYPES):
+            game = Game(pieces=FixedPieces([index, 0]))
+            js_piece = js_spawn(piece_type)
+            self.assertEqual((game.x, game.y, game.rotation), (js_piece['x'], js_piece['y'], 0))
+
+    def test_fits_matches_is_valid_position(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            rows = random_rows(rng, fill=rng.choice((0.2, 0.5, 0.8)))
+            board = rows_to_board(rows)
+            for index, piece_type in enumerate(PIECE_TYPES):
+                game = Game(pieces=FixedPieces([index, 0]))
+                game.rows = list(rows)
+                piece = js_spawn(piece_type)
+                for rotation in range(4):
+                    for x in range(-2, BOARD_WIDTH + 1):
+                        for y in range(-3, BOARD_HEIGHT + 1):
+                            expected = js_is_valid_position(board, dict(piece, x=x, y=y))
+                            self.assertEqual(
+                                game.fits(rotation, x, y), expected, (piece_type, rotation, x, y),
+                            )
+                    piece = js_rotate_piece(piece)
+
+    def test_lock_clears_lines_like_clear_lines(self):
+        rng = random.Random(11)
+        for _ in range(500):
+            # Nearly full bottom rows, so an I piece often completes some of them
+            rows = [0] * 12 + [
+                full_row_but(rng.randrange(BOARD_WIDTH)) if rng.random() < 0.6 else random_rows(rng, 0.5, 0)[0]
+                for _ in range(8)
+            ]
+            game = Game(pieces=FixedPieces([PIECE_TYPES.index('I'), 0]))
+            game.rows = list(rows)
+            js = JsGame(0)
+            js.board = rows_to_board(rows)
+            js.piece = js_spawn('I')
+            js.next_piece = js_spawn(PIECE_TYPES[0])
+            if rng.random() < 0.5:
+                self.assertEqual(game.rotate(), js.rotate())
+            dx = rng.randrange(-5, 6)
+            step = 1 if dx > 0 else -1
+            for _ in range(abs(dx)):
+                game.move(step)
+                js.move(step)
+            game.hard_drop()
+            js.hard_drop()
+            self.assertEqual(game.to_matrix(), js.matrix())
+            self.assertEqual((game.score, game.lines, game.game_over), (js.score, js.lines, js.game_over))
+
+    def test_random_games_match_use_game(self):
+        rng = random.Random(3)
+        for number in range(300):
+            seed = rng.getrandbits(32)
+            game = Game(seed=seed)
+            js = JsGame(seed)
+            for move in range(3000):
+                if game.game_over:
+                    break
+                action = rng.choices(
+                    ('left', 'right', 'rotate', 'soft', 'gravity', 'hard'), (4, 4, 3, 3, 4, 1),
+                )[0]
+                if action == 'left':
+                    self.assertEqual(game.move(-1), js.move(-1))
+                elif action == 'right':
+                    self.assertEqual(game.move(1), js.move(1))
+                elif action == 'rotate':
+                    self.assertEqual(game.rotate(), js.rotate())
+                elif action in ('soft', 'gravity'):
+                    game.step()
+                    js.drop_piece()
+                else:
+                    game.hard_drop()
+                    js.hard_drop()
+                self.assertSameState(game, js, (number, move, action))
+            self.assertTrue(game.game_over, f'game {number} did not finish')
+
+    def test_game_over_when_piece_cannot_fall_from_the_top(self):
+        for seed in range(1, 8):
+            game = Game(seed=seed)
+            js = JsGame(seed)
+            # Only the top row is free and no row can clear, so the spawned piece locks at y=0
+            rows = [0] + [full_row_but(0)] * (BOARD_HEIGHT - 1)
+            game.rows = list(rows)
+            js.board = rows_to_board(rows)
+            game.step()
+            js.drop_piece()
+            self.assertTrue(game.game_over, seed)
+            self.assertSameState(game, js, seed)
+
+    def test_score_and_drop_time_match(self):
+        for lines in range(5):
+            for blocks in range(5):
+                self.assertEqual(calculate_score(lines, blocks), js_calculate_score(lines, blocks))
+        for total in range(400):
+            self.assertEqual(calculate_drop_time(total), js_calculate_drop_time(total), total)
+
+    def test_piece_sequence_is_reproducible(self):
+        first = PieceSequence(1234)
+        second = PieceSequence(1234)
+        pieces = [first.next() for _ in range(1000)]
+        self.assertEqual(pieces, [second.next() for _ in range(1000)])
+        self.assertEqual(set(pieces), set(range(len(PIECE_TYPES))))
+
+
+def cursor_request(payload):
+    token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    return Request(APIRequestFactory().get('/', {'cursor': token}))
+
+
+class KeysetCursorTests(SimpleTestCase):
+    """Tampered cursors are a 404, never a database error"""
+
+    def decode(self, field, payload):
+        return KeysetPagination(field).decode_cursor(cursor_request(payload), GameSession)
+
+    def test_round_trip(self):
+        created_at = datetime(2026, 10, 1, 12, 30, tzinfo=timezone.utc)
+        for field, position in (('score', (1500, 42)), ('created_at', (created_at, 42))):
+            paginator = KeysetPagination(field)
+            token = paginator.encode_cursor(position)
+            request = Request(APIRequestFactory().get('/', {'cursor': token}))
+            self.assertEqual(paginator.decode_cursor(request, GameSession), position)
+
+    def test_rejects_mismatched_types(self):
+        bad = [
+            ('score', ['2026-10-01T12:30:00+00:00', 1]),
+            ('score', [1.5, 1]),
+            ('score', [True, 1]),
+            ('score', [2 ** 70, 1]),
+            ('score', [100, '1']),
+            ('score', [100, None]),
+            ('score', {'a': 1, 'b': 2}),
+            ('created_at', [100, 1]),
+            ('created_at', ['2026-10-01T12:30:00', 1]),
+            ('created_at', ['not a date', 1]),
+            ('created_at', ['2026-10-01T12:30:00+00:00', False]),
+            ('created_at', [['2026-10-01T12:30:00+00:00'], 1]),
+        ]
+        for field, payload in bad:
+            with self.assertRaises(NotFound, msg=(field, payload)):
+                self.decode(field, payload)
+
+
+@override_settings(**TEST_SETTINGS)
+class ConcurrentSubmitTests(TransactionTestCase):
+    """Simultaneous submit_score calls from one account lose no counter or EXP update"""
+
+    THREADS = 8
+    GAMES_PER_THREAD = 5
+
+    def tearDown(self):
+        ranked_leaderboard.unload()
+        score_distributions.unload()
+        user_cache.clear()
+
+    def test_no_lost_updates(self):
+        player = User.objects.create_user(
+            username='racer', email='racer@example.com', password='racer-password', player_name='Racer',
+        )
+        token = str(RefreshToken.for_user(player).access_token)
+        scores = [
+            [10000 * thread + 1370 * game + 55 for game in range(self.GAMES_PER_THREAD)]
+            for thread in range(self.THREADS)
+        ]
+        barrier = threading.Barrier(self.THREADS)
+        failures = []
+
+        def submit(thread_scores):
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+            try:
+                barrier.wait()
+                for score in thread_scores:
+                    response = client.post(
+                        reverse('submit_score'),
+                        {'score': score, 'lines_cleared': score // 1000, 'duration_seconds': 60},
+                        content_type='application/json',
+                    )
+                    if response.status_code != 201:
+                        failures.append((score, response.status_code, response.content))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=submit, args=(thread_scores,)) for thread_scores in scores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+
+        every_score = [score for thread_scores in scores for score in thread_scores]
+        player.refresh_from_db()
+        self.assertEqual(player.games_played, len(every_score))
+        self.assertEqual(player.total_score, sum(every_score))
+        self.assertEqual(player.highest_score, max(every_score))
+        self.assertEqual(
+            (player.player_level, player.exp),
+            level_for_total(sum(exp_for_score(score) for score in every_score)),
+        )
+        stats = UserStats.objects.get(user=player)
+        self.assertEqual((stats.total_games, stats.total_score), (len(every_score), sum(every_score)))
+        self.assertEqual(GameSession.objects.filter(user=player).count(), len(every_score))
+
+
+@override_settings(**TEST_SETTINGS)
+class UserStatsTests(TestCase):
+    """Stored averages follow the totals submit after submit"""
+
+    def tearDown(self):
+        ranked_leaderboard.unload()
+        score_distributions.unload()
+        user_cache.clear()
+
+    def test_averages_after_two_submits(self):
+        player = User.objects.create_user(
+            username='averager', email='averager@example.com', password='averager-password', player_name='Averager',
+        )
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(player).access_token}')
+        for score, lines in ((3000, 12), (9000, 40)):
+            response = client.post(
+                reverse('submit_score'),
+                {'score': score, 'lines_cleared': lines, 'duration_seconds': 90},
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 201)
+        stats = UserStats.objects.get(user=player)
+        self.assertEqual((stats.total_games, stats.total_score, stats.total_lines_cleared), (2, 12000, 52))
+        self.assertEqual((stats.average_score, stats.average_lines_per_game), (6000.0, 26.0))
+
+    def test_averages_assigned_before_the_totals_they_read(self):
+        # MySQL evaluates SET left to right: the averages must still see the old totals
+        player = User.objects.create_user(
+            username='ordered', email='ordered@example.com', password='ordered-password', player_name='Ordered',
+        )
+        UserStats.objects.create(user=player)
+        session = GameSession(user=player, score=500, lines_cleared=3, created_at=datetime.now(timezone.utc))
+        with CaptureQueriesContext(connection) as captured:
+            UserStats.apply_sessions(player.pk, [session])
+        sql = captured.captured_queries[0]['sql']
+        assigned = {
+            column: sql.index(f'{connection.ops.quote_name(column)} =')
+            for column in ('average_score', 'average_lines_per_game', 'total_games', 'total_score',
+                           'total_lines_cleared')
+        }
+        self.assertLess(max(assigned['average_score'], assigned['average_lines_per_game']),
+                        min(assigned['total_games'], assigned['total_score'], assigned['total_lines_cleared']))
+
+
+@override_settings(SCORE_CLOCK_SKEW_SECONDS=300, **TEST_SETTINGS)
+class SubmitEndedAtTests(TestCase):
+    """Both submit endpoints date games by ended_at, within the game's duration plus skew of now"""
+
+    def setUp(self):
+        self.player = User.objects.create_user(
+            username='offline', email='offline@example.com', password='offline-password', player_name='Offline',
+        )
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.player).access_token}')
+
+    def tearDown(self):
+        ranked_leaderboard.unload()
+        score_distributions.unload()
+        user_cache.clear()
+
+    def submit(self, ended_at):
+        payload = {'score': 2000, 'lines_cleared': 5, 'duration_seconds': 120, 'ended_at': ended_at.isoformat()}
+        single = self.client.post(reverse('submit_score'), payload, content_type='application/json')
+        batch = self.client.post(
+            reverse('submit_scores_batch'), {'sessions': [payload]}, content_type='application/json',
+        )
+        self.assertEqual((single.status_code, batch.status_code), (201, 201))
+        ids = [single.json()['id'], batch.json()['results'][0]['session']['id']]
+        return [GameSession.objects.get(pk=pk) for pk in ids]
+
+    def test_recent_games_keep_their_end(self):
+        ended_at = datetime.now(timezone.utc) - timedelta(minutes=5)
+        for session in self.submit(ended_at):
+            self.assertEqual(session.created_at, ended_at)
+            self.assertEqual(session.started_at, ended_at - timedelta(seconds=120))
+
+    def test_backdated_games_are_clamped(self):
+        before = datetime.now(timezone.utc)
+        sessions = self.submit(before - timedelta(days=30))
+        earliest = before - timedelta(seconds=120 + 300)
+        for session in sessions:
+            self.assertEqual(session.created_at, session.ended_at)
+            self.assertGreaterEqual(session.created_at, earliest)
+            self.assertLessEqual(session.created_at, datetime.now(timezone.utc))
+
+
+@override_settings(**TEST_SETTINGS)
+class LeaderboardResponseCacheTests(TestCase):
+    """Cached leaderboard pages are keyed by the parameters the view reads and follow renames"""
+
+    def setUp(self):
+        self.player = User.objects.create_user(
+            username='cached', email='cached@example.com', password='cached-password', player_name='Cached',
+        )
+        session = GameSession.objects.create(user=self.player, score=7000, verification_status='verified')
+        self.assertTrue(PlayerBest.objects.filter(session=session).exists())
+
+    def tearDown(self):
+        ranked_leaderboard.unload()
+        score_distributions.unload()
+        user_cache.clear()
+        cache.clear()
+
+    def test_unread_parameters_share_an_entry(self):
+        self.client.get(reverse('global_leaderboard'), {'limit': 10})
+        self.client.get(reverse('global_leaderboard'), {'limit': 500})
+        with self.assertNumQueries(0):
+            for junk in ('a', 'b', 'c'):
+                response = self.client.get(reverse('global_leaderboard'), {'limit': '10', 'junk': junk})
+                self.assertEqual(response.status_code, 200)
+            # Clamped like the view clamps it: the same page as limit=500
+            self.client.get(reverse('global_leaderboard'), {'limit': 10 ** 6})
+
+    def test_rename_refreshes_cached_pages(self):
+        self.assertEqual(self.client.get(reverse('global_leaderboard')).json()[0]['username'], 'cached')
+        with self.captureOnCommitCallbacks(execute=True):
+            player = User.objects.get(pk=self.player.pk)
+            player.username = 'renamed'
+            player.save(update_fields=['username'])
+        self.assertEqual(self.client.get(reverse('global_leaderboard')).json()[0]['username'], 'renamed')
+
+
+@override_settings(**TEST_SETTINGS)
+class ReplayVerdictTests(TestCase):
+    """Only verified games rank; a rejected game gives back everything it was granted"""
+
+    def setUp(self):
+        self.player = User.objects.create_user(
+            username='suspect', email='suspect@example.com', password='suspect-password', player_name='Suspect',
+        )
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.player).access_token}')
+        Achievement.objects.create(name='First game', conditions={'games_played': 1})
+        Achievement.objects.create(name='High roller', conditions={'score': 5000})
+
+    def tearDown(self):
+        ranked_leaderboard.unload()
+        score_distributions.unload()
+        user_cache.clear()
+        # The rules version lives in the cache; rolled-back achievements must not stay compiled
+        cache.clear()
+
+    def submit(self, score):
+        response = self.client.post(
+            reverse('submit_score'),
+            {'score': score, 'lines_cleared': score // 1000, 'duration_seconds': 60},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return GameSession.objects.get(pk=response.json()['id'])
+
+    def test_unverified_games_are_not_ranked(self):
+        session = self.submit(4000)
+        self.assertEqual(session.verification_status, 'unverified')
+        self.assertFalse(PlayerBest.objects.filter(user=self.player).exists())
+
+    def test_rejection_revokes_what_the_game_granted(self):
+        cheat = self.submit(80000)
+        genuine = self.submit(3000)
+        # As if the first game had come with a replay
+        GameSession.objects.filter(pk=cheat.pk).update(verification_status='pending')
+        GameReplay.objects.create(session_id=cheat.pk, seed=1, data=b'replay')
+        self.assertEqual(UserAchievement.objects.filter(game_session=cheat).count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            jobs, sessions = load_batch(10)
+            self.assertEqual([job[0] for job in jobs], [cheat.pk])
+            self.assertEqual(apply_results([(cheat.pk, False, 'score mismatch')], sessions), 0)
+
+        self.player.refresh_from_db()
+        self.assertEqual(
+            (self.player.games_played, self.player.total_score, self.player.highest_score), (1, 3000, 3000)
+        )
+        self.assertEqual((self.player.player_level, self.player.exp), level_for_total(exp_for_score(3000)))
+        stats = UserStats.objects.get(user=self.player)
+        self.assertEqual((stats.total_games, stats.total_score, stats.highest_score), (1, 3000, 3000))
+        self.assertEqual(
+            list(DailyUserStats.objects.filter(user=self.player).values_list('games', 'total_score')), [(1, 3000)]
+        )
+        # First game goes to the genuine game; nothing else earned High roller
+        self.assertEqual(
+            set(UserAchievement.objects.filter(user=self.player).values_list('achievement__name', 'game_session')),
+            {('First game', genuine.pk)},
+        )
+        self.assertFalse(PlayerBest.objects.filter(user=self.player).exists())
+
+
+@override_settings(**TEST_SETTINGS)
+class LeaderboardSnapshotTests(TestCase):
+    """A snapshot is only loaded while PlayerBest still looks as it did when it was written"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(LEADERBOARD_SNAPSHOT_PATH=f'{self.directory}/leaderboard.snapshot')
+        self.settings.enable()
+        self.players = []
+        for index, score in enumerate((5000, 3000)):
+            player = User.objects.create_user(
+                username=f'snap{index}', email=f'snap{index}@example.com', password='snap-password',
+                player_name=f'Snap{index}',
+            )
+            GameSession.objects.create(user=player, score=score, verification_status='verified')
+            self.players.append(player)
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+        ranked_leaderboard.unload()
+        score_distributions.unload()
+        user_cache.clear()
+
+    def ranks(self):
+        return [ranked_leaderboard.rank(player.pk) for player in self.players]
+
+    def test_round_trip(self):
+        self.assertEqual(self.ranks(), [(1, 5000), (2, 3000)])
+        ranked_leaderboard.save_snapshot()
+        self.assertTrue(os.path.exists(settings.LEADERBOARD_SNAPSHOT_PATH))
+        ranked_leaderboard.unload()
+        self.assertEqual(self.ranks(), [(1, 5000), (2, 3000)])
+
+    def test_older_table_discards_the_snapshot(self):
+        self.assertEqual(self.ranks(), [(1, 5000), (2, 3000)])
+        ranked_leaderboard.save_snapshot()
+        # As if an older backup were restored: another best, and no newer updated_at
+        best = PlayerBest.objects.get(user=self.players[1])
+        PlayerBest.objects.filter(pk=best.pk).update(
+            score=8000, updated_at=best.updated_at - timedelta(days=1)
+        )
+        ranked_leaderboard.unload()
+        self.assertEqual(self.ranks(), [(2, 5000), (1, 8000)])
+
+
+@override_settings(LEADERBOARD_STREAM_QUEUE_SIZE=4, LEADERBOARD_STREAM_POLL_SECONDS=3600, **TEST_SETTINGS)
+class LeaderboardBroadcasterTests(TestCase):
+    """10k subscribers in one process: bounded queues, one shared message, slow ones dropped"""
+
+    SUBSCRIBERS = 10000
+    SLOW_EVERY = 10
+    QUEUE_SIZE = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(3):
+            player = User.objects.create_user(
+                username=f'streamer{number}', email=f'streamer{number}@example.com',
+                password='streamer-password', player_name=f'Streamer {number}',
+            )
+            GameSession.objects.create(user=player, score=1000 * (number + 1), verification_status='verified')
+
+    def tearDown(self):
+        ranked_leaderboard.unload()
+        score_distributions.unload()
+
+    def test_fan_out_to_10k_subscribers(self):
+        async_to_sync(self.fan_out)()
+
+    async def fan_out(self):
+        broadcaster = LeaderboardBroadcaster()
+        subscribed = [await broadcaster.subscribe() for _ in range(self.SUBSCRIBERS)]
+        subscribers = [subscriber for subscriber, _ in subscribed]
+        self.assertEqual(len(broadcaster), self.SUBSCRIBERS)
+        # The snapshot is encoded once and shared
+        self.assertEqual(len({id(snapshot) for _, snapshot in subscribed}), 1)
+
+        slow = subscribers[::self.SLOW_EVERY]
+        fast = [subscriber for index, subscriber in enumerate(subscribers) if index % self.SLOW_EVERY]
+        raise_top_score = sync_to_async(
+            lambda: PlayerBest.objects.filter(score=PlayerBest.objects.order_by('-score')[0].score)
+            .update(score=F('score') + 1)
+        )
+
+        for change in range(self.QUEUE_SIZE + 1):
+            await raise_top_score()
+            await broadcaster._publish()
+            for subscriber in slow:
+                self.assertLessEqual(subscriber.queue.qsize(), self.QUEUE_SIZE)
+            messages = set()
+            for subscriber in fast:
+                self.assertEqual(subscriber.queue.qsize(), 1)
+                messages.add(id(subscriber.queue.get_nowait()))
+            # Every subscriber is handed the same bytes, not a copy
+            self.assertEqual(len(messages), 1)
+
+        # Slow consumers fell a whole queue behind: cut off with only the close marker left
+        for subscriber in slow:
+            self.assertTrue(subscriber.dropped)
+            self.assertEqual(subscriber.queue.qsize(), 1)
+            self.assertIsNone(subscriber.queue.get_nowait())
+        self.assertFalse(any(subscriber.dropped for subscriber in fast))
+
+        # Dropped subscribers are not offered anything more
+        await raise_top_score()
+        await broadcaster._publish()
+        self.assertTrue(all(subscriber.queue.empty() for subscriber in slow))
+        self.assertTrue(all(subscriber.queue.qsize() == 1 for subscriber in fast))
+
+        for subscriber in subscribers:
+            broadcaster.unsubscribe(subscriber)
+        self.assertEqual(len(broadcaster), 0)
+        broadcaster._poller.cancel()
+
+
+class PercentileSketchTests(SimpleTestCase):
+    """LogHistogram against exact answers on a million values per metric"""
+
+    COUNT = 1000000
+    SHARDS = 8
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.data = synthetic_values(cls.COUNT, seed=5)
+
+    def test_quantiles_and_percentiles_within_accuracy(self):
+        histograms = empty_histograms()
+        for metric, values in self.data.items():
+            histogram = histograms[metric]
+            histogram.add_many(values)
+            self.assertEqual(histogram.total, self.COUNT)
+            worst_quantile, _, out_of_bounds = check_metric(histogram, values)
+            self.assertEqual(out_of_bounds, [], metric)
+            self.assertLessEqual(worst_quantile, histogram.accuracy * (1 + 1e-9), metric)
+
+    def test_merge_equals_union(self):
+        whole = empty_histograms()
+        merged = empty_histograms()
+        for metric, values in self.data.items():
+            whole[metric].add_many(values)
+            for shard in range(self.SHARDS):
+                part = merged[metric].empty()
+                part.add_many(values[shard::self.SHARDS])
+                merged[metric].merge(part)
+            self.assertTrue(np.array_equal(merged[metric].counts, whole[metric].counts), metric)
+            for q in (0.01, 0.5, 0.99):
+                self.assertEqual(merged[metric].quantile(q), whole[metric].quantile(q))
+
+        _, restored = unpack_histograms(pack_histograms(merged, 7))
+        for metric in self.data:
+            self.assertTrue(np.array_equal(restored[metric].counts, merged[metric].counts), metric)
+
+    def test_single_adds_match_add_many(self):
+        histogram = empty_histograms()['score']
+        # Values on and next to bucket bounds as well as random ones
+        bounds = histogram.min_value * histogram.gamma ** np.arange(0, histogram.size, 7)
+        values = np.concatenate([bounds, np.nextafter(bounds, 0), np.nextafter(bounds, np.inf),
+                                 self.data['score'][:20000], [0, histogram.max_value * 10]])
+        one_by_one = histogram.empty()
+        for value in values.tolist():
+            one_by_one.add(value)
+        histogram.add_many(values)
+        self.assertTrue(np.array_equal(one_by_one.counts, histogram.counts))
+
+
+class ArchivedSessionTests(TransactionTestCase):
+    """Archived games still count for PlayerBest and achievements, and go with their player"""
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.settings = override_settings(**dict(TEST_SETTINGS, ARCHIVE_DIR=self.archive_dir))
+        self.settings.enable()
+        self.player = User.objects.create_user(
+            username='veteran', email='veteran@example.com', password='veteran-password', player_name='Veteran',
+        )
+        played = datetime.now(timezone.utc) - timedelta(days=100)
+        for minutes, score in enumerate((100, 5000, 7000)):
+            session = GameSession.objects.create(user=self.player, score=score, verification_status='verified')
+            GameSession.objects.filter(pk=session.pk).update(created_at=played + timedelta(minutes=minutes))
+        self.hot_best = GameSession.objects.create(user=self.player, score=9000, verification_status='verified')
+        PlayerBest.rebuild()
+        call_command('archive_sessions', '--older-than', '30', stdout=io.StringIO())
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.archive_dir)
+        ranked_leaderboard.unload()
+        score_distributions.unload()
+
+    def archived_rows(self):
+        return sum(partition.rows for partition in session_archive.partitions())
+
+    def test_archived_game_becomes_best_again(self):
+        self.assertEqual(self.archived_rows(), 3)
+        self.hot_best.delete()
+        best = PlayerBest.objects.get(user=self.player)
+        # Restored to the table so PlayerBest can point at it, and gone from the archive
+        self.assertEqual(best.score, 7000)
+        self.assertTrue(GameSession.objects.filter(pk=best.session_id, score=7000).exists())
+        self.assertEqual(self.archived_rows(), 2)
+
+        GameSession.objects.filter(pk=best.session_id).update(score=10)
+        PlayerBest.rebuild()
+        self.assertEqual(PlayerBest.objects.get(user=self.player).score, 5000)
+        self.assertEqual(self.archived_rows(), 1)
+
+    def test_backfill_replays_archived_games(self):
+        Achievement.objects.create(name='High scorer', description='', conditions={'score': 4000})
+        Achievement.objects.create(name='Regular', description='', conditions={'total_games': 3})
+        call_command('backfill_achievements', stdout=io.StringIO())
+        awards = dict(
+            UserAchievement.objects.filter(user=self.player)
+            .values_list('achievement__name', 'score_when_earned')
+        )
+        # Both were earned by archived games (the 5000 and the third game, 7000)
+        self.assertEqual(awards, {'High scorer': 5000, 'Regular': 7000})
+        self.assertFalse(UserAchievement.objects.filter(game_session__isnull=False).exists())
+
+    def test_deleted_players_are_purged_by_command(self):
+        self.player.delete()
+        self.assertFalse(GameSession.objects.exists())
+        # Nothing is rewritten in the request; rebuilds skip the orphaned games meanwhile
+        self.assertEqual(self.archived_rows(), 3)
+        call_command('rollup_sessions', stdout=io.StringIO())
+        call_command('purge_archive', stdout=io.StringIO())
+        self.assertEqual(self.archived_rows(), 0)
+
+    def test_games_both_archived_and_in_the_table_count_once(self):
+        # As between archive_sessions writing a month and deleting its games from the table
+        partition = session_archive.partitions()[0]
+        for row in range(partition.rows):
+            partition.session(row).save_base(raw=True, force_insert=True)
+        self.assertEqual(GameSession.objects.filter(user=self.player).count(), 4)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.player).access_token}')
+
+        ids = []
+        cursor = ''
+        while True:
+            page = client.get(reverse('game_history') + f'?page_size=2{cursor}').json()
+            ids.extend(game['id'] for game in page['results'])
+            if not page['next']:
+                break
+            cursor = '&cursor=' + page['next'].split('cursor=')[1].split('&')[0]
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+
+        response = client.get(reverse('game_history_export') + '?format=ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(sorted(json.loads(line)['id'] for line in lines), sorted(ids))
+
+        Achievement.objects.create(name='Regular', description='', conditions={'total_games': 3})
+        call_command('backfill_achievements', stdout=io.StringIO())
+        self.assertEqual(UserAchievement.objects.get(user=self.player).score_when_earned, 7000)
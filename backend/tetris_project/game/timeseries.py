@@ -0,0 +1,60 @@
+# game/timeseries.py - Day, week and month series from DailyUserStats rows
+
+from datetime import timedelta
+
+BUCKETS = ('day', 'week', 'month')
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket containing day; weeks start on Monday"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, bucket):
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start + timedelta(days=1)
+
+
+def rollup_series(rows, bucket, start, end):
+    """Points for every bucket overlapping [start, end], empty ones included
+
+    rows are (day, games, total_score, max_score, lines, pieces, playtime)
+    tuples as stored in DailyUserStats.
+    """
+    totals = {}
+    for day, games, score, best, lines, pieces, playtime in rows:
+        key = bucket_start(day, bucket)
+        total = totals.get(key)
+        if total is None:
+            totals[key] = [games, score, best, lines, pieces, playtime]
+        else:
+            total[0] += games
+            total[1] += score
+            total[2] = max(total[2], best)
+            total[3] += lines
+            total[4] += pieces
+            total[5] += playtime
+
+    points = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        games, score, best, lines, pieces, playtime = totals.get(current, (0, 0, 0, 0, 0, 0))
+        points.append({
+            'start': current.isoformat(),
+            'games': games,
+            'total_score': score,
+            'max_score': best,
+            'average_score': round(score / games, 1) if games else 0,
+            'lines_cleared': lines,
+            'pieces_placed': pieces,
+            'playtime_seconds': playtime,
+        })
+        current = next_bucket(current, bucket)
+    return points
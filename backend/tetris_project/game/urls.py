@@ -1,15 +1,35 @@
 # game/urls.py
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Read-heavy endpoints get native async views under ASGI (see tetris_project/asgi.py)
+if settings.USE_ASYNC_VIEWS:
+    achievements_view = async_views.user_achievements
+    leaderboard_view = async_views.global_leaderboard
+    user_stats_view = async_views.user_stats
+else:
+    achievements_view = views.user_achievements
+    leaderboard_view = views.global_leaderboard
+    user_stats_view = views.UserStatsView.as_view()
 
 urlpatterns = [
     path('scores/', views.scores, name='scores'),
     path('scores/user/', views.user_scores, name='user_scores'),
     path('game-sessions/', views.game_sessions, name='game_sessions'),
     path('game-sessions/<int:pk>/', views.game_session_detail, name='game_session_detail'),
-    path('achievements/', views.user_achievements, name='user_achievements'),
-    path('leaderboard/', views.global_leaderboard, name='global_leaderboard'),
+    path('game-sessions/<int:pk>/replay/', views.game_session_replay, name='game_session_replay'),
+    path('achievements/', achievements_view, name='user_achievements'),
+    path('leaderboard/', leaderboard_view, name='global_leaderboard'),
+    path('leaderboard/stream/', async_views.leaderboard_stream, name='leaderboard_stream'),
+    path('leaderboard/rank/', views.leaderboard_rank, name='leaderboard_rank'),
+    path('leaderboard/around-me/', views.leaderboard_around_me, name='leaderboard_around_me'),
+    path('percentile/', views.score_percentile, name='score_percentile'),
     path('game-history/', views.GameHistoryView.as_view(), name='game_history'),
-    path('user-stats/', views.UserStatsView.as_view(), name='user_stats'),
+    path('game-history/export/', views.GameHistoryExportView.as_view(), name='game_history_export'),
+    path('user-stats/', user_stats_view, name='user_stats'),
+    path('user-stats/timeseries/', views.user_stats_timeseries, name='user_stats_timeseries'),
+    path('cache-stats/', views.response_cache_stats, name='response_cache_stats'),
     path('submit-score/',views.submit_score, name='submit_score'),
+    path('submit-scores/batch/', views.submit_scores_batch, name='submit_scores_batch'),
 ]
@@ -0,0 +1,29 @@
+# game/verification.py - Replay verification queue state shared by views and the worker
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import GameSession
+
+PENDING_COUNT_KEY = 'replays:pending-count'
+PENDING_COUNT_TTL = 5
+
+
+def pending_count():
+    """Number of sessions waiting for verification, cached for a few seconds"""
+    count = cache.get(PENDING_COUNT_KEY)
+    if count is None:
+        count = refresh_pending_count()
+    return count
+
+
+def refresh_pending_count():
+    count = GameSession.objects.filter(verification_status='pending').count()
+    cache.set(PENDING_COUNT_KEY, count, timeout=PENDING_COUNT_TTL)
+    return count
+
+
+def queue_is_full():
+    """True when submissions should be refused until the verifiers catch up"""
+    limit = getattr(settings, 'REPLAY_QUEUE_MAX_PENDING', None)
+    return limit is not None and pending_count() >= limit
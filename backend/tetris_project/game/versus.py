@@ -0,0 +1,452 @@
+# game/versus.py - Server-authoritative head-to-head matches
+
+"""Versus mode
+
+Players connect to /ws/versus/?token=<access token> and are paired in
+arrival order. The server runs both games; clients only send inputs
+
+    {"i": [3, 0, 4]}    input codes from game/engine/replay.py
+                        (left, right, soft drop, rotate, hard drop)
+
+and receive
+
+    {"start": {"opponent": "name", "seed": 123, "tick_rate": 60}}
+    {"t": 812, "you": <frame>, "opp": <frame>, "gq": 2}
+    {"end": {"result": "win" | "loss" | "draw", "score": 5400}}
+
+where the frames are game/spectate.py diffs against what that player was
+last sent, and gq is the garbage queued against them. Clearing 2, 3 or 4
+lines sends 1, 2 or 4 garbage rows to the opponent, cancelling garbage
+queued against the sender first. Queued garbage rises after the receiver's
+next piece locks without clearing a line.
+
+Every match in the process is advanced by one scheduler task on a fixed
+tick grid, so hundreds of matches share a single timer instead of each
+sleeping on its own. Gravity follows calculate_drop_time like the client,
+and each player's inputs are applied at most MAX_INPUTS_PER_TICK per tick.
+Finished matches are saved as two verified GameSessions linked by a
+VersusMatch.
+"""
+
+import asyncio
+import json
+import logging
+import random
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .achievements import evaluate_session
+from .engine import BOARD_WIDTH, Game
+from .engine.replay import HARD_DROP, LEFT, RIGHT, ROTATE, SOFT_DROP
+from .models import GameSession, UserStats, VersusMatch
+from .spectate import CLOSE_INVALID, CLOSE_REPLACED, CLOSE_UNAUTHORIZED, authenticate, diff_state, engine_state
+
+logger = logging.getLogger(__name__)
+
+# Garbage rows sent for 0-4 lines cleared by one piece
+GARBAGE_LINES = (0, 0, 1, 2, 4)
+MAX_INPUTS_PER_TICK = 4
+INPUT_QUEUE_SIZE = 32
+LATENCY_SAMPLES = 10000
+NO_STATE = (None, None, None)
+
+
+def tick_rate():
+    return getattr(settings, 'VERSUS_TICK_RATE', 60)
+
+
+class Seat:
+    """One player's side of a match: their game, queued inputs and garbage"""
+
+    def __init__(self, user_id, username, send=None):
+        self.user_id = user_id
+        self.username = username
+        self.send = send
+        self.match = None
+        self.game = None
+        self.inputs = deque(maxlen=INPUT_QUEUE_SIZE)
+        self.last_change = 0.0
+        self.pending_garbage = 0
+        self.outgoing = 0
+        self.garbage_sent = 0
+        self.garbage_received = 0
+        self.holes = None
+        self.quit = False
+        # What this player was last sent: (game, rows, meta) for each board
+        self.sent_you = NO_STATE
+        self.sent_opp = NO_STATE
+        self.sent_garbage = 0
+        self.changed = asyncio.Event()
+        self.writer = None
+
+    def start(self, match):
+        self.match = match
+        self.game = Game(seed=match.seed)
+        # Both players get the same pieces and the same garbage holes
+        self.holes = random.Random(match.seed)
+
+    def queue_inputs(self, actions):
+        for action in actions:
+            if type(action) is int and LEFT <= action <= HARD_DROP:
+                self.inputs.append(action)
+
+    def advance(self, tick, rate):
+        """Apply queued inputs then gravity for one tick; True if the game changed"""
+        game = self.game
+        if game.game_over or self.quit:
+            return False
+        changed = False
+        for _ in range(min(len(self.inputs), MAX_INPUTS_PER_TICK)):
+            action = self.inputs.popleft()
+            result = -1
+            if action == LEFT:
+                moved = game.move(-1)
+            elif action == RIGHT:
+                moved = game.move(1)
+            elif action == ROTATE:
+                moved = game.rotate()
+            elif action == SOFT_DROP:
+                result = game.step()
+                moved = True
+            else:
+                result = game.hard_drop()
+                moved = True
+            if moved:
+                self.last_change = tick
+                changed = True
+            if result >= 0:
+                self._locked(result)
+            if game.game_over:
+                return True
+
+        # Like the client, gravity fires drop_time after the last change
+        interval = max(1.0, game.drop_time * rate / 1000)
+        while not game.game_over and self.last_change + interval <= tick:
+            self.last_change += interval
+            result = game.step()
+            if result >= 0:
+                self._locked(result)
+            changed = True
+        return changed
+
+    def _locked(self, cleared):
+        if cleared:
+            attack = GARBAGE_LINES[cleared]
+            cancelled = min(attack, self.pending_garbage)
+            self.pending_garbage -= cancelled
+            self.outgoing += attack - cancelled
+        elif self.pending_garbage:
+            self.game.add_garbage(self.pending_garbage, self.holes.randrange(BOARD_WIDTH))
+            self.garbage_received += self.pending_garbage
+            self.pending_garbage = 0
+
+    def frame(self):
+        """Encoded update taking this player from what they were last sent to now"""
+        match = self.match
+        opponent = match.opponent(self)
+        you = (1, *engine_state(self.game))
+        opp = (1, *engine_state(opponent.game))
+        message = {'t': match.ticks}
+        you_diff = diff_state(*self.sent_you, *you)
+        if you_diff:
+            message['you'] = you_diff
+        opp_diff = diff_state(*self.sent_opp, *opp)
+        if opp_diff:
+            message['opp'] = opp_diff
+        if self.pending_garbage != self.sent_garbage:
+            message['gq'] = self.pending_garbage
+        if len(message) == 1:
+            return None
+        self.sent_you, self.sent_opp, self.sent_garbage = you, opp, self.pending_garbage
+        return json.dumps(message, separators=(',', ':'))
+
+    async def run_writer(self, interval):
+        """Send state whenever the match changes, at most once per interval"""
+        loop = asyncio.get_running_loop()
+        opponent = self.match.opponent(self)
+        try:
+            await self.send_json({'start': {
+                'opponent': opponent.username, 'seed': self.match.seed, 'tick_rate': self.match.tick_rate,
+            }})
+            while True:
+                await self.changed.wait()
+                self.changed.clear()
+                text = self.frame()
+                if text is None:
+                    continue
+                sent_at = loop.time()
+                await self.send({'type': 'websocket.send', 'text': text})
+                if interval:
+                    await asyncio.sleep(max(0.0, sent_at + interval - loop.time()))
+        except OSError:
+            # Disconnected; play() sees it too and forfeits the match
+            pass
+
+    async def send_json(self, data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(data, separators=(',', ':'))})
+
+
+class Match:
+    """Two seats advanced together, tick by tick"""
+
+    def __init__(self, one, two, seed=None, rate=None):
+        self.seats = (one, two)
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.tick_rate = rate or tick_rate()
+        self.max_ticks = int(getattr(settings, 'VERSUS_MAX_SECONDS', 900) * self.tick_rate)
+        self.ticks = 0
+        self.finished = False
+        self.winner = None
+        self.started_at = timezone.now()
+        for seat in self.seats:
+            seat.start(self)
+
+    def opponent(self, seat):
+        one, two = self.seats
+        return two if seat is one else one
+
+    def tick(self):
+        self.ticks += 1
+        one, two = self.seats
+        changed = one.advance(self.ticks, self.tick_rate)
+        changed = two.advance(self.ticks, self.tick_rate) or changed
+        # Garbage is exchanged after both moved, so neither player acts first
+        for sender, receiver in ((one, two), (two, one)):
+            if sender.outgoing:
+                receiver.pending_garbage += sender.outgoing
+                sender.garbage_sent += sender.outgoing
+                sender.outgoing = 0
+                changed = True
+        self._check_end()
+        if changed or self.finished:
+            for seat in self.seats:
+                seat.changed.set()
+
+    def _check_end(self):
+        out = [seat.game.game_over or seat.quit for seat in self.seats]
+        if not any(out) and self.ticks < self.max_ticks:
+            return
+        self.finished = True
+        one, two = self.seats
+        if out[0] != out[1]:
+            self.winner = two if out[0] else one
+        elif one.game.score != two.game.score:
+            self.winner = one if one.game.score > two.game.score else two
+
+    def result_for(self, seat):
+        if self.winner is None:
+            return 'draw'
+        return 'win' if self.winner is seat else 'loss'
+
+
+class MatchScheduler:
+    """Advances every match in this process on one fixed tick grid
+
+    Ticks are scheduled at absolute times so sleep overshoot does not
+    accumulate into drift. If the loop falls more than a tick behind, the
+    missed ticks are dropped (games slow down) rather than run in a burst.
+    """
+
+    def __init__(self, on_finish=None, rate=None):
+        self.matches = set()
+        self.on_finish = on_finish
+        self._rate = rate
+        self._task = None
+        # Seconds each tick started after its scheduled time, and how long it ran
+        self.lateness = deque(maxlen=LATENCY_SAMPLES)
+        self.durations = deque(maxlen=LATENCY_SAMPLES)
+        self.ticks = 0
+        self.skipped = 0
+
+    @property
+    def tick_rate(self):
+        return self._rate or tick_rate()
+
+    def __len__(self):
+        return len(self.matches)
+
+    def add(self, match):
+        self.matches.add(match)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while self.matches:
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            started = loop.time()
+            late = started - next_tick
+            self.lateness.append(late)
+            if late > period:
+                missed = int(late / period)
+                self.skipped += missed
+                next_tick += missed * period
+
+            for match in list(self.matches):
+                try:
+                    match.tick()
+                except Exception:
+                    logger.exception('Versus match tick failed')
+                    match.finished = True
+                if match.finished:
+                    self.matches.discard(match)
+                    if self.on_finish is not None:
+                        self.on_finish(match)
+            self.ticks += 1
+            self.durations.append(loop.time() - started)
+            next_tick += period
+
+
+def record_match(match):
+    """Save both games as verified sessions linked by a VersusMatch"""
+    from .views import record_user_games
+
+    ended_at = timezone.now()
+    with transaction.atomic():
+        sessions = []
+        for seat in match.seats:
+            game = seat.game
+            result = match.result_for(seat)
+            if seat.quit:
+                end_reason = 'quit'
+            elif game.game_over:
+                end_reason = 'top_out'
+            else:
+                end_reason = 'completed'
+            sessions.append(GameSession.objects.create(
+                user_id=seat.user_id,
+                score=game.score,
+                final_level=game.level + 1,
+                lines_cleared=game.lines,
+                pieces_placed=game.pieces_placed,
+                tetrises_cleared=game.tetrises,
+                started_at=match.started_at,
+                ended_at=ended_at,
+                end_reason=end_reason,
+                game_data={
+                    'mode': 'versus',
+                    'result': result,
+                    'opponent_id': match.opponent(seat).user_id,
+                    'garbage_sent': seat.garbage_sent,
+                    'garbage_received': seat.garbage_received,
+                },
+                # The server ran this game, so there is no replay to check
+                verification_status='verified',
+            ))
+        VersusMatch.objects.create(
+            session_one=sessions[0],
+            session_two=sessions[1],
+            winner_id=match.winner.user_id if match.winner else None,
+            seed=match.seed,
+            ticks=match.ticks,
+        )
+        if match.winner is not None:
+            UserStats.objects.filter(user_id=match.winner.user_id).update(games_won=F('games_won') + 1)
+        for session in sessions:
+            record_user_games(session.user, [session.score])
+            evaluate_session(session)
+
+
+async def close_seat(seat, match):
+    if seat.writer is not None:
+        seat.writer.cancel()
+    if seat.send is None:
+        return
+    try:
+        text = seat.frame()
+        if text is not None:
+            await seat.send({'type': 'websocket.send', 'text': text})
+        await seat.send_json({'end': {'result': match.result_for(seat), 'score': seat.game.score}})
+        await seat.send({'type': 'websocket.close', 'code': 1000})
+    except OSError:
+        pass
+
+
+async def finish_match(match):
+    try:
+        await sync_to_async(record_match)(match)
+    except Exception:
+        logger.exception('Could not record versus match')
+    await asyncio.gather(*(close_seat(seat, match) for seat in match.seats))
+
+
+def start_match(one, two):
+    match = Match(one, two)
+    fps = getattr(settings, 'VERSUS_MAX_FPS', 60)
+    for seat in match.seats:
+        if seat.send is not None:
+            seat.writer = asyncio.ensure_future(seat.run_writer(1.0 / fps if fps else 0.0))
+    scheduler.add(match)
+    return match
+
+
+class Lobby:
+    """Pairs waiting players in arrival order"""
+
+    def __init__(self):
+        self.waiting = None
+
+    async def join(self, seat):
+        waiting = self.waiting
+        if waiting is not None and waiting.user_id == seat.user_id:
+            # The same account in a second tab replaces the first
+            await waiting.send({'type': 'websocket.close', 'code': CLOSE_REPLACED})
+            waiting = None
+        if waiting is None:
+            self.waiting = seat
+            return None
+        self.waiting = None
+        return start_match(waiting, seat)
+
+    def leave(self, seat):
+        if self.waiting is seat:
+            self.waiting = None
+
+
+scheduler = MatchScheduler(on_finish=lambda match: asyncio.ensure_future(finish_match(match)))
+lobby = Lobby()
+
+
+async def play(scope, receive, send):
+    user = await authenticate(scope)
+    if user is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+
+    await send({'type': 'websocket.accept'})
+    seat = Seat(user.pk, user.username, send)
+    await lobby.join(seat)
+    limit = getattr(settings, 'SPECTATE_MAX_MESSAGE_BYTES', 2048)
+    try:
+        while True:
+            message = await receive()
+            if message['type'] != 'websocket.receive':
+                break
+            text = message.get('text')
+            try:
+                actions = json.loads(text)['i'] if text and len(text) <= limit else None
+            except (ValueError, TypeError, KeyError):
+                actions = None
+            if not isinstance(actions, list):
+                await send({'type': 'websocket.close', 'code': CLOSE_INVALID})
+                break
+            # Inputs sent before the match starts are dropped
+            if seat.match is not None:
+                seat.queue_inputs(actions)
+    finally:
+        lobby.leave(seat)
+        if seat.match is not None and not seat.match.finished:
+            # Leaving forfeits; the scheduler ends the match on its next tick
+            seat.quit = True
+        if seat.writer is not None:
+            seat.writer.cancel()
+        seat.send = None
@@ -1,15 +1,34 @@
 #  game/views.py
 
+import math
+from datetime import timedelta
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Window, F
-from django.db.models.functions import Rank
-from .models import Score, GameSession, Achievement, UserStats,UserAchievement
+from rest_framework.negotiation import DefaultContentNegotiation
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from .models import Score, GameSession, UserStats,UserAchievement, PlayerBest, GameReplay, DailyUserStats, record_player_best
+from .archive import session_archive
+from .export import CONTENT_TYPES, export_response
+from .leaderboard import ranked_leaderboard
+from .percentiles import METRICS, score_distributions
+from .achievements import evaluate_sessions
+from .verification import queue_is_full
+from .pagination import KeysetPagination
+from .timeseries import BUCKETS, rollup_series
+from users.progression import record_games
+from .response_cache import cache_stats, cached_response
+from tetris_project.cache_versions import LEADERBOARD, bump_version, user_namespace
 from .serializers import (
-    ScoreSerializer, GameSessionSerializer, AchievementSerializer,UserAchievementSerializer,
-    LeaderboardSerializer, UserStatsSerializer,UserProfileSerializer
+    ScoreSerializer, GameSessionSerializer, UserAchievementSerializer,
+    UserStatsSerializer, PlayerBestSerializer, SubmitScoreSerializer
 )
 
 
@@ -17,31 +36,43 @@ from .serializers import (
 @permission_classes([IsAuthenticated])
 def scores(request):
     if request.method == 'GET':
-        scores_with_rank = Score.objects.annotate(
-            rank=Window(
-                expression=Rank(),
-                order_by=F('score').desc()
-            )
-        ).select_related('user')[:10]  # Top 10 scores
-
-        serializer = LeaderboardSerializer(scores_with_rank, many=True)
+        # Top 10 legacy scores; ranks are served by the leaderboard/rank/ endpoints
+        top_scores = Score.objects.select_related('user').order_by('-score', '-date_played')[:10]
+
+        serializer = ScoreSerializer(top_scores, many=True)
         return Response(serializer.data)
 
     elif request.method == 'POST':
         serializer = ScoreSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            score = serializer.save()
-            check_achievements(request.user, score)
+            # Legacy scores are not game sessions, so they do not award achievements
+            serializer.save()
             return Response(serializer.data, status=201)
         return Response(serializer.errors, status=400)
 
 
+def attach_owner(sessions, user):
+    """Give a page of the user's own games their user without joining it in
+
+    With a join, SQLite sorts all of the player's games for every page
+    instead of reading the page off the index (see bench_pagination).
+    """
+    for session in sessions:
+        session.user = user
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_scores(request):
-    sessions = GameSession.objects.filter(user=request.user).order_by('-score')
+    # Keyset pages over the (user, -score, -id) index, merged with archived games
+    paginator = KeysetPagination('score')
+    sessions = paginator.paginate_queryset(
+        GameSession.objects.filter(user=request.user), request,
+        archived=lambda position, limit: session_archive.user_sessions(request.user, 'score', position, limit),
+    )
+    attach_owner(sessions, request.user)
     serializer = GameSessionSerializer(sessions, many=True)
-    return Response(serializer.data)
+    return paginator.get_paginated_response(serializer.data)
 
 
 
@@ -83,6 +114,21 @@ def game_session_detail(request, pk):
 
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def game_session_replay(request, pk):
+    try:
+        data = bytes(GameReplay.objects.only('data').get(session_id=pk).data)
+    except GameReplay.DoesNotExist:
+        data = session_archive.replay_data(pk)
+        if data is None:
+            return Response({'error': 'Replay not found'}, status=404)
+
+    response = HttpResponse(data, content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="session-{pk}.replay"'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_achievements(request):
@@ -90,148 +136,313 @@ def user_achievements(request):
     serializer = UserAchievementSerializer(user_achievements, many=True)
     return Response(serializer.data)
 
-from django.db.models import Max
-from django.db.models.expressions import Subquery, OuterRef
 
-from django.db.models import OuterRef, Subquery
-from .models import GameSession
+LEADERBOARD_DEFAULT_LIMIT = 100
+LEADERBOARD_MAX_LIMIT = 500
+
+
+def parse_int_param(request, name, default, minimum=0, maximum=None):
+    """Read a non-negative integer query parameter, clamped to [minimum, maximum]"""
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    value = max(minimum, value)
+    if maximum is not None:
+        value = min(maximum, value)
+    return value
+
+
+def leaderboard_params(request):
+    """(limit, offset) of a leaderboard page"""
+    return (
+        parse_int_param(request, 'limit', LEADERBOARD_DEFAULT_LIMIT, 1, LEADERBOARD_MAX_LIMIT),
+        parse_int_param(request, 'offset', 0),
+    )
+
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_response('leaderboard', lambda request: LEADERBOARD, leaderboard_params)
 def global_leaderboard(request):
-    # Subquery: for each user, get pk of their highest scoring session
-    top_sessions = GameSession.objects.filter(
-        user=OuterRef('user')
-    ).order_by('-score', 'created_at')
+    # Each player's best game is kept in PlayerBest, so this is a range read
+    # over the (-score, achieved_at) index
+    limit, offset = leaderboard_params(request)
 
-    qs = GameSession.objects.filter(
-        pk=Subquery(top_sessions.values('pk')[:1])
-    ).order_by('-score')
+    qs = PlayerBest.objects.select_related('user', 'session').order_by(
+        '-score', 'achieved_at'
+    )[offset:offset + limit]
 
-    serializer = LeaderboardSerializer(qs, many=True)
+    serializer = PlayerBestSerializer(qs, many=True)
     return Response(serializer.data)
 
 
-def check_achievements(user, score):
-    achievements_to_create = []
-
-    if user.games_played == 1:
-        achievements_to_create.append(Achievement(
-            user=user,
-            achievement_type='first_game',
-            score_when_earned=score.score
-        ))
-
-    score_achievements = [
-        (1000, 'score_1k'),
-        (5000, 'score_5k'),
-        (10000, 'score_10k'),
-        (25000, 'score_25k'),
-    ]
-
-    for threshold, achievement_type in score_achievements:
-        if score.score >= threshold and not Achievement.objects.filter(user=user, achievement_type=achievement_type).exists():
-            achievements_to_create.append(Achievement(
-                user=user,
-                achievement_type=achievement_type,
-                score_when_earned=score.score
-            ))
-
-    level_achievements = [
-        (5, 'level_5'),
-        (10, 'level_10'),
-    ]
-
-    for threshold, achievement_type in level_achievements:
-        if score.level >= threshold and not Achievement.objects.filter(user=user, achievement_type=achievement_type).exists():
-            achievements_to_create.append(Achievement(
-                user=user,
-                achievement_type=achievement_type,
-                score_when_earned=score.score
-            ))
-
-    total_lines = sum(Score.objects.filter(user=user).values_list('lines_cleared', flat=True))
-    lines_achievements = [
-        (100, 'lines_100'),
-        (500, 'lines_500'),
-    ]
-
-    for threshold, achievement_type in lines_achievements:
-        if total_lines >= threshold and not Achievement.objects.filter(user=user, achievement_type=achievement_type).exists():
-            achievements_to_create.append(Achievement(
-                user=user,
-                achievement_type=achievement_type,
-                score_when_earned=score.score
-            ))
-
-    games_achievements = [
-        (10, 'games_10'),
-        (50, 'games_50'),
-    ]
-
-    for threshold, achievement_type in games_achievements:
-        if user.games_played >= threshold and not Achievement.objects.filter(user=user, achievement_type=achievement_type).exists():
-            achievements_to_create.append(Achievement(
-                user=user,
-                achievement_type=achievement_type,
-                score_when_earned=score.score
-            ))
-
-    if achievements_to_create:
-        Achievement.objects.bulk_create(achievements_to_create)
+AROUND_ME_DEFAULT_COUNT = 5
+AROUND_ME_MAX_COUNT = 50
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard_rank(request):
+    position = ranked_leaderboard.rank(request.user.pk)
+    if position is None:
+        return Response({'error': 'No games played yet'}, status=404)
+
+    rank, score = position
+    return Response({
+        'rank': rank,
+        'score': score,
+        'total_players': len(ranked_leaderboard),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def leaderboard_around_me(request):
+    count = parse_int_param(request, 'count', AROUND_ME_DEFAULT_COUNT, 0, AROUND_ME_MAX_COUNT)
+    entries = ranked_leaderboard.around(request.user.pk, count)
+    if not entries:
+        return Response({'error': 'No games played yet'}, status=404)
+
+    usernames = dict(
+        get_user_model().objects.filter(pk__in=[user_id for _, user_id, _ in entries])
+        .values_list('pk', 'username')
+    )
+    return Response({
+        'total_players': len(ranked_leaderboard),
+        'results': [
+            {
+                'rank': rank,
+                'username': usernames.get(user_id),
+                'score': score,
+                'is_me': user_id == request.user.pk,
+            }
+            for rank, user_id, score in entries
+        ],
+    })
+
+
+PERCENTILE_QUANTILES = (0.5, 0.9, 0.99)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def score_percentile(request):
+    """Share of players a value beats: ?metric=score|lines_per_minute|pieces_per_second&value=N
+
+    Signed-in players may leave out value for score to use their own best.
+    """
+    metric = request.query_params.get('metric', 'score')
+    if metric not in METRICS:
+        return Response({'error': f"metric must be one of: {', '.join(METRICS)}"}, status=400)
+
+    raw_value = request.query_params.get('value')
+    if raw_value is None:
+        if metric != 'score' or not request.user.is_authenticated:
+            return Response({'error': 'value is required'}, status=400)
+        value = PlayerBest.objects.filter(user=request.user).values_list('score', flat=True).first()
+        if value is None:
+            return Response({'error': 'No games played yet'}, status=404)
+    else:
+        try:
+            value = float(raw_value)
+        except ValueError:
+            value = math.nan
+        if not math.isfinite(value):
+            return Response({'error': 'value must be a number'}, status=400)
+
+    histogram = score_distributions.histogram(metric)
+    percentile = histogram.percentile(value)
+    quantiles = {}
+    for q in PERCENTILE_QUANTILES:
+        estimate = histogram.quantile(q)
+        quantiles[f'p{round(q * 100)}'] = None if estimate is None else round(estimate, 2)
+    return Response({
+        'metric': metric,
+        'value': value,
+        'percentile': None if percentile is None else round(percentile, 1),
+        'count': histogram.total,
+        'relative_accuracy': histogram.accuracy,
+        'quantiles': quantiles,
+    })
 
 
 class GameHistoryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        sessions = GameSession.objects.filter(user=request.user).order_by('-created_at')
+        # Keyset pages over the (user, -created_at, -id) index, merged with archived games
+        paginator = KeysetPagination('created_at')
+        sessions = paginator.paginate_queryset(
+            GameSession.objects.filter(user=request.user), request, self,
+            archived=lambda position, limit: session_archive.user_sessions(request.user, 'created_at', position, limit),
+        )
+        attach_owner(sessions, request.user)
         serializer = GameSessionSerializer(sessions, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
 
 
-from .models import UserStats
-from .serializers import UserStatsSerializer
+class FormatParamNegotiation(DefaultContentNegotiation):
+    """Leaves ?format= to the view instead of picking a renderer by it; errors render as JSON"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderer = renderers[0]
+        return renderer, renderer.media_type
+
+
+class GameHistoryExportView(APIView):
+    """The whole game history as ?format=ndjson|csv, streamed; ?gzip=1 sends a .gz file"""
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = FormatParamNegotiation
+
+    def get(self, request):
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in CONTENT_TYPES:
+            return Response({'error': f"format must be one of {', '.join(CONTENT_TYPES)}"}, status=400)
+        compress = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+        return export_response(request._request, request.user, export_format, compress)
 
 
 class UserStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(cached_response('user_stats', lambda request: user_namespace(request.user.pk)))
     def get(self, request):
-        user_stats, _ = UserStats.objects.get_or_create(user=request.user)
-        serializer = UserStatsSerializer(user_stats)
+        # UserStatsSerializer reads the progression counters kept on the user
+        serializer = UserStatsSerializer(request.user)
         return Response(serializer.data)
 
-@api_view(['POST'])
+
+TIMESERIES_DEFAULT_DAYS = 365
+TIMESERIES_MAX_DAYS = 3660
+
+
+def timeseries_params(request):
+    """(bucket, days) of a progress chart; an unknown bucket is answered 400 and never cached"""
+    return (
+        request.GET.get('bucket', 'day'),
+        parse_int_param(request, 'days', TIMESERIES_DEFAULT_DAYS, 1, TIMESERIES_MAX_DAYS),
+    )
+
+
+@api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def submit_score(request):
-    serializer = GameSessionSerializer(data=request.data, context={'request': request})
-    if serializer.is_valid():
-        session = serializer.save()
+@cached_response('user_stats_timeseries', lambda request: user_namespace(request.user.pk), timeseries_params)
+def user_stats_timeseries(request):
+    """Progress chart data: ?bucket=day|week|month over the last ?days=N days
+
+    Read from the daily rollup, so cost depends on the days covered, not on
+    how many games the player has.
+    """
+    bucket, days = timeseries_params(request)
+    if bucket not in BUCKETS:
+        return Response({'error': f"bucket must be one of {', '.join(BUCKETS)}"}, status=400)
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rows = DailyUserStats.objects.filter(user=request.user, day__gte=start, day__lte=end).values_list(
+        'day', 'games', 'total_score', 'max_score', 'lines_cleared', 'pieces_placed', 'playtime_seconds'
+    )
+    return Response({
+        'bucket': bucket,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'points': rollup_series(rows, bucket, start, end),
+    })
 
-        user = request.user
-        score_value = session.score
 
-        # UPDATE GLOBAL STATS ON USER 
-        user.total_score += score_value
-        user.games_played += 1
-        if score_value > user.highest_score:
-            user.highest_score = score_value
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def response_cache_stats(request):
+    """Hit/miss counters of the response cache in this worker process"""
+    return Response(cache_stats.snapshot())
 
-        # ADD EXP (scaled: 1000 score = 10 EXP)
-        exp_gained = score_value // 100   # integer division
-        user.exp += exp_gained
+def verification_busy_response():
+    return Response(
+        {'error': 'Score verification is busy, please retry shortly'},
+        status=503,
+        headers={'Retry-After': str(settings.REPLAY_QUEUE_RETRY_AFTER)},
+    )
 
-        # LEVEL SYSTEM (Level 1 needs 1000 EXP, L2 needs 2000, etc.)
-        while user.exp >= user.player_level * 1000:
-            user.exp -= user.player_level * 1000
-            user.player_level += 1
-        
-        user.save()
 
-        # CHECK ACHIEVEMENTS
-        check_achievements(user, session)
+def record_user_games(user, scores):
+    """Add finished games to the user's global stats and EXP"""
+    # UPDATE GLOBAL STATS ON USER with one race-free UPDATE
+    record_games(user.pk, scores)
+    transaction.on_commit(lambda: bump_version(user_namespace(user.pk)))
 
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_score(request):
+    # BACKPRESSURE: refuse new games while the verification queue is backed up
+    if queue_is_full():
+        return verification_busy_response()
+
+    serializer = SubmitScoreSerializer(data=request.data, context={'request': request})
+    if serializer.is_valid():
+        with transaction.atomic():
+            session = serializer.save()
+            record_submitted_games(request.user, [session])
         return Response(serializer.data, status=201)
     else:
         return Response(serializer.errors, status=400)
+
+
+def record_submitted_games(user, sessions):
+    """Fold games inserted by SubmitScoreSerializer.create_many into EXP, stats, bests and achievements
+
+    create_many bulk-inserts, which sends no post_save, so everything the
+    stats receiver would have done happens here, once for all the games.
+    """
+    record_user_games(user, [session.score for session in sessions])
+    UserStats.apply_sessions(user.pk, sessions)
+    DailyUserStats.apply_sessions(user.pk, sessions)
+    for session in sessions:
+        if session.verification_status in GameSession.RANKED_STATUSES:
+            record_player_best(session)
+    evaluate_sessions(sessions)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def submit_scores_batch(request):
+    """Submit several finished games at once, e.g. ones buffered while offline
+
+    Body: {"sessions": [<submit-score payload>, ...]}. Valid items are saved
+    even if others fail; results lists the outcome for each item in order.
+    """
+    if queue_is_full():
+        return verification_busy_response()
+
+    items = request.data.get('sessions') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list) or not items:
+        return Response({'error': 'Expected a non-empty list of sessions'}, status=400)
+    max_size = settings.SCORE_BATCH_MAX_SIZE
+    if len(items) > max_size:
+        return Response({'error': f'At most {max_size} sessions per batch'}, status=400)
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        serializer = SubmitScoreSerializer(data=item, context={'request': request})
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': serializer.errors}
+
+    if valid:
+        user = request.user
+        with transaction.atomic():
+            sessions = SubmitScoreSerializer.create_many(user, [data for _, data in valid])
+            record_submitted_games(user, sessions)
+        for (index, _), session in zip(valid, sessions):
+            results[index] = {
+                'index': index,
+                'status': 'created',
+                'session': GameSessionSerializer(session).data,
+            }
+
+    return Response(
+        {'created': len(valid), 'failed': len(items) - len(valid), 'results': results},
+        status=201 if valid else 400,
+    )
@@ -5,6 +5,26 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Deployment modes:
+
+    # WSGI (default, as on Render)
+    gunicorn tetris_project.wsgi:application --workers 4
+
+    # ASGI with native async read views
+    USE_ASYNC_VIEWS=true uvicorn tetris_project.asgi:application --workers 4
+    USE_ASYNC_VIEWS=true gunicorn tetris_project.asgi:application \
+        --workers 4 --worker-class uvicorn.workers.UvicornWorker
+
+Under ASGI the remaining DRF views still work; Django runs them in a thread.
+Compare deployments with `python manage.py loadtest_http <base-url>`.
+
+WebSocket connections (live spectating and versus matches, see
+game/routing.py) are only served under ASGI; uvicorn needs the
+`websockets` package installed. Versus players are paired within one
+process, so run a single ASGI worker for them. Build the frontend with
+REACT_APP_LIVE_SPECTATING=true only for such a deployment; otherwise it
+opens no spectating sockets.
 """
 
 import os
@@ -13,4 +33,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tetris_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up, since it loads models and settings
+from game.routing import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
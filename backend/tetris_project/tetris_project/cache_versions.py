@@ -0,0 +1,55 @@
+# tetris_project/cache_versions.py - Version tokens in the shared cache, used by both apps
+
+"""Named version tokens that writers bump to invalidate what readers cached
+
+A namespace ('leaderboard', 'user:<id>', 'account:<id>', ...) has one token
+in the default cache. Readers remember the token current when they cached
+something and stop using it once the token moves; writers bump instead of
+deleting keys, so every older entry becomes unreachable at once. A version
+is a random token rather than a counter: if the cache evicts a version key,
+the next reader starts a new token instead of counting up from 0 again and
+finding entries written under the old numbers.
+
+game/response_cache.py versions rendered responses with these, and
+users/user_cache.py versions cached user rows, without either app importing
+the other for it.
+"""
+
+import secrets
+
+from django.core.cache import cache
+
+LEADERBOARD = 'leaderboard'
+
+
+def user_namespace(user_id):
+    return f'user:{user_id}'
+
+
+def _version_key(namespace):
+    return f'response-cache:version:{namespace}'
+
+
+def _new_version():
+    return secrets.token_hex(6)
+
+
+def current_version(namespace):
+    return current_versions(namespace)[0]
+
+
+def current_versions(*namespaces):
+    """The versions of several namespaces, in order, with one cache round trip when all exist"""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    for key in keys:
+        if found.get(key) is None:
+            # First use, or evicted: whichever process adds first picks the token
+            cache.add(key, _new_version(), timeout=None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def bump_version(*namespaces):
+    """Invalidate everything cached under the given namespaces"""
+    cache.set_many({_version_key(namespace): _new_version() for namespace in namespaces}, timeout=None)
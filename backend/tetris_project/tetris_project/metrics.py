@@ -0,0 +1,393 @@
+# tetris_project/metrics.py - Per-route request metrics in Prometheus text format
+
+"""Request metrics shared across worker processes
+
+MetricsMiddleware times every request and a database execute_wrapper
+(installed on each new connection) counts its queries and SQL time.
+Serializer time is the time spent building DRF serializer .data. All of it
+is kept per (route, method, status class) in MetricsFile, a flat table of
+float64 counters in an mmap:
+
+    header   u64 bytes used
+    record   u32 key length, u32 value count, key (padded to 8 bytes),
+             value count float64s
+
+With METRICS_DIR set, each process writes its own metrics_<pid>.db there
+and /api/metrics sums every file, so totals cover all gunicorn workers with
+no locking between processes. Clear the directory when deploying, as with
+prometheus_client's multiprocess mode. Without METRICS_DIR the table lives
+in anonymous memory and only this process is reported.
+
+Series are keyed by the route pattern, never the raw path, and methods
+outside the standard set count as 'other', so clients cannot grow the
+table. /api/metrics answers a scraper presenting METRICS_TOKEN, or a staff
+user signed in like anywhere else in the API.
+"""
+
+import contextvars
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework import serializers
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+# Request latency buckets in seconds (Prometheus' defaults); +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Value layout of one record
+REQUESTS = 0
+LATENCY_SUM = 1
+QUERIES = 2
+SQL_SECONDS = 3
+SERIALIZER_SECONDS = 4
+RESPONSE_BYTES = 5
+BUCKETS = 6
+VALUE_COUNT = BUCKETS + len(LATENCY_BUCKETS) + 1
+BUCKET_LABELS = tuple(repr(bound) for bound in LATENCY_BUCKETS) + ('+Inf',)
+
+# Per-request accumulator slots
+ACC_QUERIES = 0
+ACC_SQL = 1
+ACC_SERIALIZER = 2
+ACC_SERIALIZING = 3
+
+USED = struct.Struct('<Q')
+RECORD = struct.Struct('<II')
+INITIAL_SIZE = 64 * 1024
+KEY_SEPARATOR = '\x1f'
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+
+current_request = contextvars.ContextVar('metrics_request', default=None)
+
+
+def _padded(length):
+    return (length + 7) & ~7
+
+
+class MetricsFile:
+    """One process's counters: an append-only table of (key, float64 values) records"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._file = None
+        self._mmap = None
+        self._values = None
+        self._open(INITIAL_SIZE)
+        USED.pack_into(self._mmap, 0, USED.size)
+
+    def _open(self, size):
+        if self.path is None:
+            old = bytes(self._mmap) if self._mmap is not None else b''
+            self._close_map()
+            self._mmap = mmap.mmap(-1, size)
+            self._mmap[:len(old)] = old
+        else:
+            self._close_map()
+            if self._file is None:
+                self._file = open(self.path, 'w+b')
+            self._file.truncate(size)
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._values = memoryview(self._mmap).cast('d')
+
+    def _close_map(self):
+        if self._values is not None:
+            self._values.release()
+            self._mmap.close()
+
+    def slot(self, key):
+        """Index of the first value of key's record, appending a zeroed record if new"""
+        index = self._slots.get(key)
+        if index is not None:
+            return index
+        encoded = key.encode()
+        used = USED.unpack_from(self._mmap, 0)[0]
+        size = RECORD.size + _padded(len(encoded)) + VALUE_COUNT * 8
+        if used + size > len(self._mmap):
+            self._open(max(len(self._mmap) * 2, used + size))
+        RECORD.pack_into(self._mmap, used, len(encoded), VALUE_COUNT)
+        self._mmap[used + RECORD.size:used + RECORD.size + len(encoded)] = encoded
+        index = (used + RECORD.size + _padded(len(encoded))) // 8
+        # Publish the record only once it is fully written
+        USED.pack_into(self._mmap, 0, used + size)
+        self._slots[key] = index
+        return index
+
+    def observe(self, key, seconds, queries, sql_seconds, serializer_seconds, response_bytes):
+        with self._lock:
+            index = self.slot(key)
+            values = self._values
+            values[index + REQUESTS] += 1
+            values[index + LATENCY_SUM] += seconds
+            values[index + QUERIES] += queries
+            values[index + SQL_SECONDS] += sql_seconds
+            values[index + SERIALIZER_SECONDS] += serializer_seconds
+            values[index + RESPONSE_BYTES] += response_bytes
+            values[index + BUCKETS + bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return bytes(self._mmap)
+
+
+def read_records(data):
+    """Yield (key, values) from a metrics table's bytes"""
+    used = min(USED.unpack_from(data, 0)[0], len(data))
+    position = USED.size
+    while position + RECORD.size <= used:
+        key_length, count = RECORD.unpack_from(data, position)
+        key_start = position + RECORD.size
+        values_start = key_start + _padded(key_length)
+        position = values_start + count * 8
+        if position > used:
+            break
+        key = data[key_start:key_start + key_length].decode()
+        yield key, struct.unpack_from(f'<{count}d', data, values_start)
+
+
+class MetricsStore:
+    """This process's MetricsFile, reopened after a fork, plus aggregation across files"""
+
+    def __init__(self):
+        self._pid = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def file(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    directory = self.directory
+                    path = None
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                        path = os.path.join(directory, f'metrics_{pid}.db')
+                    self._file = MetricsFile(path)
+                    self._pid = pid
+        return self._file
+
+    def collect(self):
+        """Summed values per key over every process's table"""
+        own = self.file()
+        sources = [own.snapshot()]
+        directory = self.directory
+        if directory:
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if name.startswith('metrics_') and name.endswith('.db') and path != own.path:
+                    try:
+                        with open(path, 'rb') as handle:
+                            sources.append(handle.read())
+                    except OSError:
+                        continue
+
+        totals = {}
+        for data in sources:
+            if len(data) < USED.size:
+                continue
+            for key, values in read_records(data):
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        total[i] += value
+        return totals
+
+
+store = MetricsStore()
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute_wrapper: counts queries and SQL time for the current request"""
+    accumulator = current_request.get()
+    if accumulator is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        accumulator[ACC_SQL] += perf_counter() - started
+        accumulator[ACC_QUERIES] += 1
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _timed_data(prop):
+    fget = prop.fget
+
+    def data(self):
+        accumulator = current_request.get()
+        # Nested .data calls are already inside the outer timing
+        if accumulator is None or accumulator[ACC_SERIALIZING]:
+            return fget(self)
+        accumulator[ACC_SERIALIZING] = 1
+        started = perf_counter()
+        try:
+            return fget(self)
+        finally:
+            accumulator[ACC_SERIALIZER] += perf_counter() - started
+            accumulator[ACC_SERIALIZING] = 0
+    data.metrics_timed = True
+    return property(data)
+
+
+_installed = False
+
+
+def install():
+    """Hook the query wrapper and serializer timing in; runs once per process"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(install_query_wrapper, dispatch_uid='metrics_query_wrapper')
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, 'metrics_timed', False):
+            cls.data = _timed_data(cls.data)
+
+
+def route_key(request, response):
+    match = getattr(request, 'resolver_match', None)
+    route = match.route if match is not None else 'unmatched'
+    status = f'{response.status_code // 100}xx'
+    method = request.method if request.method in HTTP_METHODS else 'other'
+    return KEY_SEPARATOR.join((route, method, status))
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+def observe(request, response, started, accumulator):
+    store.file().observe(
+        route_key(request, response),
+        perf_counter() - started,
+        accumulator[ACC_QUERIES],
+        accumulator[ACC_SQL],
+        accumulator[ACC_SERIALIZER],
+        response_size(response),
+    )
+
+
+def MetricsMiddleware(get_response):
+    """Records latency, queries, SQL time, serializer time and response size per route"""
+    install()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            accumulator = [0, 0.0, 0.0, 0]
+            token = current_request.set(accumulator)
+            started = perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                current_request.reset(token)
+            observe(request, response, started, accumulator)
+            return response
+
+        markcoroutinefunction(middleware)
+        return middleware
+
+    def middleware(request):
+        accumulator = [0, 0.0, 0.0, 0]
+        token = current_request.set(accumulator)
+        started = perf_counter()
+        try:
+            response = get_response(request)
+        finally:
+            current_request.reset(token)
+        observe(request, response, started, accumulator)
+        return response
+
+    return middleware
+
+
+MetricsMiddleware.sync_capable = True
+MetricsMiddleware.async_capable = True
+
+
+def _labels(route, method, status, extra=''):
+    def escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'route="{escape(route)}",method="{method}",status="{status}"{extra}'
+
+
+COUNTERS = (
+    (QUERIES, 'db_queries_total', 'Database queries issued while handling requests'),
+    (SQL_SECONDS, 'db_query_seconds_total', 'Time spent executing SQL while handling requests'),
+    (SERIALIZER_SECONDS, 'serializer_seconds_total', 'Time spent building serializer data'),
+    (RESPONSE_BYTES, 'http_response_bytes_total', 'Response body bytes sent'),
+)
+
+
+def render(totals):
+    """Prometheus text exposition (version 0.0.4) of collected totals"""
+    series = sorted((key.split(KEY_SEPARATOR), values) for key, values in totals.items())
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by route',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (route, method, status), values in series:
+        cumulative = 0.0
+        for i, le in enumerate(BUCKET_LABELS):
+            cumulative += values[BUCKETS + i]
+            labels = _labels(route, method, status, f',le="{le}"')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels}}} {cumulative!r}')
+        labels = _labels(route, method, status)
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {values[LATENCY_SUM]!r}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {values[REQUESTS]!r}')
+
+    for index, name, help_text in COUNTERS:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (route, method, status), values in series:
+            lines.append(f'{name}{{{_labels(route, method, status)}}} {values[index]!r}')
+    return '\n'.join(lines) + '\n'
+
+
+def _denied_status(request):
+    """401 or 403 unless the request carries METRICS_TOKEN or comes from a staff user; else None"""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        return None
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        # Not signed in through the session: try the API's own authentication (JWT)
+        authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return 401
+        if not user.is_authenticated:
+            return 401
+    return None if user.is_staff else 403
+
+
+def metrics_view(request):
+    """GET /api/metrics: every worker's request metrics for a Prometheus scrape"""
+    status = _denied_status(request)
+    if status is not None:
+        return HttpResponse(status=status)
+    return HttpResponse(render(store.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
@@ -45,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tetris_project.metrics.MetricsMiddleware',  # first, so it times the whole stack
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Added for static files
     'django.middleware.security.SecurityMiddleware',
@@ -83,6 +85,12 @@ DATABASES = {
         conn_max_age=600
     )
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Test on a file rather than SQLite's shared in-memory database, which
+    # fails concurrent writers at once; game/tests.py submits from several threads
+    DATABASES['default'].setdefault('TEST', {}).setdefault(
+        'NAME', os.path.join(tempfile.gettempdir(), 'test_tetris.sqlite3')
+    )
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,7 +131,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST FRAMEWORK CONFIGURATION 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from the token claims; see users/authentication.py
+        'users.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -150,4 +159,73 @@ CORS_ALLOWED_ORIGINS = [
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# RUNTIME DATA: files the app writes itself (leaderboard snapshot, percentile
+# sketches, session archive) live under DATA_DIR, which git ignores
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(BASE_DIR, 'var'))
+
+# IN-PROCESS RANKED LEADERBOARD
+LEADERBOARD_SNAPSHOT_PATH = os.environ.get(
+    'LEADERBOARD_SNAPSHOT_PATH', os.path.join(DATA_DIR, 'leaderboard.snapshot')
+)
+LEADERBOARD_SNAPSHOT_EVERY = 1000   # updates between snapshots
+LEADERBOARD_SYNC_SECONDS = 5        # how often to pick up other workers' submissions
+LEADERBOARD_RECONCILE_SECONDS = 60  # how often to look for players removed by other workers
+LEADERBOARD_STREAM_SIZE = 10        # ranks pushed by leaderboard/stream/
+LEADERBOARD_STREAM_QUEUE_SIZE = 32  # events buffered per client before it is dropped
+LEADERBOARD_STREAM_POLL_SECONDS = 5 # re-read interval for changes made by other workers
+LEADERBOARD_STREAM_KEEPALIVE_SECONDS = 15
+
+# PERCENTILE SKETCHES behind percentile/ ("you beat X% of players"). Workers sharing
+# PERCENTILE_DIR see each other's updates; run rebuild_percentiles after bulk data changes
+PERCENTILE_DIR = os.environ.get('PERCENTILE_DIR', os.path.join(DATA_DIR, 'percentiles'))
+PERCENTILE_RELATIVE_ACCURACY = 0.01 # quantiles are within 1% of the exact value
+PERCENTILE_SNAPSHOT_EVERY = 1000    # updates between delta file writes
+PERCENTILE_SYNC_SECONDS = 5         # how often to pick up other workers' updates
+
+# COLD STORAGE for sessions moved out of GameSession by archive_sessions (see game/archive.py)
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(DATA_DIR, 'archive'))
+
+# LIVE SPECTATING (WebSockets, ASGI only)
+SPECTATE_MAX_FPS = 20               # frames per second sent to each viewer; 0 = unlimited
+SPECTATE_MAX_MESSAGE_BYTES = 2048   # largest frame a publisher may send
+
+# VERSUS MODE (server-run matches over WebSockets, ASGI only)
+VERSUS_TICK_RATE = 60               # match ticks per second
+VERSUS_MAX_FPS = 60                 # state updates sent to each player per second; 0 = unlimited
+VERSUS_MAX_SECONDS = 900            # longer matches end and are decided on score
+
+# GAME REPLAYS
+REPLAY_MAX_BYTES = 64 * 1024
+REPLAY_QUEUE_MAX_PENDING = 10000    # submit_score answers 503 beyond this many unverified games
+REPLAY_QUEUE_RETRY_AFTER = 30       # seconds, sent as Retry-After
+SCORE_BATCH_MAX_SIZE = 50           # sessions accepted by submit-scores/batch/
+SCORE_CLOCK_SKEW_SECONDS = 300      # how far ended_at may predate now beyond the game's own duration
+
+# CACHE: files under CACHE_DIR, shared by every worker process on the host. Response
+# cache and user row versions (tetris_project/cache_versions.py) live here too, so
+# a per-process backend such as LocMemCache only suits a single process: other
+# workers and verify_replays would never see each other's invalidations
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(DATA_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+RESPONSE_CACHE_TIMEOUT = 300        # seconds a rendered response may be served
+
+# USER CACHE: rows of recently authenticated players, per process (users/user_cache.py)
+USER_CACHE_MAX_ENTRIES = 10000
+USER_CACHE_TTL = 60                 # seconds a cached row may be used; 0 turns the cache off
+
+# ASYNC VIEWS: serve leaderboard, stats, achievements and profile reads with native
+# async views. Only useful under an ASGI server, see tetris_project/asgi.py
+USE_ASYNC_VIEWS = os.environ.get('USE_ASYNC_VIEWS', 'False').lower() == 'true'
+
+# REQUEST METRICS at /api/metrics (Prometheus text format). Set METRICS_DIR to a
+# directory shared by all gunicorn workers to report them together; clear it on deploy.
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; anyone else must be a staff user
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
 CORS_ALLOW_ALL_ORIGINS = DEBUG   # ONLY FOR DEVELOPMENT PURPOSE
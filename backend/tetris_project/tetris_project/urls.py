@@ -19,7 +19,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+
 urlpatterns = [
+    path('api/metrics', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/auth/',include('users.urls')),
     path('api/game/',include('game.urls')),
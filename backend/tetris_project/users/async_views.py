@@ -0,0 +1,18 @@
+#  users/async_views.py
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from game.response_cache import acached_response
+from tetris_project.cache_versions import user_namespace
+from .authentication import async_login_required
+from .serializers import UserProfileSerializer
+
+
+# Native async profile read, routed instead of views.profile when USE_ASYNC_VIEWS is on
+@require_GET
+@async_login_required
+@acached_response('profile', lambda request: user_namespace(request.user.pk))
+async def profile(request):
+    serializer = UserProfileSerializer(request.user)
+    return JsonResponse(serializer.data)
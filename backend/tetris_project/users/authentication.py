@@ -0,0 +1,130 @@
+# users/authentication.py - JWT authentication without a user query per request
+
+from functools import partial, wraps
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed as DRFAuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .user_cache import from_row, load_row, row_values, user_cache
+
+
+def check_account(is_active, password, validated_token):
+    """simplejwt's active and revoked-token checks"""
+    if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(password):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError as exc:
+        raise InvalidToken('Token contained no recognizable user identification') from exc
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """simplejwt's JWTAuthentication without the user query
+
+    request.user is a CustomUser built from the signed token: the cached row
+    when user_cache has a current one, else, when only the account fields
+    are still current, an instance holding just the id whose other fields
+    load together on first access (CustomUser.refresh_from_db). Views that
+    only filter by the user, like achievements/, or that answer from the
+    response cache, like user-stats/, then never query CustomUser.
+
+    The active and revoked-token checks run on every request, from the
+    cached row when its account version is current (see users/user_cache.py),
+    else from the row loaded here. A token whose user no longer exists is
+    refused like an invalid one.
+    """
+
+    def get_user(self, validated_token):
+        user_id_field = self.user_model._meta.get_field(api_settings.USER_ID_FIELD)
+        if not user_id_field.primary_key:
+            return super().get_user(validated_token)
+        user_id = user_id_field.to_python(token_user_id(validated_token))
+
+        values, account, version = user_cache.lookup(user_id)
+        if account is None:
+            try:
+                values = account = load_row(self.user_model, user_id)
+            except self.user_model.DoesNotExist as exc:
+                raise AuthenticationFailed('User not found', code='user_not_found') from exc
+            # Never cache a row from a transaction that may still roll back
+            transaction.on_commit(partial(user_cache.store, user_id, values, version))
+        check_account(account['is_active'], account['password'], validated_token)
+        if values is None:
+            return self.user_model.from_db(DEFAULT_DB_ALIAS, [user_id_field.attname], [user_id])
+        return from_row(self.user_model, values)
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """simplejwt's JWTAuthentication with the user lookup done through user_cache or the async ORM
+
+    Token parsing and signature checks are pure CPU work and reuse the
+    parent's methods unchanged.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        # Async views cannot load fields lazily, so the full row is read here, from user_cache if possible
+        user_id = token_user_id(validated_token)
+        user_id_field = self.user_model._meta.get_field(api_settings.USER_ID_FIELD)
+        values = version = None
+        if user_id_field.primary_key:
+            user_id = user_id_field.to_python(user_id)
+            values, _, version = user_cache.lookup(user_id)
+
+        if values is not None:
+            user = from_row(self.user_model, values)
+        else:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist as exc:
+                raise AuthenticationFailed('User not found', code='user_not_found') from exc
+            if version is not None:
+                user_cache.store(user.pk, row_values(user), version)
+
+        check_account(user.is_active, user.password, validated_token)
+        return user
+
+
+def async_login_required(view):
+    """Authenticate an async view's request by JWT, answering 401 like DRF does"""
+    authenticator = AsyncJWTAuthentication()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await authenticator.aauthenticate(request)
+        except DRFAuthenticationFailed as exc:
+            return _unauthorized(request, authenticator, exc.detail)
+        if result is None:
+            return _unauthorized(request, authenticator, 'Authentication credentials were not provided.')
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _unauthorized(request, authenticator, detail):
+    if not isinstance(detail, dict):
+        detail = {'detail': detail}
+    response = JsonResponse(detail, status=401)
+    response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+    return response
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 22:10
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_lifetime_exp(apps, schema_editor):
+    """lifetime_exp from the stored (player_level, exp), with users.progression's curve"""
+    CustomUser = apps.get_model('users', 'CustomUser')
+    CustomUser.objects.update(lifetime_exp=F('player_level') * (F('player_level') - 1) * 500 + F('exp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_customuser_exp_alter_customuser_player_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='lifetime_exp',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_lifetime_exp, migrations.RunPython.noop),
+    ]
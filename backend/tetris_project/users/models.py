@@ -1,7 +1,13 @@
 #  users/models.py
 
-from django.db import models
+from functools import partial
+
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+
+from tetris_project.cache_versions import LEADERBOARD, bump_version
+
+from .user_cache import bump_account_version, load_row, user_cache
 # Create your models here.
 
 class CustomUser(AbstractUser):
@@ -15,16 +21,86 @@ class CustomUser(AbstractUser):
     exp = models.IntegerField(default=0)  # Experience points
     player_level=models.IntegerField(default=1)     # start from level 1
     player_name=models.CharField(max_length=50,unique=True)
+    lifetime_exp = models.IntegerField(default=0)  # all EXP ever gained; level and exp derive from it
 
     def __str__(self):
         return self.username
+
+    def save(self, *args, **kwargs):
+        from .progression import total_exp
+
+        # Level and exp edited directly (e.g. in the admin) move the total with them
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'player_level', 'exp'}.intersection(update_fields):
+            self.lifetime_exp = total_exp(self.player_level, self.exp)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'lifetime_exp'}
+        # The public leaderboard shows usernames, and its cached pages would keep the old one
+        renamed = (
+            not self._state.adding
+            and 'username' in self.__dict__
+            and (update_fields is None or 'username' in update_fields)
+            and self.username != getattr(self, '_loaded_username', None)
+        )
+        super().save(*args, **kwargs)
+        self._loaded_username = self.username if 'username' in self.__dict__ else None
+        self.forget_cached_row(self.pk)
+        if renamed:
+            transaction.on_commit(partial(bump_version, LEADERBOARD), using=self._state.db)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Deferred (e.g. token-claim users): unknown, so a save that sets it counts as a rename
+        instance._loaded_username = instance.__dict__.get('username')
+        return instance
+
+    def delete(self, *args, **kwargs):
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        self.forget_cached_row(user_id)
+        return result
+
+    def forget_cached_row(self, user_id):
+        """Drop the row from user_cache now and again on commit, so no read in between re-caches it
+
+        Other processes stop using it when the account version is bumped on
+        commit; bumping earlier would let them cache the old row under the new
+        version.
+        """
+        user_cache.forget(user_id)
+        transaction.on_commit(partial(self.forget_everywhere, user_id), using=self._state.db)
+
+    @staticmethod
+    def forget_everywhere(user_id):
+        user_cache.forget(user_id)
+        bump_account_version(user_id)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        """Reading a deferred field loads every deferred field at once, through user_cache
+
+        Users authenticated from token claims start out with only their id
+        (see users/authentication.py), so a request costs at most one user
+        query, and none while the row is cached.
+        """
+        deferred = self.get_deferred_fields()
+        if fields is None or from_queryset is not None or not deferred.intersection(fields):
+            return super().refresh_from_db(using, fields, from_queryset)
+        using = using or self._state.db
+        values, _, version = user_cache.lookup(self.pk)
+        if values is None:
+            values = load_row(type(self), self.pk, using)
+            # Never cache a row from a transaction that may still roll back
+            transaction.on_commit(partial(user_cache.store, self.pk, values, version), using=using)
+        for attname in deferred:
+            setattr(self, attname, values[attname])
+        if 'username' in deferred:
+            self._loaded_username = values['username']
     
 
     def add_experience(self, points):
-        """ ADD EXP AND HANDLE LEVELING UP """
-        self.exp += points
-        #  EXAMPLE FORMULA  : 100 EXP PER LEVEL 
-        while self.exp >= self.player_level *  100:
-            self.exp -= self.player_level * 100 
-            self.player_level += 1
-        self.save()
\ No newline at end of file
+        """ ADD EXP AND HANDLE LEVELING UP (same curve as game rewards) """
+        from .progression import add_experience
+
+        add_experience(self.pk, points)
+        self.refresh_from_db(fields=['exp', 'player_level'])
@@ -0,0 +1,108 @@
+# users/progression.py - Player EXP and level progression
+
+"""One EXP curve for every code path
+
+Level L needs L * EXP_PER_LEVEL EXP to advance, so reaching level L from
+level 1 takes EXP_PER_LEVEL * L(L-1)/2 in total. A (player_level, exp) pair
+is therefore the same as the lifetime total
+
+    T = EXP_PER_LEVEL/2 * L(L-1) + exp
+
+which is stored as lifetime_exp, and the level for any total follows in
+closed form from the quadratic:
+
+    L = floor((1 + sqrt(1 + 8T / EXP_PER_LEVEL)) / 2)
+
+The same formula runs inside the UPDATE, so concurrent submissions from one
+account never lose counters or EXP.
+"""
+
+from math import isqrt
+
+from django.db import transaction
+from django.db.models import F, FloatField, IntegerField, Value
+from django.db.models.functions import Cast, Floor, Greatest, Sqrt
+
+from tetris_project.cache_versions import bump_version, user_namespace
+from .models import CustomUser
+from .user_cache import user_cache
+
+EXP_PER_LEVEL = 1000   # Level 1 needs 1000 EXP, L2 needs 2000, etc.
+SCORE_PER_EXP = 100    # 1000 score = 10 EXP
+
+
+def exp_for_score(score):
+    return score // SCORE_PER_EXP
+
+
+def exp_to_next_level(level):
+    return level * EXP_PER_LEVEL
+
+
+def total_exp(level, exp):
+    """Lifetime EXP represented by a (level, exp) pair"""
+    return EXP_PER_LEVEL * level * (level - 1) // 2 + exp
+
+
+def level_for_total(total):
+    """Return (level, exp) for a lifetime EXP total"""
+    # floor(sqrt(x)) == isqrt(floor(x)), so this stays exact for any total
+    level = (1 + isqrt((EXP_PER_LEVEL + 8 * total) // EXP_PER_LEVEL)) // 2
+    return level, total - total_exp(level, 0)
+
+
+def _level_expression(new_total):
+    # 8T is divided rather than multiplied by 0.008 so totals on a level
+    # boundary give an exact perfect square
+    root = Sqrt(Value(1.0) + Cast(new_total * 8, FloatField()) / Value(float(EXP_PER_LEVEL)))
+    return Cast(Floor((Value(1.0) + root) / 2), IntegerField())
+
+
+def progression_updates(exp_gained):
+    """UPDATE expressions that add exp_gained to lifetime_exp and derive level and exp from it
+
+    MySQL and MariaDB evaluate SET assignments left to right, each seeing the
+    ones before it. player_level and exp read only lifetime_exp, which is
+    assigned last, so every backend computes them from the row as it was.
+    Keep these last in update() too.
+    """
+    new_total = F('lifetime_exp') + exp_gained
+    new_level = _level_expression(new_total)
+    return {
+        'player_level': new_level,
+        'exp': new_total - new_level * (new_level - 1) * (EXP_PER_LEVEL // 2),
+        'lifetime_exp': new_total,
+    }
+
+
+def record_games(user_id, scores):
+    """Add finished games to a user's counters and EXP with one UPDATE"""
+    CustomUser.objects.filter(pk=user_id).update(
+        total_score=F('total_score') + sum(scores),
+        games_played=F('games_played') + len(scores),
+        highest_score=Greatest('highest_score', Value(max(scores))),
+        **progression_updates(sum(exp_for_score(score) for score in scores)),
+    )
+    # Callers bump the player's version on commit, which drops the row in other processes
+    user_cache.invalidate(user_id)
+
+
+def revoke_games(user_id, scores, highest_score):
+    """Take games back out of a user's counters and EXP, e.g. ones rejected on verification
+
+    highest_score is the best of the games that still count, which only the caller knows.
+    """
+    CustomUser.objects.filter(pk=user_id).update(
+        total_score=F('total_score') - sum(scores),
+        games_played=F('games_played') - len(scores),
+        highest_score=highest_score,
+        **progression_updates(-sum(exp_for_score(score) for score in scores)),
+    )
+    user_cache.invalidate(user_id)
+
+
+def add_experience(user_id, points):
+    """Grant EXP outside of a game (e.g. rewards) with one UPDATE"""
+    CustomUser.objects.filter(pk=user_id).update(**progression_updates(points))
+    user_cache.invalidate(user_id)
+    transaction.on_commit(lambda: bump_version(user_namespace(user_id)))
@@ -60,6 +60,7 @@ class UserLoginSerializer(serializers.Serializer):
     
 from rest_framework import serializers
 from .models import CustomUser
+from .progression import exp_to_next_level
 
 class UserProfileSerializer(serializers.ModelSerializer):
     exp_needed_for_next_level = serializers.SerializerMethodField()
@@ -84,10 +85,10 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'exp']
 
     def get_exp_needed_for_next_level(self, obj):
-        return obj.player_level * 1000  # e.g. Level 2 needs 2000 EXP
+        return exp_to_next_level(obj.player_level)  # e.g. Level 2 needs 2000 EXP
 
     def get_progress_percent(self, obj):
-        needed = obj.player_level * 1000
+        needed = exp_to_next_level(obj.player_level)
         if needed == 0:
             return 0
         return round((obj.exp / needed) * 100, 2)  # percentage to next level
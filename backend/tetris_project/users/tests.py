@@ -1,3 +1,106 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from .progression import EXP_PER_LEVEL, SCORE_PER_EXP, level_for_total, record_games
+from .user_cache import bump_account_version, user_cache
+
+User = get_user_model()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ClaimsJWTAuthenticationTests(TestCase):
+    """Reads check the account like writes do, with or without a cached row"""
+
+    def setUp(self):
+        user_cache.clear()
+        self.player = User.objects.create_user(
+            username='reader', email='reader@example.com', password='reader-password', player_name='Reader',
+        )
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.player).access_token}'}
+
+    def tearDown(self):
+        user_cache.clear()
+
+    def get(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(reverse('user_scores'), **self.headers)
+
+    def test_inactive_account_without_cached_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.player.is_active = False
+            self.player.save()
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_deleted_account(self):
+        self.assertEqual(self.get().status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.player.delete()
+        response = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'user_not_found')
+
+    def test_deactivated_in_another_process(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.assertIsNotNone(user_cache.lookup(self.player.pk)[1])
+        # Another process saves the user: this process's row is left alone, only the shared version moves
+        User.objects.filter(pk=self.player.pk).update(is_active=False)
+        bump_account_version(self.player.pk)
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_counter_writes_keep_account_checks_cached(self):
+        self.assertEqual(self.get().status_code, 200)
+        user_cache.invalidate(self.player.pk)
+        with self.assertNumQueries(1):
+            # Only the scores query: is_active and password come from the stale row
+            self.assertEqual(self.get().status_code, 200)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class RecordGamesTests(TestCase):
+    """Counters, level and EXP after several record_games UPDATEs"""
+
+    def setUp(self):
+        self.player = User.objects.create_user(
+            username='leveler', email='leveler@example.com', password='leveler-password', player_name='Leveler',
+        )
+
+    def tearDown(self):
+        user_cache.clear()
+
+    def test_levels_across_games(self):
+        # 1500 EXP, then exactly level 3, then deep into level 4
+        batches = [
+            [150000],
+            [50000, 100000],
+            [SCORE_PER_EXP * EXP_PER_LEVEL * 3 + 4321],
+        ]
+        gained = 0
+        for scores in batches:
+            record_games(self.player.pk, scores)
+            gained += sum(score // SCORE_PER_EXP for score in scores)
+            self.player.refresh_from_db()
+            self.assertEqual((self.player.player_level, self.player.exp), level_for_total(gained))
+            self.assertEqual(self.player.lifetime_exp, gained)
+        self.assertEqual(level_for_total(3000), (3, 0))
+        self.assertEqual(self.player.games_played, 4)
+        self.assertEqual(self.player.highest_score, max(max(scores) for scores in batches))
+
+    def test_total_assigned_after_what_reads_it(self):
+        # MySQL evaluates SET left to right: level and exp must still see the old lifetime_exp
+        with CaptureQueriesContext(connection) as captured:
+            record_games(self.player.pk, [12345])
+        sql = captured.captured_queries[0]['sql']
+        columns = ('player_level', 'exp', 'lifetime_exp')
+        assigned = [sql.index(f'{connection.ops.quote_name(column)} =') for column in columns]
+        self.assertEqual(assigned, sorted(assigned))
+
+    def test_direct_edits_move_the_total(self):
+        self.player.player_level, self.player.exp = 4, 250
+        self.player.save(update_fields=['player_level', 'exp'])
+        record_games(self.player.pk, [10000])
+        self.player.refresh_from_db()
+        self.assertEqual((self.player.player_level, self.player.exp), (4, 350))
@@ -1,10 +1,13 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+profile_view = async_views.profile if settings.USE_ASYNC_VIEWS else views.profile
 
 urlpatterns = [
     path('register/',views.register, name='register'),
     path('login/',views.login, name='login'),
-    path('profile/',views.profile, name='profile'),
-    path('profile',views.profile, name='profile'),
+    path('profile/',profile_view, name='profile'),
+    path('profile',profile_view, name='profile'),
     path('profile/update/', views.update_profile, name='update_profile'),
 ]
\ No newline at end of file
@@ -0,0 +1,124 @@
+# users/user_cache.py - Per-process cache of recently seen users' rows
+
+"""Rows of hot users, so most requests never query CustomUser
+
+Entries are plain {attname: value} dicts kept in an LRU of at most
+USER_CACHE_MAX_ENTRIES users, each for at most USER_CACHE_TTL seconds. An
+entry also remembers two versions from the shared cache (see
+tetris_project/cache_versions.py), both read before the row was:
+
+- the player's response-cache version, bumped by writers such as
+  update_profile and submit_score. A row stale by it is not used for field
+  reads.
+- the account version, bumped when the user is saved or deleted (the only
+  ways is_active and password change). A row stale by it is not used at all.
+
+Both are shared by every process using the cache, so a deactivated or
+deleted account is refused everywhere as soon as the change commits.
+Queryset update() calls bypass save() and are only bounded by the TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from tetris_project.cache_versions import bump_version, current_versions, user_namespace
+
+
+def account_namespace(user_id):
+    return f'account:{user_id}'
+
+
+def bump_account_version(user_id):
+    """Make every process's cached row of the user unusable, even for authentication"""
+    bump_version(account_namespace(user_id))
+
+
+def row_values(user):
+    """{attname: value} of every concrete field, in field order"""
+    return {field.attname: getattr(user, field.attname) for field in user._meta.concrete_fields}
+
+
+def from_row(model, values, using='default'):
+    """A model instance built from row_values(), as if just loaded from the database"""
+    return model.from_db(using, list(values), list(values.values()))
+
+
+def load_row(model, pk, using=None):
+    """One user's row_values() straight from the database"""
+    attnames = [field.attname for field in model._meta.concrete_fields]
+    return model._base_manager.db_manager(using).filter(pk=pk).values(*attnames).get()
+
+
+class UserCache:
+    """LRU with a TTL of user rows, for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _live(self, user_id, now):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] <= now:
+            del self._entries[user_id]
+            return None
+        return entry
+
+    def lookup(self, user_id):
+        """(current values or None, account values or None, version); store() a row read next with that version
+
+        Account values are the cached row whenever its account version is
+        current, even if counter writes made it stale: enough for the
+        is_active and password checks.
+        """
+        version = current_versions(user_namespace(user_id), account_namespace(user_id))
+        with self._lock:
+            entry = self._live(user_id, time.monotonic())
+            if entry is None or entry[2] != version[1]:
+                self.misses += 1
+                return None, None, version
+            if entry[1] == version[0]:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[3], entry[3], version
+            self.misses += 1
+            return None, entry[3], version
+
+    def store(self, user_id, values, version):
+        ttl = settings.USER_CACHE_TTL
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + ttl, version[0], version[1], values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.USER_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        """Mark rows stale in this process, e.g. after an UPDATE of their counters"""
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None:
+                    self._entries[user_id] = (entry[0], None, entry[2], entry[3])
+
+    def forget(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+user_cache = UserCache()
@@ -9,6 +9,8 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from  .serializers import UserRegistrationSerializer, UserProfileSerializer, UserLoginSerializer
 from .models import CustomUser   
+from game.response_cache import cached_response
+from tetris_project.cache_versions import bump_version, user_namespace
 # Create your views here.
 
 @api_view(['POST'])
@@ -41,6 +43,7 @@ def login(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_response('profile', lambda request: user_namespace(request.user.pk))
 def profile(request):
     serializer = UserProfileSerializer(request.user)
     return Response(serializer.data)
@@ -51,6 +54,7 @@ def update_profile(request):
     serializer = UserProfileSerializer(request.user, data=request.data,partial=True)
     if serializer.is_valid():
         serializer.save()
+        bump_version(user_namespace(request.user.pk))
         return Response(serializer.data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
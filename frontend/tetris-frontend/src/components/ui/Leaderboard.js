@@ -15,6 +15,22 @@ const Leaderboard = () => {
     loadData();
   }, []);
 
+  // Keep the top ranks live instead of polling
+  useEffect(() => {
+    return api.subscribeLeaderboard({
+      onSnapshot: (entries) =>
+        setGlobalScores((prev) => [...entries, ...prev.slice(entries.length)]),
+      onDiff: (changes) =>
+        setGlobalScores((prev) => {
+          const next = [...prev];
+          changes.forEach(({ rank, entry }) => {
+            next[rank - 1] = entry;
+          });
+          return next;
+        }),
+    });
+  }, []);
+
   const loadData = async () => {
     setLoading(true);
     setError("");
@@ -23,8 +39,8 @@ const Leaderboard = () => {
       setGlobalScores(globalResponse || []);
 
       const personalResponse = await api.getUserScores();
-      // Ensure last 10 by created_at desc, slicing already handled by backend if applicable
-      setPersonalScores(personalResponse || []);
+      // First page of the player's best games (cursor paginated by the backend)
+      setPersonalScores(personalResponse?.results || []);
 
       const achievementsResponse = await api.getAchievements();
       setAchievements(achievementsResponse || []);
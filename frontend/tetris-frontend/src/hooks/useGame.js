@@ -9,6 +9,8 @@ import {
   calculateGhostPiece,
   calculateScore,
   calculateDropTime,
+  boardToRows,
+  encodePiece,
 } from "../services/gameLogic";
 import { GAME_STATES } from "../utils/constants";
 import { api } from "../services/api";
@@ -26,6 +28,8 @@ export const useGame = () => {
 
   const gameLoopRef = useRef();
   const gameStartTime = useRef();
+  const publisherRef = useRef();
+  const gameNumber = useRef(0);
 
   const startGame = useCallback(() => {
     const newBoard = createBoard();
@@ -42,6 +46,7 @@ export const useGame = () => {
     setDropTime(1000);
     setGameState(GAME_STATES.PLAYING);
     gameStartTime.current = Date.now();
+    gameNumber.current += 1;
   }, []);
 
   const pauseGame = useCallback(() => {
@@ -163,6 +168,25 @@ export const useGame = () => {
     return () => clearInterval(gameLoopRef.current);
   }, [gameState, dropTime, dropPiece]);
 
+  // Live spectating: publish board and piece changes while a game is on
+  // (a no-op unless REACT_APP_LIVE_SPECTATING is set, see api.publishGame)
+  useEffect(() => {
+    publisherRef.current = api.publishGame();
+    return () => publisherRef.current.close();
+  }, []);
+
+  useEffect(() => {
+    if (!gameNumber.current) return;
+    publisherRef.current.update({
+      game: gameNumber.current,
+      rows: boardToRows(board),
+      piece: encodePiece(currentPiece),
+      next: nextPiece ? encodePiece(nextPiece)[0] : null,
+      score,
+      lines,
+    });
+  }, [board, currentPiece, nextPiece, score, lines]);
+
   return {
     gameState,
     board,
@@ -1,6 +1,32 @@
 // api.js
 const API_BASE_URL =
   process.env.REACT_APP_API_URL || "http://127.0.0.1:8000/api";
+// WebSocket routes live beside /api on the same (ASGI) server
+const WS_BASE_URL = API_BASE_URL.replace(/^http/, "ws").replace(/\/api\/?$/, "");
+// Set when the backend runs under ASGI; a WSGI server has no WebSocket routes
+const LIVE_SPECTATING = process.env.REACT_APP_LIVE_SPECTATING === "true";
+
+// Frame with only what changed since the last one sent (see game/spectate.py)
+function diffFrame(last, state) {
+  const frame = {};
+  if (!last || last.game !== state.game) {
+    frame.g = state.game;
+    frame.r = state.rows.map((bits, row) => [row, bits]);
+  } else {
+    const rows = state.rows
+      .map((bits, row) => [row, bits])
+      .filter(([row, bits]) => last.rows[row] !== bits);
+    if (rows.length) frame.r = rows;
+  }
+  const fields = { p: "piece", n: "next", s: "score", l: "lines" };
+  for (const [key, name] of Object.entries(fields)) {
+    if (!last || frame.g !== undefined ||
+        JSON.stringify(last[name]) !== JSON.stringify(state[name])) {
+      frame[key] = state[name];
+    }
+  }
+  return Object.keys(frame).length ? frame : null;
+}
 
 class TetrisAPI {
   // No need to store token as instance variable since we get it fresh each request
@@ -92,6 +118,64 @@ class TetrisAPI {
     return this.request("/game/leaderboard/");
   }
 
+  // Live top-of-leaderboard updates over Server-Sent Events (ASGI server only).
+  // Returns a function that closes the stream.
+  subscribeLeaderboard({ onSnapshot, onDiff }) {
+    if (typeof EventSource === "undefined") return () => {};
+    const source = new EventSource(`${API_BASE_URL}/game/leaderboard/stream/`);
+    source.addEventListener("snapshot", (event) => {
+      onSnapshot(JSON.parse(event.data).entries);
+    });
+    source.addEventListener("diff", (event) => {
+      onDiff(JSON.parse(event.data).changes);
+    });
+    // Without a streaming server, fall back to manual refresh instead of retrying
+    source.onerror = () => {
+      if (source.readyState !== EventSource.OPEN) source.close();
+    };
+    return () => source.close();
+  }
+
+  // Publish this player's game to spectators (ASGI server with
+  // REACT_APP_LIVE_SPECTATING=true only). Returns { update, close }; update
+  // takes { game, rows, piece, next, score, lines }.
+  publishGame() {
+    const token = localStorage.getItem("tetris_token");
+    if (!LIVE_SPECTATING || !token || typeof WebSocket === "undefined") {
+      return { update() {}, close() {} };
+    }
+    const socket = new WebSocket(
+      `${WS_BASE_URL}/ws/games/play/?token=${encodeURIComponent(token)}`
+    );
+    let last = null;
+    let pending = null;
+    socket.onopen = () => {
+      if (pending) socket.send(JSON.stringify(diffFrame(null, pending)));
+      last = pending;
+    };
+    return {
+      update(state) {
+        if (socket.readyState !== WebSocket.OPEN) {
+          pending = state;
+          return;
+        }
+        const frame = diffFrame(last, state);
+        last = state;
+        if (frame) socket.send(JSON.stringify(frame));
+      },
+      close: () => socket.close(),
+    };
+  }
+
+  // Watch a player's live game. onFrame gets each diff frame; a frame with
+  // "g" starts from an empty board. Returns a function that closes the socket.
+  spectateGame(playerId, onFrame) {
+    if (!LIVE_SPECTATING || typeof WebSocket === "undefined") return () => {};
+    const socket = new WebSocket(`${WS_BASE_URL}/ws/games/${playerId}/watch/`);
+    socket.onmessage = (event) => onFrame(JSON.parse(event.data));
+    return () => socket.close();
+  }
+
   async getUserScores() {
     return this.request("/game/scores/user/");
   }
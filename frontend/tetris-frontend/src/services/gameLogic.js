@@ -137,3 +137,23 @@ export function calculateDropTime(linesClearedTotal) {
   return time;
 }
 
+
+// Board rows as bitmasks (bit c is column c), the compact form sent to spectators
+export function boardToRows(board) {
+  return board.map((row) =>
+    row.reduce((bits, cell, c) => (cell ? bits | (1 << c) : bits), 0)
+  );
+}
+
+// Piece as [type index, clockwise rotations from spawn, x, y]
+export function encodePiece(piece) {
+  if (!piece) return null;
+  const types = Object.keys(TETROMINOS);
+  let shape = TETROMINOS[piece.type].shape;
+  let rotation = 0;
+  while (rotation < 3 && JSON.stringify(shape) !== JSON.stringify(piece.shape)) {
+    shape = rotatePiece({ shape }).shape;
+    rotation++;
+  }
+  return [types.indexOf(piece.type), rotation, piece.x, piece.y];
+}